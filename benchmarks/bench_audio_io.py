@@ -0,0 +1,171 @@
+"""
+Temp-file vs in-memory audio input for recognition.
+
+The first part times the work each path does to get an upload into the
+recognizer. The temp-file path is what the old transcribe_audio left to
+the SDK: write the upload to a NamedTemporaryFile, read it back in
+buffer-sized pieces, unlink it. The in-memory path is the one the apps use
+now: parse_wav and MemoryAudioReader.read from audio_streams.py, filling
+the same buffers from a memoryview.
+
+The second part counts temp files left behind under concurrent load, where
+a fraction of the requests fail mid-recognition, which is what leaked
+files before. It runs against the fake speech backend, so its latencies
+say nothing about the SDK; only the file counts matter there.
+
+    python benchmarks/bench_audio_io.py --requests 200 --seconds 30
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lesson-2.2"))
+
+import azure.cognitiveservices.speech as speechsdk  # noqa: E402
+
+from audio_streams import memory_audio_reader, parse_wav, wav_audio_config  # noqa: E402
+from fake_speech import FakeSpeechBackend, make_wav  # noqa: E402
+
+
+class InjectedFailure(Exception):
+    pass
+
+
+def recognize(backend, audio_config, fail):
+    speech_config = backend.create_config("fake", "eastus2")
+    recognizer = backend.create_recognizer(speech_config, audio_config)
+    result = recognizer.recognize_once_async().get()
+    if fail:
+        raise InjectedFailure()
+    return result
+
+
+def temp_file_request(backend, data, fail):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
+        temp_file.write(data)
+        temp_file_path = temp_file.name
+    result = recognize(backend, backend.audio_input(temp_file_path), fail)
+    os.unlink(temp_file_path)
+    return result
+
+
+def in_memory_request(backend, data, fail):
+    return recognize(backend, backend.audio_input(wav_data=data), fail)
+
+
+def run(request, backend, data, requests, workers, failure_rate):
+    def timed(index):
+        start = time.perf_counter()
+        try:
+            request(backend, data, index % round(1 / failure_rate) == 0
+                    if failure_rate else False)
+        except InjectedFailure:
+            pass
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(timed, range(requests)))
+
+
+# The SDK pulls 100 ms of 16 kHz 16-bit mono audio per read
+READ_SIZE = 3200
+
+
+def temp_file_read(data):
+    """Write the upload to a temp file and read it back as the SDK would"""
+    buffer = bytearray(READ_SIZE)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
+        temp_file.write(data)
+    with open(temp_file.name, "rb", buffering=0) as wav_file:
+        while wav_file.readinto(buffer):
+            pass
+    os.unlink(temp_file.name)
+
+
+def in_memory_read(data):
+    """Parse the upload in place and drain it through MemoryAudioReader"""
+    buffer = memoryview(bytearray(READ_SIZE))
+    reader = memory_audio_reader()(parse_wav(data).pcm)
+    while reader.read(buffer):
+        pass
+
+
+def input_path_cost(data, repeat=20):
+    """Seconds per upload to feed it to the recognizer on each path"""
+    results = {}
+    for name, read in (("temp file", temp_file_read), ("in memory", in_memory_read)):
+        read(data)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            read(data)
+            timings.append(time.perf_counter() - start)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def sdk_config_cost(data, repeat=50):
+    """Time building real SDK AudioConfigs for each input path"""
+    def file_config():
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
+            temp_file.write(data)
+        speechsdk.audio.AudioConfig(filename=temp_file.name)
+        os.unlink(temp_file.name)
+
+    results = {}
+    for name, build in (("temp file", file_config),
+                        ("in memory", lambda: wav_audio_config(data))):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            build()
+        results[name] = (time.perf_counter() - start) / repeat
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=30.0,
+                        help="length of the uploaded recording")
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    data = make_wav(args.seconds)
+    backend = FakeSpeechBackend(connect_latency=0, first_byte_latency=0,
+                                realtime_factor=1000.0)
+    scratch = tempfile.mkdtemp(prefix="bench_audio_io_")
+    tempfile.tempdir = scratch
+    try:
+        print(f"Feeding a {len(data) / 1e6:.1f} MB upload to the recognizer "
+              f"in {READ_SIZE}-byte reads")
+        for name, seconds in input_path_cost(data).items():
+            print(f"{name:<10} {seconds * 1000:7.2f} ms")
+
+        print("\nSDK AudioConfig construction")
+        for name, seconds in sdk_config_cost(data).items():
+            print(f"{name:<10} {seconds * 1000:7.2f} ms")
+
+        print(f"\nFake backend: {args.requests} requests, {args.workers} workers, "
+              f"{args.failure_rate:.0%} failing")
+        for name, request in (("temp file", temp_file_request),
+                              ("in memory", in_memory_request)):
+            before = len(os.listdir(scratch))
+            timings = run(request, backend, data, args.requests,
+                          args.workers, args.failure_rate)
+            leaked = len(os.listdir(scratch)) - before
+            print(f"{name:<10} median {statistics.median(timings) * 1000:7.2f} ms"
+                  f"   p95 {sorted(timings)[int(len(timings) * 0.95)] * 1000:7.2f} ms"
+                  f"   files left in tmp: {leaked}")
+    finally:
+        tempfile.tempdir = None
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Memory cost of offering a recording for download.
+
+Compares the old base64 data-URI link with audio_download_button, given
+the bytes or a callable, for a 10-minute 16 kHz mono recording. Each one is
+rendered by a running app (Streamlit's AppTest), which reports the extra
+memory a rerun allocates over an empty page and the size of the messages
+the rerun sends to the browser over the websocket.
+
+    python benchmarks/bench_download_memory.py --minutes 10
+"""
+import argparse
+import base64
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lesson-2.2"))
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest, local_script_runner  # noqa: E402
+
+from audio_download import audio_download_button  # noqa: E402
+from fake_speech import make_wav  # noqa: E402
+
+# The app only calls whatever render function the benchmark puts in its
+# session state, so each variant is measured on its own
+APP = 'import streamlit as st\n\nst.session_state["render"]()\n'
+
+
+def data_uri_link(bin_data, file_label="File", file_name="recorded_audio.wav"):
+    """The helper the speech apps used before audio_download_button"""
+    b64 = base64.b64encode(bin_data).decode()
+    href = f'<a href="data:audio/wav;base64,{b64}" download="{file_name}">{file_label}</a>'
+    return href
+
+
+def sent_bytes(runner_messages):
+    """Serialized size of the messages a script run sent to the browser"""
+    return sum(message.ByteSize() for message in runner_messages)
+
+
+def measure(render):
+    """Extra memory a rerun of the app allocates, and the bytes it sends"""
+    app = AppTest.from_string(APP, default_timeout=60)
+    app.session_state["render"] = render
+    sent = []
+    parse_tree = local_script_runner.parse_tree_from_messages
+
+    def record(messages):
+        sent.append(sent_bytes(messages))
+        return parse_tree(messages)
+
+    # The first run sets up the app; the second is a rerun like any other
+    app.run()
+    local_script_runner.parse_tree_from_messages = record
+    tracemalloc.start()
+    try:
+        app.run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        local_script_runner.parse_tree_from_messages = parse_tree
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    return peak, sent[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--minutes", type=float, default=10.0)
+    args = parser.parse_args()
+
+    audio = make_wav(args.minutes * 60)
+    print(f"recording: {len(audio) / 1e6:.1f} MB "
+          f"({args.minutes:g} min, 16 kHz mono PCM)\n")
+
+    calls = []
+
+    def load():
+        calls.append(1)
+        return audio
+
+    variants = [
+        ("data URI link", lambda: st.markdown(
+            data_uri_link(audio, "Download WAV File"), unsafe_allow_html=True)),
+        ("button, bytes", lambda: audio_download_button(
+            "Download WAV File", audio, "recorded_audio.wav")),
+        ("button, callable", lambda: audio_download_button(
+            "Download WAV File", load, "recorded_audio.wav")),
+    ]
+    empty_peak, empty_sent = measure(lambda: None)
+    for name, render in variants:
+        peak, sent = measure(render)
+        print(f"{name:<17} extra memory {max(0, peak - empty_peak) / 1e6:7.1f} MB   "
+              f"websocket per rerun {sent - empty_sent:>12,} bytes")
+    print(f"\nThe callable ran {len(calls)} times: Streamlit only calls it when the "
+          f"file is fetched, to serve its {len(audio) / 1e6:.1f} MB.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Cold-start import time of the Streamlit apps, checked against a target.
+
+Nothing is drawn until the import block at the top of an app script has
+run, so on a cold start (the first run after a deploy) that block is the
+time to first paint. For each app the block is run in a fresh interpreter
+with -X importtime, after Streamlit itself, which the server has loaded
+before any script runs. The report shows the median over several runs and
+the top-level packages that took longest; --check exits with an error when
+an app is over its target.
+
+    python benchmarks/bench_import_time.py --repeat 5 --top 8 --check
+"""
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# (script, target in milliseconds for its import block)
+APPS = {
+    "weather": ("lesson-2.3/app_final.py", 500),
+    "gallery": ("lesson-2.1/my_gallery.py", 100),
+    "text-to-speech": ("lesson-2.2/text-to-speech.py", 60),
+    "speech-to-text": ("lesson-2.2/speech-to-text.py", 60),
+}
+
+MARKER = "--- app imports ---"
+
+
+def import_block(path):
+    """
+    Source of the imports at the top of a script, up to its first other
+    statement. sys.path changes among them are kept, since later imports
+    depend on them.
+    """
+    with open(path, encoding="utf-8") as script:
+        tree = ast.parse(script.read(), path)
+    imports = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append(ast.unparse(node))
+        elif (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)
+              and ast.unparse(node.value.func).startswith("sys.path.")):
+            imports.append(ast.unparse(node))
+        elif not (isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)):
+            break
+    return "\n".join(imports)
+
+
+def measure(path):
+    """(seconds, {top-level package: seconds}) for one cold run of the import block"""
+    code = "\n".join([
+        "import sys, time",
+        "import streamlit",
+        # The block runs from -c, where the script's own path is not set
+        f"__file__ = {os.path.abspath(path)!r}",
+        f"sys.stderr.write({MARKER!r} + '\\n')",
+        "start = time.perf_counter()",
+        import_block(path),
+        "print(time.perf_counter() - start)",
+    ])
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(path), capture_output=True, text=True, check=True)
+
+    packages = {}
+    lines = result.stderr.split(MARKER, 1)[-1].splitlines()
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        # Only modules imported by the block itself, not their dependencies
+        if not line.rsplit("|", 1)[1].startswith("  ") and cumulative.isdigit():
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + int(cumulative) / 1e6
+    return float(result.stdout.strip().splitlines()[-1]), packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--apps", nargs="+", choices=list(APPS), default=list(APPS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--check", action="store_true",
+                        help="exit with an error when an app is over its target")
+    args = parser.parse_args()
+
+    over = []
+    for app in args.apps:
+        script, target_ms = APPS[app]
+        path = os.path.normpath(os.path.join(ROOT, script))
+        runs = [measure(path) for _ in range(args.repeat)]
+        total_ms = statistics.median(seconds for seconds, _ in runs) * 1000
+        packages = {package: statistics.median(run[1].get(package, 0) for run in runs)
+                    for package in runs[0][1]}
+
+        status = "ok" if total_ms <= target_ms else "OVER TARGET"
+        print(f"{app} ({script}): {total_ms:.0f} ms before first paint, "
+              f"target {target_ms} ms, {status}")
+        for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {seconds * 1000:8.1f} ms  {package}")
+        if total_ms > target_ms:
+            over.append(app)
+
+    if args.check and over:
+        sys.exit(f"Over the import time target: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+First-byte latency of speech synthesis with and without the client pool.
+
+Runs entirely offline against the fake speech backend, which simulates the
+websocket/TLS handshake that a freshly built synthesizer pays on its first
+request.
+
+    python benchmarks/bench_speech_pool.py --requests 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lesson-2.2"))
+
+from fake_speech import FakeSpeechBackend  # noqa: E402
+from speech_clients import SpeechClientPool  # noqa: E402
+
+TEXT = "Hello! This is an example of text-to-speech using Azure AI."
+VOICE = "en-US-JennyNeural"
+LANGUAGE = "en-US"
+
+
+def per_call(backend, requests):
+    """Build a config and synthesizer for every request, as the app used to"""
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        speech_config = backend.create_config("fake", "eastus2")
+        speech_config.speech_synthesis_voice_name = VOICE
+        synthesizer = backend.create_synthesizer(speech_config)
+        synthesizer.speak_text_async(TEXT).get()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def pooled(backend, requests):
+    """Reuse warm synthesizers from a SpeechClientPool"""
+    pool = SpeechClientPool("fake", "eastus2", backend=backend)
+    pool.warm(VOICE, LANGUAGE)
+    time.sleep(backend.connect_latency)
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        with pool.synthesizer(VOICE, LANGUAGE) as client:
+            client.client.speak_text_async(TEXT).get()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    print(f"{name:<10} median {statistics.median(timings) * 1000:7.1f} ms   "
+          f"max {max(timings) * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--connect-latency", type=float, default=0.15)
+    args = parser.parse_args()
+
+    backend = FakeSpeechBackend(connect_latency=args.connect_latency)
+    report("per-call", per_call(backend, args.requests))
+    report("pooled", pooled(backend, args.requests))
+
+
+if __name__ == "__main__":
+    main()
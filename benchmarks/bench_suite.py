@@ -0,0 +1,353 @@
+"""
+Offline benchmark suite for the speech apps and the weather dashboard.
+
+Speech cases run the apps' synthesis and transcription code against the
+fake speech backend (fake_speech.py). Its handshake, per-request latency
+and throughput are set from the command line, and its audio and
+transcripts are derived from the input, so every run sees the same
+service. Weather cases ingest, load, aggregate and render synthetic
+station CSVs (synthetic_weather.py) of each requested size, from the 150
+rows of the sample file up to 10 million.
+
+Every case is run once to warm up and then --repeat times; the report shows
+the median and fastest run. --save stores the medians in baseline.json,
+and later runs are compared against it: --check exits with an error when a
+median is more than --tolerance slower than its baseline. A baseline only
+holds for the machine and settings it was recorded with, so the report
+says when those differ.
+
+    python benchmarks/bench_suite.py --rows 150 100000 --save
+    python benchmarks/bench_suite.py --check
+    python benchmarks/bench_suite.py --cases weather.render --rows 10000000
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lesson-2.2"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lesson-2.3"))
+
+from fake_speech import FakeSpeechBackend, make_wav  # noqa: E402
+from speech_clients import SpeechClientPool  # noqa: E402
+from speech_jobs import JobExecutor, TooManyJobs  # noqa: E402
+from stt_batch import BatchResults, transcribe_batch  # noqa: E402
+from stt_continuous import transcribe_continuous  # noqa: E402
+from synthetic_weather import dataset  # noqa: E402
+from tts_batch import synthesize_long_text  # noqa: E402
+from tts_streaming import stream_synthesis  # noqa: E402
+from weather_charts import (heatmap_figure, render_figure, scatter_figure,  # noqa: E402
+                            trend_figure)
+from weather_data import MEASUREMENTS  # noqa: E402
+from weather_lod import LevelOfDetail  # noqa: E402
+from weather_stats import period_extremes  # noqa: E402
+from weather_store import STATS, ingest, read_stats, read_store  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+VOICE = "en-US-JennyNeural"
+LANGUAGE = "en-US"
+SENTENCE = "The storyteller opened her notebook and read about the river city at dawn. "
+
+# The trend chart of the dashboard, at about one point per pixel
+TEMPERATURE_LINES = (('Temperature Min', 'Min Temperature', 'blue'),
+                     ('Temperature Max', 'Max Temperature', 'red'),
+                     ('Temperature Avg', 'Avg Temperature', 'green'))
+TREND_COLUMNS = [column for column, _, _ in TEMPERATURE_LINES]
+TREND_POINTS = 1400
+
+Case = namedtuple("Case", ["name", "run", "setup", "noise"], defaults=[None, None])
+Case.__doc__ = """
+A benchmark: run(state) is timed, setup() runs untimed before each run
+and its result is passed to run (run() takes no argument without setup).
+If run returns a number, it is used as the measurement instead of the
+time the call took. noise, if given, replaces --noise for a case whose
+timings legitimately vary that much from run to run.
+"""
+
+
+def speech_cases(args, workdir):
+    """Synthesis and transcription through the client pool, as the apps do it"""
+    backend = FakeSpeechBackend(connect_latency=args.connect_latency,
+                                first_byte_latency=args.first_byte_latency,
+                                realtime_factor=args.realtime_factor)
+    pool = SpeechClientPool("fake", "eastus2", backend=backend)
+    paragraph = SENTENCE * 3
+    story = SENTENCE * 60
+    short_clip = make_wav(10.0, seed=1)
+    long_clip = make_wav(60.0, seed=2)
+    clips = [(f"clip{index}.wav", None, lambda seed=index: make_wav(20.0, seed=seed))
+             for index in range(8)]
+    # A cancel waits for the next chunk or file to finish, so those timings
+    # vary by up to the gap between two of them: a tenth of a second or so
+    # between the chunks of the story, up to a whole clip between files
+    chunk_gap = 0.1
+    clip_seconds = args.connect_latency + 20.0 / args.realtime_factor
+    results_path = os.path.join(workdir, "transcripts.jsonl")
+
+    def synthesize():
+        with pool.synthesizer(VOICE, LANGUAGE) as pooled:
+            pooled.client.speak_text_async(paragraph).get()
+
+    def first_chunk():
+        with pool.synthesizer(VOICE, LANGUAGE) as pooled:
+            with stream_synthesis(pooled, paragraph) as stream:
+                stream.wait()
+        return stream.time_to_first_chunk
+
+    def recognize(wav_data, continuous):
+        audio_config = backend.audio_input(wav_data=wav_data)
+        with pool.recognizer(LANGUAGE, audio_config, continuous=continuous) as recognizer:
+            if continuous:
+                transcribe_continuous(recognizer)
+            else:
+                recognizer.recognize_once_async().get()
+
+    def fresh_results():
+        if os.path.exists(results_path):
+            os.unlink(results_path)
+        return BatchResults(results_path)
+
+    def cancel_running(batch):
+        """
+        Seconds from cancelling a running batch job until its function
+        returns. Fails unless that is within about one chunk (the time to
+        the job's first report), and unless the owner's slot is held until
+        the function returns and takes a new job after that.
+        """
+        executor = JobExecutor(max_workers=2, max_jobs_per_owner=1)
+        stopped = threading.Event()
+
+        def run(job):
+            try:
+                batch(job.report)
+            finally:
+                stopped.set()
+
+        start = time.perf_counter()
+        job = executor.submit("bench", "batch", run)
+        while job.progress is None and not stopped.is_set():
+            time.sleep(0.001)
+        if job.done:
+            raise AssertionError(f"batch job ended before it was cancelled: {job.error}")
+        one_chunk = time.perf_counter() - start
+        cancelled = time.perf_counter()
+        executor.cancel(job.id, "bench")
+        if not stopped.is_set():
+            try:
+                executor.submit("bench", "batch", lambda job: None)
+            except TooManyJobs:
+                pass
+            else:
+                raise AssertionError("cancelled batch freed its slot while still running")
+        stopped.wait()
+        seconds = time.perf_counter() - cancelled
+        job.future.result()
+        executor.submit("bench", "batch", lambda job: None).future.result()
+        if seconds > 2 * one_chunk:
+            raise AssertionError(f"cancelled batch ran {seconds:.2f} s on, "
+                                 f"one chunk takes {one_chunk:.2f} s")
+        return seconds
+
+    return [
+        Case("speech.synthesize", synthesize),
+        Case("speech.stream_first_chunk", first_chunk),
+        Case("speech.synthesize_long", lambda: synthesize_long_text(pool, story, VOICE, LANGUAGE)),
+        Case("speech.transcribe", lambda: recognize(short_clip, False)),
+        Case("speech.transcribe_continuous", lambda: recognize(long_clip, True)),
+        Case("speech.transcribe_batch",
+             lambda results: transcribe_batch(pool, backend, clips, LANGUAGE, results),
+             fresh_results),
+        Case("speech.cancel_synthesize_long", lambda: cancel_running(
+            lambda report: synthesize_long_text(pool, story, VOICE, LANGUAGE,
+                                                progress=report)), noise=chunk_gap),
+        Case("speech.cancel_transcribe_batch", lambda results: cancel_running(
+            lambda report: transcribe_batch(
+                pool, backend, clips, LANGUAGE, results,
+                progress=lambda done, total, record: report(done, total))),
+            fresh_results, noise=clip_seconds),
+    ]
+
+
+def weather_cases(rows, workdir):
+    """The dashboard's stages on a synthetic dataset of rows readings"""
+    source = dataset(rows)
+    store = os.path.join(workdir, f"store-{rows}")
+    frames = {}
+
+    def empty_store():
+        shutil.rmtree(store, ignore_errors=True)
+        return store
+
+    def loaded(columns):
+        # Load once, outside the timed aggregate and render cases
+        if columns not in frames:
+            if not os.path.exists(os.path.join(store, "manifest.json")):
+                ingest(source, store)
+            frames[columns] = read_store(store, list(columns))
+        return frames[columns]
+
+    def trend_series():
+        lod = LevelOfDetail(loaded(('Date',) + tuple(TREND_COLUMNS)), TREND_COLUMNS)
+        return lod.series(TREND_COLUMNS, max_points=TREND_POINTS)[1]
+
+    def without_stats():
+        if not os.path.exists(os.path.join(store, "manifest.json")):
+            ingest(source, store)
+        if os.path.exists(os.path.join(store, STATS)):
+            os.unlink(os.path.join(store, STATS))
+
+    def heatmap(correlation):
+        return render_figure(heatmap_figure(correlation, 'Weather Variables Correlation Matrix'))
+
+    extreme_columns = ('Station', 'Date', 'Temperature Max', 'Temperature Min')
+    scatter_columns = ('Humidity Max', 'Total Precipitation')
+    return [
+        Case("weather.ingest", lambda directory: ingest(source, directory), empty_store),
+        Case("weather.ingest_unchanged", lambda: ingest(source, store)),
+        Case("weather.load", lambda: read_store(store, ['Date'] + TREND_COLUMNS)),
+        Case("weather.aggregate.lod", lambda frame: LevelOfDetail(frame, TREND_COLUMNS).series(
+            TREND_COLUMNS, max_points=TREND_POINTS),
+            lambda: loaded(('Date',) + tuple(TREND_COLUMNS))),
+        Case("weather.aggregate.extremes", lambda frame: period_extremes(
+            frame, 'Temperature Max', 'Temperature Min', 'month', by='Station'),
+            lambda: loaded(extreme_columns)),
+        Case("weather.aggregate.stats", lambda _: read_stats(store), without_stats),
+        Case("weather.render.trend", lambda series: render_figure(trend_figure(
+            series, TEMPERATURE_LINES, 'Temperature Trends', 'Temperature (°F)')),
+            trend_series),
+        Case("weather.render.heatmap", heatmap,
+             lambda: read_stats(store).correlation().loc[MEASUREMENTS, MEASUREMENTS]),
+        Case("weather.render.scatter", lambda frame: render_figure(scatter_figure(
+            frame, *scatter_columns, 'Max Humidity vs Total Precipitation',
+            'Max Humidity (%)', 'Total Precipitation (inches)')),
+            lambda: loaded(scatter_columns)),
+    ]
+
+
+def measure(case, repeat, warmup=1):
+    """Seconds of each timed run of a case"""
+    timings = []
+    for index in range(warmup + repeat):
+        state = case.setup() if case.setup else None
+        gc.collect()
+        start = time.perf_counter()
+        result = case.run(state) if case.setup else case.run()
+        seconds = time.perf_counter() - start
+        if isinstance(result, (int, float)) and not isinstance(result, bool):
+            seconds = result
+        if index >= warmup:
+            timings.append(seconds)
+    return timings
+
+
+def settings(args):
+    """What a baseline depends on besides the code"""
+    return {
+        "machine": f"{platform.machine()} {platform.processor() or platform.system()}, "
+                   f"{os.cpu_count()} CPUs",
+        "python": platform.python_version(),
+        "speech": {"connect_latency": args.connect_latency,
+                   "first_byte_latency": args.first_byte_latency,
+                   "realtime_factor": args.realtime_factor},
+    }
+
+
+def read_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as baseline_file:
+        return json.load(baseline_file)
+
+
+def write_baseline(path, baseline, current, results):
+    """Add results to the baseline, starting over when the settings changed"""
+    if baseline is None or baseline["settings"] != current:
+        baseline = {"settings": current, "results": {}}
+    baseline["results"].update(results)
+    baseline["results"] = dict(sorted(baseline["results"].items()))
+    with open(path, "w", encoding="utf-8") as baseline_file:
+        json.dump(baseline, baseline_file, indent=2)
+        baseline_file.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cases", nargs="+", default=["speech", "weather"],
+                        help="run the cases whose names start with one of these")
+    parser.add_argument("--rows", type=int, nargs="+", default=[150, 100000],
+                        help="sizes of the synthetic weather datasets")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--connect-latency", type=float, default=0.15)
+    parser.add_argument("--first-byte-latency", type=float, default=0.05)
+    parser.add_argument("--realtime-factor", type=float, default=25.0)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true",
+                        help="store these results in the baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with an error when a case is slower than its baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown over the baseline, as a fraction")
+    parser.add_argument("--noise", type=float, default=0.002,
+                        help="slowdowns under this many seconds are never regressions")
+    args = parser.parse_args()
+
+    baseline = read_baseline(args.baseline)
+    current = settings(args)
+    compare = baseline is not None and baseline["settings"] == current
+    if baseline is not None and not compare:
+        print(f"Not comparing: {args.baseline} was recorded with other settings, "
+              f"{baseline['settings']}")
+    previous = baseline["results"] if compare else {}
+
+    def selected(name):
+        return any(name.startswith(prefix) for prefix in args.cases)
+
+    results = {}
+    regressions = []
+    print(f"{'case':<46} {'median':>10} {'fastest':>10} {'baseline':>10} {'change':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        groups = [("speech", "", lambda: speech_cases(args, workdir))]
+        groups += [("weather", f"[rows={rows}]", lambda rows=rows: weather_cases(rows, workdir))
+                   for rows in args.rows]
+        for group, suffix, make_cases in groups:
+            # Only build the cases (and datasets) of groups that were asked for
+            if not any(group.startswith(prefix) or prefix.startswith(group)
+                       for prefix in args.cases):
+                continue
+            for case in make_cases():
+                if not selected(case.name):
+                    continue
+                name = case.name + suffix
+                timings = measure(case, args.repeat)
+                median = statistics.median(timings)
+                results[name] = {"median": median, "fastest": min(timings),
+                                 "repeat": args.repeat}
+                line = f"{name:<46} {median * 1000:8.1f}ms {min(timings) * 1000:8.1f}ms"
+                if name in previous:
+                    before = previous[name]["median"]
+                    change = median / before - 1 if before else 0.0
+                    line += f" {before * 1000:8.1f}ms {change:+8.0%}"
+                    noise = args.noise if case.noise is None else case.noise
+                    if change > args.tolerance and median - before > noise:
+                        line += "  SLOWER"
+                        regressions.append(name)
+                print(line, flush=True)
+
+    if args.save:
+        write_baseline(args.baseline, baseline, current, results)
+        print(f"Saved {len(results)} results to {args.baseline}")
+    if args.check and regressions:
+        sys.exit(f"Slower than the baseline: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Time to first audio: blocking synthesis vs streaming synthesis.
+
+Blocking synthesis can only start playback once speak_text_async().get()
+returns, while streaming playback starts with the first `synthesizing`
+chunk. Runs offline against the fake speech backend.
+
+    python benchmarks/bench_tts_streaming.py --words 150
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lesson-2.2"))
+
+from fake_speech import FakeSpeechBackend  # noqa: E402
+from speech_clients import SpeechClientPool  # noqa: E402
+from tts_streaming import stream_synthesis  # noqa: E402
+
+VOICE = "en-US-JennyNeural"
+LANGUAGE = "en-US"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--words", type=int, default=150)
+    parser.add_argument("--realtime-factor", type=float, default=20.0)
+    args = parser.parse_args()
+
+    text = " ".join(["storytelling"] * args.words)
+    backend = FakeSpeechBackend(realtime_factor=args.realtime_factor)
+    pool = SpeechClientPool("fake", "eastus2", backend=backend)
+    pool.warm(VOICE, LANGUAGE)
+    time.sleep(backend.connect_latency)
+
+    with pool.synthesizer(VOICE, LANGUAGE) as pooled:
+        start = time.perf_counter()
+        pooled.client.speak_text_async(text).get()
+        blocking = time.perf_counter() - start
+
+    with pool.synthesizer(VOICE, LANGUAGE) as pooled:
+        with stream_synthesis(pooled, text) as stream:
+            stream.wait()
+        streaming = stream.time_to_first_chunk
+
+    print(f"blocking   first audio after {blocking * 1000:8.1f} ms")
+    print(f"streaming  first audio after {streaming * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
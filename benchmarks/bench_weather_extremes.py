@@ -0,0 +1,114 @@
+"""
+Hottest/coldest day per period: per-month loop vs vectorized period_extremes.
+
+The loop reproduces the old app_final.py section: add Month and Month_Name
+columns with dt.month and dt.strftime('%B') over the whole frame, group with
+idxmax/idxmin, then look up and format the dates of each month in a Python
+loop. period_extremes is timed on the same synthetic frame for every period,
+with and without grouping by station.
+
+    python benchmarks/bench_weather_extremes.py --rows 10000000 --stations 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lesson-2.3"))
+
+from weather_stats import PERIODS, format_dates, period_extremes  # noqa: E402
+
+
+def synthetic_weather(rows, stations, seed=0):
+    """Daily temperatures for several stations, in the app's column names"""
+    rng = np.random.default_rng(seed)
+    days = -(-rows // stations)
+    dates = pd.date_range("1990-01-01", periods=days, freq="D")
+    season = 20 * np.sin((dates.dayofyear.to_numpy() - 110) / 365.25 * 2 * np.pi)
+    station_offset = rng.normal(0, 8, stations)
+    base = (60 + station_offset[:, None] + season[None, :]).ravel()[:rows]
+    avg = base + rng.normal(0, 5, rows)
+    spread = rng.uniform(5, 15, rows)
+    return pd.DataFrame({
+        "Station": pd.Categorical(
+            np.repeat([f"ST{index:03d}" for index in range(stations)], days)[:rows]),
+        "Date": np.tile(dates.to_numpy(), stations)[:rows],
+        "Temperature Max": (avg + spread).astype(np.float32),
+        "Temperature Min": (avg - spread).astype(np.float32),
+    })
+
+
+def legacy_extremes(df):
+    df = df.copy()
+    df['Month'] = df['Date'].dt.month
+    df['Month_Name'] = df['Date'].dt.strftime('%B')
+    monthly_extremes = df.groupby(['Month', 'Month_Name']).agg({
+        'Temperature Max': ['max', 'idxmax'],
+        'Temperature Min': ['min', 'idxmin'],
+        'Date': 'first'
+    })
+    monthly_extremes.columns = ['Max_Temp', 'Max_Temp_Idx', 'Min_Temp', 'Min_Temp_Idx', 'Month_Date']
+    summary_data = []
+    for month, month_name in monthly_extremes.index:
+        row = monthly_extremes.loc[(month, month_name)]
+        summary_data.append({
+            'Month': month_name,
+            'Hottest Day': df.loc[row['Max_Temp_Idx'], 'Date'].strftime('%B %d, %Y'),
+            'Max Temperature (°F)': row['Max_Temp'],
+            'Coldest Day': df.loc[row['Min_Temp_Idx'], 'Date'].strftime('%B %d, %Y'),
+            'Min Temperature (°F)': row['Min_Temp'],
+            'Temperature Range (°F)': row['Max_Temp'] - row['Min_Temp']
+        })
+    return pd.DataFrame(summary_data)
+
+
+def vectorized_extremes(df, period, by=None):
+    extremes = period_extremes(df, 'Temperature Max', 'Temperature Min', period, by)
+    return pd.DataFrame({
+        'Period': extremes['Period'],
+        'Hottest Day': format_dates(extremes['Max Date'], '%B %d, %Y'),
+        'Max Temperature (°F)': extremes['Max'],
+        'Coldest Day': format_dates(extremes['Min Date'], '%B %d, %Y'),
+        'Min Temperature (°F)': extremes['Min'],
+        'Temperature Range (°F)': extremes['Range'],
+    })
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--stations", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_weather(args.rows, args.stations)
+    print(f"{len(df):,} rows, {args.stations} stations, "
+          f"{df['Date'].min():%Y-%m-%d} to {df['Date'].max():%Y-%m-%d}\n")
+
+    # The loop takes minutes at 10M rows, so it only runs once
+    seconds, result = timed(lambda: legacy_extremes(df), 1)
+    print(f"{'loop, calendar month':<28} {seconds * 1000:9.1f} ms  {len(result):>7,} groups")
+    for period in PERIODS:
+        seconds, result = timed(lambda: vectorized_extremes(df, period), args.repeat)
+        print(f"{'vectorized, ' + period:<28} {seconds * 1000:9.1f} ms  {len(result):>7,} groups")
+    for period in PERIODS:
+        seconds, result = timed(
+            lambda: vectorized_extremes(df, period, by="Station"), args.repeat)
+        print(f"{'vectorized, station/' + period:<28} {seconds * 1000:9.1f} ms  {len(result):>7,} groups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Trend chart render time: every reading vs level-of-detail series.
+
+Synthetic hourly temperatures of growing length are drawn with
+weather_charts.trend_figure twice: once with every reading (what plotting
+the full frame did) and once with the series chosen by LevelOfDetail for
+the whole range and for the last 90 days. Rendering is to PNG at the app's
+size, so the times include rasterizing.
+
+    python benchmarks/bench_weather_lod.py --years 1 5 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lesson-2.3"))
+
+from weather_charts import render_figure, trend_figure  # noqa: E402
+from weather_lod import LevelOfDetail  # noqa: E402
+
+LINES = (('Temperature Min', 'Min Temperature', 'blue'),
+         ('Temperature Max', 'Max Temperature', 'red'),
+         ('Temperature Avg', 'Avg Temperature', 'green'))
+COLUMNS = [column for column, _, _ in LINES]
+
+
+def hourly_weather(years, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2000-01-01", periods=int(years * 365.25 * 24), freq="h")
+    hours = np.arange(len(dates))
+    avg = (55 + 20 * np.sin(hours / (365.25 * 24) * 2 * np.pi)
+           + 8 * np.sin(hours / 24 * 2 * np.pi) + rng.normal(0, 3, len(dates)))
+    return pd.DataFrame({
+        "Date": dates,
+        "Temperature Avg": avg.astype(np.float32),
+        "Temperature Max": (avg + 5).astype(np.float32),
+        "Temperature Min": (avg - 5).astype(np.float32),
+    })
+
+
+def render(series):
+    start = time.perf_counter()
+    render_figure(trend_figure(series, LINES, "Temperature", "Temperature (°F)"))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--years", type=float, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--points", type=int, default=1400)
+    args = parser.parse_args()
+
+    print(f"{'years':>6} {'readings':>10} {'every reading':>14} {'build LOD':>10} "
+          f"{'LOD, all':>18} {'LOD, last 90 days':>26}")
+    for years in args.years:
+        df = hourly_weather(years)
+        full = {column: pd.DataFrame({"Date": df["Date"], "value": df[column]})
+                for column in COLUMNS}
+        every_reading = render(full)
+
+        start = time.perf_counter()
+        lod = LevelOfDetail(df, COLUMNS)
+        build = time.perf_counter() - start
+
+        results = []
+        last = df["Date"].iloc[-1]
+        for start_date in (None, (last - pd.Timedelta(days=90)).date()):
+            start = time.perf_counter()
+            detail, series = lod.series(COLUMNS, start_date, None, args.points)
+            seconds = time.perf_counter() - start + render(series)
+            results.append(f"{seconds * 1000:7.0f} ms {detail.level:>5} {detail.points:>5}")
+        print(f"{years:>6g} {len(df):>10,} {every_reading * 1000:>11.0f} ms "
+              f"{build * 1000:>7.0f} ms {results[0]:>18} {results[1]:>26}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Raw data table latency: building, filtering/sorting and page turns by size.
+
+A PagedTable is built over synthetic daily readings of growing size, stored
+and memory-mapped the same way as the app's weather store. For each size
+the script times building the table, the first request for a sorted and
+date-filtered view, and turning pages of that view.
+
+    python benchmarks/bench_weather_table.py --sizes 1000 100000 1000000 10000000
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lesson-2.3"))
+
+from weather_table import PagedTable  # noqa: E402
+
+
+def synthetic_table(rows, stations=100, seed=0):
+    rng = np.random.default_rng(seed)
+    days = -(-rows // stations)
+    dates = np.arange(np.datetime64("1990-01-01"), np.datetime64("1990-01-01") + days)
+    return pa.table({
+        "Date": np.tile(dates.astype("datetime64[ns]"), stations)[:rows],
+        "Temperature Max": rng.normal(70, 15, rows).astype(np.float32),
+        "Temperature Min": rng.normal(50, 15, rows).astype(np.float32),
+        "Total Precipitation": rng.exponential(0.1, rows).astype(np.float32),
+    })
+
+
+def mapped_table(table, directory):
+    path = os.path.join(directory, "table.arrow")
+    feather.write_feather(table, path, compression="uncompressed")
+    return feather.read_table(path, memory_map=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--page-size", type=int, default=25)
+    parser.add_argument("--pages", type=int, default=200)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_weather_table_")
+    try:
+        print(f"{'rows':>12} {'build':>10} {'first view':>12} "
+              f"{'page median':>12} {'page p95':>10}")
+        for rows in args.sizes:
+            table = mapped_table(synthetic_table(rows), scratch)
+
+            start = time.perf_counter()
+            paged = PagedTable(table)
+            build = time.perf_counter() - start
+
+            first, last = paged.date_range()
+            middle = first + (last - first) // 2
+            start = time.perf_counter()
+            positions = paged.view(first, middle, "Temperature Max", ascending=False)
+            first_view = time.perf_counter() - start
+
+            pages = max(1, -(-len(positions) // args.page_size))
+            rng = np.random.default_rng(1)
+            timings = []
+            for page in rng.integers(1, pages + 1, args.pages):
+                start = time.perf_counter()
+                paged.view(first, middle, "Temperature Max", ascending=False)
+                paged.page(positions, int(page), args.page_size)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            print(f"{rows:>12,} {build * 1000:>8.1f} ms {first_view * 1000:>10.1f} ms "
+                  f"{statistics.median(timings) * 1000:>10.3f} ms "
+                  f"{timings[int(len(timings) * 0.95)] * 1000:>8.3f} ms")
+            del paged, table, positions
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Synthetic weather station CSVs in the format of the lesson 2.3 sample.
+
+Each station gets one CSV of daily readings with the sample's two header
+rows, in its own folder so weather_store.py names the station after it.
+Readings follow a seasonal cycle with a per-station offset and noise from
+a seeded generator, so a dataset of a given size is the same on every
+machine. Up to STATION_DAYS rows go to one station; larger datasets are
+spread over as many stations as needed (10 million rows is 913 stations
+of 30 years each).
+
+dataset() writes a dataset once under benchmarks/.data and reuses it:
+
+    python benchmarks/synthetic_weather.py 150 100000 10000000
+"""
+import argparse
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lesson-2.3"))
+
+from weather_data import DATE_FORMAT, SCHEMA  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+
+# Thirty years of days per station
+STATION_DAYS = 10958
+FIRST_DAY = "1995-01-01"
+COMPLETE = ".complete"
+
+
+def header_rows():
+    """The group and label rows, with each group name over its first column"""
+    groups = [field.group if index == 0 or field.group != SCHEMA[index - 1].group else ""
+              for index, field in enumerate(SCHEMA)]
+    return groups, [field.labels[0] for field in SCHEMA]
+
+
+def station_frame(days, seed):
+    """Daily readings of one station, with the sample's columns and units"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(FIRST_DAY, periods=days, freq="D")
+    season = np.sin((dates.dayofyear.to_numpy() - 110) / 365.25 * 2 * np.pi)
+
+    def spread(avg, low, high, decimals):
+        # Like the sample, the averages have one more decimal than max and min
+        width = rng.uniform(low, high, days)
+        return [np.round(avg + width, decimals), np.round(avg, decimals + 1),
+                np.round(avg - width, decimals)]
+
+    temperature = 55 + rng.normal(0, 8) + 22 * season + rng.normal(0, 5, days)
+    dew_point = temperature - rng.uniform(5, 20, days)
+    humidity = np.clip(65 + rng.normal(0, 12, days), 15, 90)
+    wind = np.clip(8 + rng.gamma(2, 1.5, days), 0, 40)
+    pressure = 30 + rng.normal(0, 0.15, days)
+    precipitation = np.where(rng.random(days) < 0.3, rng.gamma(1, 0.3, days), 0)
+
+    columns = [dates.strftime(DATE_FORMAT), dates.day]
+    for avg, low, high, decimals in ((temperature, 4, 12, 0), (dew_point, 3, 8, 0),
+                                     (humidity, 5, 10, 0), (wind, 3, 8, 0),
+                                     (pressure, 0.05, 0.2, 1)):
+        columns += spread(avg, low, high, decimals)
+    columns.append(np.round(precipitation, 2))
+    return pd.DataFrame(dict(zip(range(len(columns)), columns)))
+
+
+def write_dataset(rows, directory, seed=0):
+    """Write rows readings as one CSV per station under directory"""
+    groups, labels = header_rows()
+    header = ",".join(groups) + "\n" + ",".join(labels) + "\n"
+    stations = max(1, -(-rows // STATION_DAYS))
+    for index in range(stations):
+        days = min(STATION_DAYS, rows - index * STATION_DAYS)
+        station_dir = os.path.join(directory, f"station_{index:04d}")
+        os.makedirs(station_dir, exist_ok=True)
+        with open(os.path.join(station_dir, "weather.csv"), "w", encoding="utf-8",
+                  newline="") as csv_file:
+            csv_file.write(header)
+            station_frame(days, seed * 100_003 + index).to_csv(
+                csv_file, header=False, index=False)
+
+
+def dataset(rows, seed=0, root=DATA_DIR):
+    """Folder of a synthetic dataset with rows readings, written on first use"""
+    directory = os.path.join(root, f"weather-{rows}-{seed}")
+    if not os.path.exists(os.path.join(directory, COMPLETE)):
+        # Start over if an earlier run was interrupted while writing
+        shutil.rmtree(directory, ignore_errors=True)
+        write_dataset(rows, directory, seed)
+        open(os.path.join(directory, COMPLETE), "w").close()
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("rows", type=int, nargs="+")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for rows in args.rows:
+        print(f"{rows:>12,} rows  {dataset(rows, args.seed)}")
+
+
+if __name__ == "__main__":
+    main()
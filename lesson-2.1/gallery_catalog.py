@@ -0,0 +1,272 @@
+"""
+Persistent catalog of the images in the gallery folder.
+
+Without an index the gallery would list the folder and open every image on
+each Streamlit rerun just to know their order and sizes. ImageCatalog keeps
+one SQLite row per image with its file size, modification time, dimensions,
+content hash, a 64-bit perceptual hash (dHash), its position in the
+user-defined order and its tags. Navigating, reordering and filtering by
+tag are then queries against the index.
+
+The catalog is brought up to date by an mtime scan: refresh only stats the
+folder itself, and lists it again when the folder changed or the last scan
+is older than max_age (in-place edits do not touch the folder). Only images
+whose size or modification time changed are opened again, in a pool of
+worker processes when there are several. New images are added at the end of
+the order, by file name.
+
+Perceptual hashes of visually identical images differ in a few bits at most,
+even after resizing or recompression, so near_duplicates compares every
+pair by Hamming distance to find repeated uploads.
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from PIL import Image
+
+from gallery_thumbnails import IMAGE_EXTENSIONS, file_hash
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+from process_pools import spawn_pool
+
+CatalogImage = namedtuple(
+    "CatalogImage",
+    ["name", "path", "size", "mtime_ns", "width", "height", "sha256", "phash", "position", "tags"])
+CatalogImage.__doc__ = "One image in the catalog, with its tags as a tuple"
+
+# Perceptual hashes at most this many bits apart (of 64) count as duplicates
+DUPLICATE_DISTANCE = 6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    sha256 TEXT,
+    phash INTEGER,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    name TEXT NOT NULL REFERENCES images (name) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (name, tag)
+);
+CREATE INDEX IF NOT EXISTS tags_by_tag ON tags (tag);
+"""
+
+
+def perceptual_hash(image):
+    """64-bit difference hash of a PIL image"""
+    import numpy as np
+
+    # Brightness gradients of a 9 x 8 grayscale copy, one bit per neighbor pair
+    image.draft('L', (64, 64))
+    pixels = np.asarray(image.convert('L').resize((9, 8), Image.Resampling.LANCZOS),
+                        dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = int.from_bytes(np.packbits(bits).tobytes(), 'big')
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def describe_image(path):
+    """(width, height, sha256, phash) of an image; runs in a worker"""
+    sha256 = file_hash(path)
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            phash = perceptual_hash(image)
+    except OSError:
+        return None, None, sha256, None
+    return width, height, sha256, phash
+
+
+def normalize_tag(tag):
+    """Tags are compared case-insensitively and without extra spaces"""
+    return ' '.join(tag.split()).lower()
+
+
+class ImageCatalog:
+    """SQLite index of an image folder, shared by all sessions"""
+
+    def __init__(self, folder, db_path, max_workers=None):
+        self.folder = folder
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.scans = 0
+        self.opened = 0
+        self._scanned_at = 0.0
+        self._folder_mtime = None
+        self._lock = threading.RLock()
+        self._scan_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def refresh(self, max_age=30.0):
+        """Scan the folder if it changed or was last scanned over max_age seconds ago"""
+        try:
+            folder_mtime = os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            folder_mtime = None
+        with self._lock:
+            if (folder_mtime == self._folder_mtime
+                    and time.monotonic() - self._scanned_at < max_age):
+                return False
+        self.scan()
+        return True
+
+    def scan(self):
+        """
+        Bring the catalog up to date with the folder.
+
+        Returns (added, changed, removed) counts.
+        """
+        # Scans run one at a time, but sessions keep reading the catalog while
+        # the changed images are opened
+        with self._scan_lock:
+            with self._lock:
+                try:
+                    self._folder_mtime = os.stat(self.folder).st_mtime_ns
+                    with os.scandir(self.folder) as entries:
+                        files = {entry.name: entry.stat() for entry in entries if entry.is_file()
+                                 and entry.name.lower().endswith(IMAGE_EXTENSIONS)}
+                except FileNotFoundError:
+                    files = {}
+                known = {name: (size, mtime_ns) for name, size, mtime_ns
+                         in self._db.execute("SELECT name, size, mtime_ns FROM images")}
+
+            stale = sorted(
+                (name for name, stat in files.items()
+                 if known.get(name) != (stat.st_size, stat.st_mtime_ns)),
+                key=str.lower)
+            paths = [os.path.join(self.folder, name) for name in stale]
+            if len(paths) > 1 and self.max_workers != 1:
+                # Spawned, not forked, since this runs inside the Streamlit server
+                with spawn_pool(self.max_workers) as executor:
+                    described = list(executor.map(describe_image, paths))
+            else:
+                described = [describe_image(path) for path in paths]
+
+            removed = set(known) - set(files)
+            with self._lock, self._db:
+                self._db.executemany("DELETE FROM images WHERE name = ?",
+                                     [(name,) for name in removed])
+                position = self._db.execute(
+                    "SELECT COALESCE(MAX(position), -1) FROM images").fetchone()[0]
+                for name, (width, height, sha256, phash) in zip(stale, described):
+                    stat = files[name]
+                    if name in known:
+                        self._db.execute(
+                            "UPDATE images SET size = ?, mtime_ns = ?, width = ?, height = ?,"
+                            " sha256 = ?, phash = ? WHERE name = ?",
+                            (stat.st_size, stat.st_mtime_ns, width, height, sha256, phash, name))
+                    else:
+                        position += 1
+                        self._db.execute(
+                            "INSERT INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (name, stat.st_size, stat.st_mtime_ns, width, height, sha256, phash,
+                             position))
+                self.scans += 1
+                self.opened += len(stale)
+                self._scanned_at = time.monotonic()
+            added = len(set(stale) - set(known))
+            return added, len(stale) - added, len(removed)
+
+    def _rows(self, where='', parameters=()):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, size, mtime_ns, width, height, sha256, phash, position,"
+                " (SELECT group_concat(tag, char(31)) FROM tags WHERE tags.name = images.name)"
+                f" FROM images {where} ORDER BY position", parameters).fetchall()
+        return [
+            CatalogImage(name, os.path.join(self.folder, name), size, mtime_ns, width, height,
+                         sha256, phash, position,
+                         tuple(sorted(tags.split(chr(31)))) if tags else ())
+            for name, size, mtime_ns, width, height, sha256, phash, position, tags in rows
+        ]
+
+    def images(self, tag=None):
+        """Images in the user-defined order, only those with tag if given"""
+        if tag is None:
+            return self._rows()
+        return self._rows("WHERE name IN (SELECT name FROM tags WHERE tag = ?)",
+                          (normalize_tag(tag),))
+
+    def get(self, name):
+        """The image with the given file name, or None"""
+        rows = self._rows("WHERE name = ?", (name,))
+        return rows[0] if rows else None
+
+    def tags(self):
+        """{tag: number of images} of every tag in use"""
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT tag, COUNT(*) FROM tags GROUP BY tag ORDER BY tag"))
+
+    def set_tags(self, name, tags):
+        """Replace the tags of an image"""
+        tags = sorted({normalize_tag(tag) for tag in tags if tag.strip()})
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM tags WHERE name = ?", (name,))
+            self._db.executemany("INSERT INTO tags VALUES (?, ?)",
+                                 [(name, tag) for tag in tags])
+
+    def swap(self, first, second):
+        """Exchange the places of two images in the order"""
+        with self._lock, self._db:
+            positions = dict(self._db.execute(
+                "SELECT name, position FROM images WHERE name IN (?, ?)", (first, second)))
+            if len(positions) == 2:
+                self._db.executemany("UPDATE images SET position = ? WHERE name = ?",
+                                     [(positions[second], first), (positions[first], second)])
+
+    def near_duplicates(self, max_distance=DUPLICATE_DISTANCE):
+        """
+        Groups of visually near-identical images, largest first.
+
+        Two images are linked when their perceptual hashes are at most
+        max_distance bits apart; a group is a connected set of links.
+        """
+        # numpy is only needed here and in the scan workers, so the gallery
+        # starts without it
+        import numpy as np
+
+        images = [image for image in self._rows() if image.phash is not None]
+        if len(images) < 2:
+            return []
+        # Bits set in each byte value, for Hamming distances of packed hashes
+        popcount = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+        hashes = np.array([image.phash for image in images], dtype=np.int64).view(np.uint64)
+        parent = list(range(len(images)))
+
+        def root(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        # One row of the pairwise distance matrix at a time keeps memory linear
+        for index in range(len(images) - 1):
+            differing = (hashes[index + 1:] ^ hashes[index]).view(np.uint8)
+            distances = popcount[differing].reshape(-1, 8).sum(axis=1)
+            for other in np.flatnonzero(distances <= max_distance) + index + 1:
+                parent[root(int(other))] = root(index)
+
+        groups = {}
+        for index, image in enumerate(images):
+            groups.setdefault(root(index), []).append(image)
+        duplicates = [group for group in groups.values() if len(group) > 1]
+        return sorted(duplicates, key=len, reverse=True)
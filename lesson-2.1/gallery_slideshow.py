@@ -0,0 +1,141 @@
+"""
+Prefetching image loader for the gallery slideshow.
+
+Decoding a multi-megabyte PNG and scaling it to the screen takes long enough
+to be a visible stall on every Previous/Next click. SlideCache keeps the
+slides it has prepared in an LRU bounded by memory, and prepares the
+neighbors of the slide being shown on background threads (Pillow releases
+the GIL while decoding and resizing), so by the time the user clicks the
+next slide is usually ready.
+
+A slide is the image decoded, turned upright, scaled down to fit
+max_size and encoded once, as JPEG or as PNG when it has transparency.
+st.image serves JPEG and PNG bytes no wider than its maximum content width
+as they are, but decodes, resizes and encodes again anything else on every
+rerun, which is what made showing the full-size file slow. Keeping slides
+encoded also makes one take a fraction of the memory of its pixels.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+# Widest image st.image shows without resizing it again
+SLIDE_SIZE = 1460
+SLIDE_QUALITY = 90
+
+
+def prepare_slide(path, max_size=SLIDE_SIZE):
+    """Decode an image, scale it to fit max_size and encode it as JPEG or PNG bytes"""
+    with Image.open(path) as image:
+        image.draft('RGB', (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        buffer = io.BytesIO()
+        if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+            image.convert('RGBA').save(buffer, 'PNG')
+        else:
+            image.convert('RGB').save(buffer, 'JPEG', quality=SLIDE_QUALITY)
+    return buffer.getvalue()
+
+
+class SlideCache:
+    """Display-ready slides in a memory-bounded LRU, prefetched in the background"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_size=SLIDE_SIZE, max_workers=2):
+        self.max_bytes = max_bytes
+        self.max_size = max_size
+        self.hits = 0
+        self.waits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.evictions = 0
+        self._slides = OrderedDict()
+        self._bytes = 0
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='slide-prefetch')
+        self._lock = threading.Lock()
+
+    def _key(self, path):
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size
+
+    def _store(self, key, slide):
+        """Add a slide and evict the least recently used ones over the budget"""
+        with self._lock:
+            if key in self._slides:
+                return
+            self._slides[key] = slide
+            self._bytes += len(slide)
+            # Always keep the newest slide, even if it alone is over budget
+            while self._bytes > self.max_bytes and len(self._slides) > 1:
+                _, evicted = self._slides.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def _load(self, key):
+        slide = prepare_slide(key[0], self.max_size)
+        self._store(key, slide)
+        return slide
+
+    def _finished(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def get(self, path):
+        """
+        The slide of an image, as JPEG or PNG bytes.
+
+        Comes from the cache when prefetched, waits for a prefetch that is
+        still running, and otherwise prepares the slide right away.
+        """
+        key = self._key(path)
+        with self._lock:
+            slide = self._slides.get(key)
+            if slide is not None:
+                self._slides.move_to_end(key)
+                self.hits += 1
+                return slide
+            future = self._pending.get(key)
+            if future is not None:
+                self.waits += 1
+            else:
+                self.misses += 1
+        if future is not None:
+            return future.result()
+        return self._load(key)
+
+    def prefetch(self, paths):
+        """Start preparing the slides of paths that are not cached yet"""
+        for path in paths:
+            try:
+                key = self._key(path)
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                if key in self._slides or key in self._pending:
+                    continue
+                future = self._executor.submit(self._load, key)
+                self._pending[key] = future
+                self.prefetched += 1
+            future.add_done_callback(lambda done, key=key: self._finished(key, done))
+
+    def stats(self):
+        """Return hit counters and the memory held by cached slides"""
+        with self._lock:
+            lookups = self.hits + self.waits + self.misses
+            return {
+                "hits": self.hits,
+                "waits": self.waits,
+                "misses": self.misses,
+                "prefetched": self.prefetched,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._slides),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
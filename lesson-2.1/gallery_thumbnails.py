@@ -0,0 +1,245 @@
+"""
+Thumbnails for the image gallery.
+
+Opening every multi-megabyte PNG in the folder to draw a grid is what makes
+a naive gallery slow and memory hungry. ThumbnailCache decodes each image
+once, in a pool of worker processes, and saves a small WebP or JPEG copy in
+a cache directory keyed by the SHA-256 of the image's contents, so renamed
+or re-uploaded images reuse their thumbnail and edited ones get a new one.
+The app process only ever holds file paths and the few thumbnails of the
+page being shown; full-size images are decoded by the workers and dropped
+as soon as they are scaled down.
+
+Thumbnails can also be built ahead of time from the command line:
+
+    python gallery_thumbnails.py my_images --size 320 --format webp
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+
+from PIL import Image, ImageOps
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+from process_pools import spawn_pool
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp')
+
+# Pillow format name and file extension of each thumbnail format
+THUMBNAIL_FORMATS = {'webp': ('WEBP', 'webp'), 'jpeg': ('JPEG', 'jpg')}
+
+THUMBNAIL_SIZE = 320
+THUMBNAIL_QUALITY = 80
+
+
+def list_images(folder):
+    """Paths of the images directly in folder, sorted by file name"""
+    try:
+        with os.scandir(folder) as scan:
+            paths = [entry.path for entry in scan if entry.is_file()
+                     and entry.name.lower().endswith(IMAGE_EXTENSIONS)]
+    except FileNotFoundError:
+        return []
+    return sorted(paths, key=lambda path: os.path.basename(path).lower())
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as data:
+        for block in iter(lambda: data.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def thumbnail_path(directory, digest, size, image_format):
+    """Where the thumbnail of an image with the given content hash is kept"""
+    extension = THUMBNAIL_FORMATS[image_format][1]
+    return os.path.join(directory, digest[:2], f"{digest}-{size}.{extension}")
+
+
+def make_thumbnail(source, target, size=THUMBNAIL_SIZE, image_format='webp'):
+    """Scale an image down to fit a size x size box and save it to target"""
+    pillow_format = THUMBNAIL_FORMATS[image_format][0]
+    with Image.open(source) as image:
+        # JPEGs can be decoded at a fraction of their size straight away
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if pillow_format == 'JPEG' and image.mode in ('RGBA', 'LA', 'P'):
+            # JPEG has no transparency, so flatten onto white
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.convert('RGBA'))
+            image = background
+        elif pillow_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+        os.close(fd)
+        try:
+            image.save(temp_path, pillow_format, quality=THUMBNAIL_QUALITY)
+            os.replace(temp_path, target)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+def _build_thumbnail(source, directory, size, image_format):
+    """Hash an image and make its thumbnail if missing; runs in a worker"""
+    digest = file_hash(source)
+    target = thumbnail_path(directory, digest, size, image_format)
+    created = not os.path.exists(target)
+    if created:
+        make_thumbnail(source, target, size, image_format)
+    return digest, target, created
+
+
+class ThumbnailCache:
+    """
+    Content-addressed thumbnails, built in a pool of worker processes.
+
+    Pass executor to build in a pool shared with other caches; it is left
+    running by close(). Otherwise the cache starts its own pool of
+    max_workers processes when the first thumbnail is missing.
+    """
+
+    def __init__(self, directory, size=THUMBNAIL_SIZE, image_format='webp', max_workers=None,
+                 executor=None):
+        if image_format not in THUMBNAIL_FORMATS:
+            raise ValueError(f"Unsupported thumbnail format: {image_format}")
+        self.directory = directory
+        self.size = size
+        self.image_format = image_format
+        self.max_workers = max_workers
+        self.built = 0
+        self.failed = 0
+        # Thumbnail path (None for unreadable images) by (image path,
+        # mtime_ns, size), so unchanged images are not hashed on every rerun
+        self._known = {}
+        self._pending = {}
+        self._executor = executor
+        self._owns_executor = executor is None
+        # Reentrant, as a future that is already done runs its callback at once
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _key(self, path):
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size
+
+    def _submit(self, key):
+        """Future for the thumbnail of key, starting the work if needed"""
+        future = self._pending.get(key)
+        if future is None:
+            if self._executor is None:
+                # Spawned, not forked, since this runs inside the Streamlit server
+                self._executor = spawn_pool(self.max_workers)
+            future = self._executor.submit(
+                _build_thumbnail, key[0], self.directory, self.size, self.image_format)
+            self._pending[key] = future
+            future.add_done_callback(lambda done, key=key: self._finished(key, done))
+        return future
+
+    def _finished(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                _, target, created = future.result()
+                self._known[key] = target
+                self.built += created
+            else:
+                self._known[key] = None
+                self.failed += 1
+
+    def thumbnails(self, paths):
+        """
+        Thumbnail path of each image, building the missing ones.
+
+        Returns a list in the order of paths, with None for images that
+        could not be read. Missing thumbnails are built in parallel.
+        """
+        futures = {}
+        result = [None] * len(paths)
+        with self._lock:
+            for index, path in enumerate(paths):
+                try:
+                    key = self._key(path)
+                except FileNotFoundError:
+                    continue
+                known = self._known.get(key, '')
+                if known is None:
+                    continue
+                if known and os.path.exists(known):
+                    result[index] = known
+                else:
+                    futures[index] = self._submit(key)
+        for index, future in futures.items():
+            try:
+                result[index] = future.result()[1]
+            except Exception:
+                result[index] = None
+        return result
+
+    def warm(self, paths):
+        """Start building the missing thumbnails of paths without waiting"""
+        with self._lock:
+            for path in paths:
+                try:
+                    key = self._key(path)
+                except FileNotFoundError:
+                    continue
+                if key not in self._known:
+                    self._submit(key)
+
+    def pending(self):
+        """Number of thumbnails still being built"""
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        """Stop the worker processes, unless the pool is shared"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            pending = list(self._pending.values())
+        if executor is None:
+            return
+        if self._owns_executor:
+            executor.shutdown(cancel_futures=True)
+        else:
+            for future in pending:
+                future.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build gallery thumbnails for a folder of images")
+    parser.add_argument("folder", help="folder with the images")
+    parser.add_argument("--cache", default=".thumbnails")
+    parser.add_argument("--size", type=int, default=THUMBNAIL_SIZE)
+    parser.add_argument("--format", choices=list(THUMBNAIL_FORMATS), default="webp")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    cache = ThumbnailCache(args.cache, args.size, args.format, args.workers)
+    try:
+        paths = list_images(args.folder)
+        thumbnails = cache.thumbnails(paths)
+    finally:
+        cache.close()
+    for path, thumbnail in zip(paths, thumbnails):
+        if thumbnail is None:
+            print(f"could not read {path}", file=sys.stderr)
+    print(f"{len(paths)} images, {cache.built} thumbnails built, {cache.failed} unreadable")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
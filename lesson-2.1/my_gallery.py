@@ -0,0 +1,236 @@
+import os
+import sys
+
+import streamlit as st
+
+# Modules shared by the lessons
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+from gallery_catalog import ImageCatalog
+from gallery_slideshow import SlideCache
+from gallery_thumbnails import THUMBNAIL_FORMATS, ThumbnailCache
+from process_pools import spawn_pool
+
+# Set page configuration
+st.set_page_config(
+    page_title="My AI Image Gallery",
+    page_icon="🖼️",
+    layout="wide"
+)
+
+LESSON_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = os.environ.get('GALLERY_IMAGE_DIR', os.path.join(LESSON_DIR, 'my_images'))
+THUMBNAIL_DIR = os.environ.get('GALLERY_THUMBNAIL_DIR', os.path.join(LESSON_DIR, '.thumbnails'))
+CATALOG_PATH = os.environ.get('GALLERY_CATALOG', os.path.join(LESSON_DIR, '.gallery_catalog.db'))
+
+# Seconds between folder scans while the folder itself is unchanged
+SCAN_INTERVAL = float(os.environ.get('GALLERY_SCAN_SECONDS', '30'))
+
+# Slides prepared ahead on each side of the current one, and the memory
+# the prepared slides may take
+PREFETCH = int(os.environ.get('GALLERY_PREFETCH', '2'))
+SLIDE_CACHE_MB = int(os.environ.get('GALLERY_SLIDE_CACHE_MB', '256'))
+
+GRID_COLUMNS = 4
+PAGE_SIZES = [8, 12, 24, 48]
+ALL_IMAGES = "All images"
+
+MIME_TYPES = {'.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
+              '.webp': 'image/webp', '.gif': 'image/gif', '.bmp': 'image/bmp'}
+
+
+@st.cache_resource
+def get_thumbnail_pool():
+    """Start the worker processes that build thumbnails once per process"""
+    return spawn_pool()
+
+
+@st.cache_resource
+def get_thumbnail_cache(image_format):
+    """Create the shared thumbnail cache of a format once per process"""
+    return ThumbnailCache(THUMBNAIL_DIR, image_format=image_format, executor=get_thumbnail_pool())
+
+
+@st.cache_resource
+def get_slide_cache():
+    """Create the shared slide cache and its prefetch threads once per process"""
+    return SlideCache(max_bytes=SLIDE_CACHE_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def get_catalog():
+    """Open the image catalog once per process"""
+    return ImageCatalog(IMAGE_DIR, CATALOG_PATH)
+
+
+def image_title(image):
+    """Display name of an image, from its file name"""
+    return os.path.splitext(image.name)[0].replace('_', ' ').replace('-', ' ')
+
+
+def read_file(path):
+    """Return a function that reads a file, for download buttons"""
+    def read():
+        with open(path, 'rb') as image_file:
+            return image_file.read()
+    return read
+
+
+def open_slide(index):
+    """Show an image from the grid in the slideshow"""
+    st.session_state['slide'] = index
+    st.session_state['view'] = "Slideshow"
+
+
+def step_slide(step, count):
+    """Move the slideshow forwards or backwards, wrapping around"""
+    st.session_state['slide'] = (st.session_state.get('slide', 0) + step) % count
+
+
+def move_slide(images, index, step):
+    """Swap the current image with its neighbor and keep showing it"""
+    other = index + step
+    if 0 <= other < len(images):
+        get_catalog().swap(images[index].name, images[other].name)
+        st.session_state['slide'] = other
+
+
+def save_tags(name):
+    """Store the tags typed for an image"""
+    tags = st.session_state[f"tags-{name}"].split(',')
+    get_catalog().set_tags(name, tags)
+
+
+def show_grid(images, cache, page_size):
+    """Tiled thumbnails of one page of the gallery"""
+    pages = max(1, -(-len(images) // page_size))
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1)
+    start = (page - 1) * page_size
+    page_images = images[start:start + page_size]
+
+    # Only this page's thumbnails are needed now; the rest are built in the
+    # background so later pages open instantly
+    thumbnails = cache.thumbnails([image.path for image in page_images])
+    cache.warm([image.path for image in images])
+
+    for row in range(0, len(page_images), GRID_COLUMNS):
+        columns = st.columns(GRID_COLUMNS)
+        for column, image, thumbnail, index in zip(
+                columns, page_images[row:], thumbnails[row:], range(start + row, len(images))):
+            with column:
+                if thumbnail is None:
+                    st.warning(f"Could not read {image.name}")
+                else:
+                    st.image(thumbnail, caption=image_title(image), width='stretch')
+                st.button("Open", key=f"open-{index}", on_click=open_slide, args=(index,),
+                          width='stretch')
+    st.caption(f"Page {page} of {pages}, {len(images)} images")
+
+
+def show_slideshow(images):
+    """One full-size image at a time with navigation controls"""
+    count = len(images)
+    index = st.session_state.get('slide', 0) % count
+    image = images[index]
+
+    previous_col, position_col, next_col = st.columns([1, 4, 1])
+    previous_col.button("◀ Previous", on_click=step_slide, args=(-1, count), width='stretch')
+    next_col.button("Next ▶", on_click=step_slide, args=(1, count), width='stretch')
+    position_col.markdown(f"<p style='text-align: center'>Image {index + 1} of {count}</p>",
+                          unsafe_allow_html=True)
+
+    slides = get_slide_cache()
+    try:
+        # Usually prepared while the previous slide was on screen
+        slide = slides.get(image.path) if image.width is not None else None
+    except OSError:
+        slide = None
+    if slide is None:
+        st.warning(f"Could not read {image.name}")
+    else:
+        st.image(slide, caption=image_title(image), width='stretch')
+        st.caption(f"{image.name}, {image.width} × {image.height} px, "
+                   f"{image.size / (1024 * 1024):.1f} MB")
+
+    # Prepare the slides the user is most likely to open next
+    neighbors = []
+    for step in range(1, PREFETCH + 1):
+        neighbors += [images[(index + step) % count], images[(index - step) % count]]
+    slides.prefetch([neighbor.path for neighbor in neighbors if neighbor.width is not None])
+
+    tags_col, earlier_col, later_col, download_col = st.columns([4, 1, 1, 1],
+                                                               vertical_alignment='bottom')
+    tags_col.text_input("Tags (comma separated)", value=", ".join(image.tags),
+                        key=f"tags-{image.name}", on_change=save_tags, args=(image.name,))
+    earlier_col.button("Move earlier", on_click=move_slide, args=(images, index, -1),
+                       disabled=index == 0, width='stretch')
+    later_col.button("Move later", on_click=move_slide, args=(images, index, 1),
+                     disabled=index == count - 1, width='stretch')
+    extension = os.path.splitext(image.name)[1].lower()
+    download_col.download_button("Download", data=read_file(image.path),
+                                 file_name=image.name,
+                                 mime=MIME_TYPES.get(extension, 'application/octet-stream'),
+                                 on_click="ignore", icon=":material/download:", width='stretch')
+
+
+def show_duplicates(catalog, cache):
+    """Groups of images that look the same, to clean up repeated uploads"""
+    groups = catalog.near_duplicates()
+    if not groups:
+        st.success("No near-duplicate images found.")
+        return
+    st.write(f"{len(groups)} groups of images that look alike:")
+    for group in groups:
+        thumbnails = cache.thumbnails([image.path for image in group])
+        columns = st.columns(GRID_COLUMNS)
+        for number, (image, thumbnail) in enumerate(zip(group, thumbnails)):
+            with columns[number % GRID_COLUMNS]:
+                if thumbnail is not None:
+                    st.image(thumbnail, width='stretch')
+                st.caption(f"{image.name}, {image.width} × {image.height} px, "
+                           f"{image.size / (1024 * 1024):.1f} MB")
+        st.divider()
+
+
+st.title("My AI Image Gallery")
+
+catalog = get_catalog()
+
+with st.sidebar:
+    st.header("Gallery")
+    view = st.radio("View", ["Grid", "Slideshow", "Duplicates"], key='view')
+    tag_counts = catalog.tags()
+    collection = st.selectbox(
+        "Collection", [ALL_IMAGES] + list(tag_counts),
+        format_func=lambda tag: tag if tag == ALL_IMAGES else f"{tag} ({tag_counts[tag]})")
+    page_size = st.selectbox("Images per page", PAGE_SIZES, index=1)
+    thumbnail_format = st.selectbox("Thumbnail format", list(THUMBNAIL_FORMATS),
+                                    format_func=str.upper)
+    if st.button("Rescan folder"):
+        catalog.scan()
+
+# Only opens images that are new or changed since the last scan
+catalog.refresh(SCAN_INTERVAL)
+images = catalog.images(None if collection == ALL_IMAGES else collection)
+if not images:
+    st.info(f"Add images to {IMAGE_DIR} to see them here.")
+    st.stop()
+
+cache = get_thumbnail_cache(thumbnail_format)
+if view == "Grid":
+    show_grid(images, cache, page_size)
+elif view == "Slideshow":
+    show_slideshow(images)
+else:
+    show_duplicates(catalog, cache)
+
+with st.sidebar:
+    pending = cache.pending()
+    if pending:
+        st.caption(f"Building {pending} thumbnails in the background")
+    if view == "Slideshow":
+        slide_stats = get_slide_cache().stats()
+        st.caption(f"Slide cache: {slide_stats['hit_rate']:.0%} ready on arrival, "
+                   f"{slide_stats['entries']} slides, "
+                   f"{slide_stats['bytes'] / (1024 * 1024):.1f} of "
+                   f"{slide_stats['max_bytes'] / (1024 * 1024):.0f} MB")
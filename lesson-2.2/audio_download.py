@@ -0,0 +1,31 @@
+"""
+Download buttons for audio clips.
+
+The old get_binary_file_downloader_html helper base64-encoded the whole clip
+into an <a href="data:..."> link, which added a third to its size, kept
+several copies in memory and pushed all of it over the websocket on every
+rerun. st.download_button serves the file from Streamlit's media endpoint
+instead, and when given a callable it only produces the bytes once the user
+actually clicks.
+"""
+import streamlit as st
+
+
+def audio_download_button(label, data, file_name, mime_type="audio/wav",
+                          key=None):
+    """
+    Show a button that downloads an audio clip.
+
+    data may be the bytes themselves or a zero-argument callable returning
+    them; a callable is only run when the button is clicked. Clicking does
+    not rerun the script, so the page keeps showing the current result.
+    """
+    return st.download_button(
+        label,
+        data=data,
+        file_name=file_name,
+        mime=mime_type,
+        key=key,
+        on_click="ignore",
+        icon=":material/download:"
+    )
@@ -0,0 +1,152 @@
+"""
+Audio output formats shared by the speech apps.
+
+Each AudioFormat ties together the Speech SDK output format used for
+synthesis, the format used while streaming, the pydub export settings used
+for recordings, and the file extension and MIME type used for caching,
+downloads and saving. All formats are 16 kHz mono, the native rate of the
+speech service.
+
+Browser recordings usually arrive at 44.1 or 48 kHz in stereo;
+encode_recording converts them to 16 kHz mono first, which makes a WAV
+recording about six times smaller.
+"""
+import hashlib
+import io
+import struct
+import wave
+from collections import namedtuple
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+AudioFormat = namedtuple("AudioFormat", [
+    "label", "extension", "mime_type", "synthesis_format", "streaming_format",
+    "export_format", "export_parameters"])
+
+AUDIO_FORMATS = {
+    "wav": AudioFormat(
+        label="WAV (uncompressed)",
+        extension="wav",
+        mime_type="audio/wav",
+        synthesis_format="Riff16Khz16BitMonoPcm",
+        # Raw PCM behind a streaming WAV header, see streaming_wav_header()
+        streaming_format="Raw16Khz16BitMonoPcm",
+        export_format="wav",
+        export_parameters={}),
+    "mp3": AudioFormat(
+        label="MP3 (32 kbit/s)",
+        extension="mp3",
+        mime_type="audio/mpeg",
+        synthesis_format="Audio16Khz32KBitRateMonoMp3",
+        streaming_format="Audio16Khz32KBitRateMonoMp3",
+        export_format="mp3",
+        export_parameters={"bitrate": "32k",
+                           "parameters": ["-ar", "16000", "-ac", "1"]}),
+    "ogg": AudioFormat(
+        label="Ogg Opus (about 24 kbit/s)",
+        extension="ogg",
+        mime_type="audio/ogg",
+        synthesis_format="Ogg16Khz16BitMonoOpus",
+        streaming_format="Ogg16Khz16BitMonoOpus",
+        export_format="ogg",
+        export_parameters={"codec": "libopus", "bitrate": "24k",
+                           "parameters": ["-ar", "16000", "-ac", "1"]}),
+}
+
+DEFAULT_FORMAT = "wav"
+
+
+def pcm_to_wav(pcm, sample_rate=SAMPLE_RATE):
+    """Wrap 16-bit mono PCM in a RIFF WAV header"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def to_pcm(audio_data):
+    """Return raw PCM, dropping a RIFF header if there is one"""
+    if audio_data[:4] == b"RIFF":
+        with wave.open(io.BytesIO(audio_data), "rb") as wav_file:
+            return wav_file.readframes(wav_file.getnframes())
+    return bytes(audio_data)
+
+
+def streaming_wav_header(sample_rate=SAMPLE_RATE):
+    """
+    WAV header for PCM of unknown length.
+
+    The sizes are set to the maximum value, which browsers treat as "play
+    until the data ends", so raw PCM can be streamed behind it.
+    """
+    byte_rate = sample_rate * SAMPLE_WIDTH
+    return (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate,
+                                    byte_rate, SAMPLE_WIDTH, 16)
+            + b"data" + struct.pack("<I", 0xFFFFFFFF - 36))
+
+
+def encode_pcm(pcm, audio_format, sample_rate=SAMPLE_RATE):
+    """Encode 16-bit mono PCM in the given AudioFormat"""
+    if audio_format.export_format == "wav":
+        return pcm_to_wav(pcm, sample_rate)
+    from pydub import AudioSegment
+
+    segment = AudioSegment(data=pcm, sample_width=SAMPLE_WIDTH,
+                           frame_rate=sample_rate, channels=1)
+    return export_segment(segment, audio_format)
+
+
+def export_segment(segment, audio_format, target=None):
+    """
+    Export a pydub AudioSegment in the given AudioFormat.
+
+    Writes to target (a path or file object) when given, otherwise returns
+    the encoded bytes. MP3 and Ogg export need ffmpeg on the PATH.
+    """
+    if target is not None:
+        segment.export(target, format=audio_format.export_format,
+                       **audio_format.export_parameters)
+        return None
+    buffer = io.BytesIO()
+    segment.export(buffer, format=audio_format.export_format,
+                   **audio_format.export_parameters)
+    return buffer.getvalue()
+
+
+def recording_id(segment, sample_bytes=65536):
+    """
+    Identity of a recorded AudioSegment that is cheap to compute on a rerun.
+
+    Hashes the audio format, the length and samples from the start, middle
+    and end of the audio instead of all of it, so it takes the same time
+    for a long recording as for a short one.
+    """
+    data = segment.raw_data
+    middle = max(0, len(data) // 2 - sample_bytes // 2)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{segment.frame_rate}:{segment.channels}:{segment.sample_width}:"
+                  f"{len(data)}".encode("ascii"))
+    for start in (0, middle, max(0, len(data) - sample_bytes)):
+        digest.update(data[start:start + sample_bytes])
+    return digest.hexdigest()
+
+
+def encode_recording(segment, audio_format, native=True):
+    """
+    Encode a recorded AudioSegment in the given AudioFormat.
+
+    With native, the audio is first converted to 16 kHz 16-bit mono, the
+    speech service's input format; WAV is then written straight from the
+    converted samples without going through pydub's exporter.
+    """
+    if native:
+        segment = (segment.set_channels(1).set_frame_rate(SAMPLE_RATE)
+                   .set_sample_width(SAMPLE_WIDTH))
+        if audio_format.export_format == "wav":
+            return pcm_to_wav(segment.raw_data)
+    return export_segment(segment, audio_format)
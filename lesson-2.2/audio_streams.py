@@ -0,0 +1,86 @@
+"""
+In-memory audio input for speech recognition.
+
+Uploaded WAV files used to be written to a NamedTemporaryFile so the SDK
+could open them by name, and the file leaked whenever an exception fired
+before os.unlink. Here the WAV header is parsed in place and the PCM payload
+is handed to the SDK through a PullAudioInputStream whose read callback
+copies straight from a memoryview into the SDK's buffer, so uploads never
+touch disk and are never duplicated in Python.
+"""
+import functools
+import struct
+from collections import namedtuple
+
+from lazy_imports import speechsdk
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+WavAudio = namedtuple(
+    "WavAudio", ["sample_rate", "bits_per_sample", "channels", "pcm"])
+WavAudio.__doc__ = "PCM WAV parameters plus a memoryview of the samples"
+
+
+def parse_wav(data):
+    """Locate the format and PCM data of a WAV file without copying it"""
+    view = memoryview(data)
+    if len(view) < 12 or view[:4] != b"RIFF" or view[8:12] != b"WAVE":
+        raise ValueError("Not a WAV file")
+
+    fmt = None
+    position = 12
+    while position + 8 <= len(view):
+        chunk_id = bytes(view[position:position + 4])
+        chunk_size = struct.unpack_from("<I", view, position + 4)[0]
+        body = position + 8
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", view, body)
+        elif chunk_id == b"data":
+            if fmt is None:
+                break
+            format_tag, channels, sample_rate, _, _, bits = fmt
+            if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE):
+                raise ValueError("Only PCM WAV files are supported")
+            # Recorders that stream WAV sometimes leave the size unset
+            end = min(body + chunk_size, len(view))
+            return WavAudio(sample_rate, bits, channels, view[body:end])
+        # Chunks are padded to an even number of bytes
+        position = body + chunk_size + (chunk_size & 1)
+    raise ValueError("WAV file has no audio data")
+
+
+@functools.cache
+def memory_audio_reader():
+    """The reader class, defined on first use so the SDK is imported lazily"""
+
+    class MemoryAudioReader(speechsdk.audio.PullAudioInputStreamCallback):
+        """Feeds PCM from a memoryview to the SDK without intermediate copies"""
+
+        def __init__(self, pcm):
+            super().__init__()
+            self._pcm = pcm
+            self._position = 0
+
+        def read(self, buffer):
+            size = min(buffer.nbytes, len(self._pcm) - self._position)
+            buffer[:size] = self._pcm[self._position:self._position + size]
+            self._position += size
+            return size
+
+        def close(self):
+            self._pcm = memoryview(b"")
+
+    return MemoryAudioReader
+
+
+def wav_audio_config(data):
+    """Build an SDK AudioConfig that reads a WAV file held in memory"""
+    wav = parse_wav(data)
+    stream_format = speechsdk.audio.AudioStreamFormat(
+        samples_per_second=wav.sample_rate,
+        bits_per_sample=wav.bits_per_sample,
+        channels=wav.channels)
+    stream = speechsdk.audio.PullAudioInputStream(
+        memory_audio_reader()(wav.pcm), stream_format)
+    return speechsdk.audio.AudioConfig(stream=stream)
@@ -0,0 +1,358 @@
+"""
+Offline stand-in for Azure Speech Services.
+
+The fake backend mirrors the small part of the Speech SDK used by the apps
+(configs, synthesizers, recognizers and connections) so they can be exercised
+and benchmarked without an Azure key. Latency is simulated with sleeps, and
+all audio and transcripts are derived deterministically from the input.
+"""
+import hashlib
+import io
+import math
+import threading
+import time
+import wave
+from types import SimpleNamespace
+
+from lazy_imports import speechsdk
+
+SAMPLE_RATE = 16000
+CHARS_PER_SECOND = 14.0
+WORDS_PER_SECOND = 2.5
+RECOGNIZE_ONCE_LIMIT = 15.0
+UTTERANCE_SECONDS = 5.0
+TICKS_PER_SECOND = 10_000_000
+CHUNK_SECONDS = 0.1
+
+VOCABULARY = [
+    "once", "upon", "a", "time", "the", "storyteller", "opened", "her",
+    "notebook", "and", "began", "to", "read", "about", "river", "city",
+    "light", "morning", "voice", "quiet", "bright", "journey", "home",
+]
+
+
+def _seed(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return int.from_bytes(hashlib.sha256(data).digest()[:4], "big")
+
+
+def make_pcm(duration, sample_rate=SAMPLE_RATE, seed=0):
+    """Generate deterministic 16-bit mono PCM samples for duration seconds"""
+    import numpy as np
+
+    frequency = 180 + seed % 240
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    signal = 0.3 * np.sin(2 * math.pi * frequency * t)
+    return (signal * 32767).astype("<i2").tobytes()
+
+
+def make_wav(duration, sample_rate=SAMPLE_RATE, seed=0):
+    """Generate a deterministic RIFF WAV clip for duration seconds"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(make_pcm(duration, sample_rate, seed))
+    return buffer.getvalue()
+
+
+def make_transcript(audio_data, duration):
+    """Generate a deterministic transcript with about 2.5 words per second"""
+    seed = _seed(audio_data)
+    count = max(1, int(duration * WORDS_PER_SECOND))
+    words = [VOCABULARY[(seed + i * 7) % len(VOCABULARY)]
+             for i in range(count)]
+    return " ".join(words).capitalize() + "."
+
+
+class FakeSpeechConfig:
+    """Holds the settings the apps assign to a speechsdk.SpeechConfig"""
+
+    def __init__(self, subscription=None, region=None):
+        self.subscription = subscription
+        self.region = region
+        self.speech_synthesis_voice_name = None
+        self.speech_recognition_language = None
+        self.output_format = None
+        self.properties = {}
+
+    def set_speech_synthesis_output_format(self, output_format):
+        self.output_format = output_format
+
+    def set_property(self, property_id, value):
+        self.properties[property_id] = value
+
+
+class FakeAudioConfig:
+    """Audio input for the fake recognizer: a WAV file name or WAV bytes"""
+
+    def __init__(self, filename=None, wav_data=None):
+        self.filename = filename
+        self.wav_data = wav_data
+
+    def read(self):
+        if self.wav_data is not None:
+            return bytes(self.wav_data)
+        with open(self.filename, "rb") as audio_file:
+            return audio_file.read()
+
+
+class FakeFuture:
+    """Mimics the SDK's ResultFuture by running work on a thread"""
+
+    def __init__(self, work):
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(work,),
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self, work):
+        try:
+            self._result = work()
+        except Exception as error:  # surfaced from get()
+            self._error = error
+
+    def get(self):
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class FakeEventSignal:
+    """Mimics speechsdk.EventSignal: connect callbacks and fire events"""
+
+    def __init__(self):
+        self._callbacks = []
+
+    def connect(self, callback):
+        self._callbacks.append(callback)
+
+    def disconnect_all(self):
+        self._callbacks = []
+
+    def signal(self, evt):
+        for callback in list(self._callbacks):
+            callback(evt)
+
+
+class FakeConnection:
+    """Simulates the websocket handshake paid on first use of a client"""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._connected = threading.Event()
+        self._opening = False
+        self._lock = threading.Lock()
+
+    def open(self, for_continuous_recognition=False):
+        with self._lock:
+            if self._opening or self._connected.is_set():
+                return
+            self._opening = True
+        threading.Thread(target=self._handshake, daemon=True).start()
+
+    def _handshake(self):
+        time.sleep(self._backend.connect_latency)
+        self._connected.set()
+
+    def wait(self):
+        self.open()
+        self._connected.wait()
+
+    def close(self):
+        with self._lock:
+            self._opening = False
+            self._connected.clear()
+
+
+class _FakeClient:
+    def __init__(self, backend, speech_config):
+        self.backend = backend
+        self.speech_config = speech_config
+        self.connection = FakeConnection(backend)
+
+    def _check_credentials(self):
+        key = self.speech_config.subscription
+        if self.backend.require_key and not key:
+            return SimpleNamespace(
+                reason=speechsdk.ResultReason.Canceled,
+                cancellation_details=SimpleNamespace(
+                    reason=speechsdk.CancellationReason.Error,
+                    error_details="Fake backend: missing subscription key"))
+        return None
+
+
+class FakeSpeechSynthesizer(_FakeClient):
+    """Synthesizer that returns deterministic WAV audio"""
+
+    def __init__(self, backend, speech_config):
+        super().__init__(backend, speech_config)
+        self.synthesizing = FakeEventSignal()
+        self.synthesis_completed = FakeEventSignal()
+        self.synthesis_canceled = FakeEventSignal()
+
+    def speak_text_async(self, text):
+        return FakeFuture(lambda: self._speak(text))
+
+    def _speak(self, text):
+        self.connection.wait()
+        failure = self._check_credentials()
+        if failure is not None:
+            self.synthesis_canceled.signal(SimpleNamespace(result=failure))
+            return failure
+        duration = max(0.5, len(text) / CHARS_PER_SECOND)
+        voice = self.speech_config.speech_synthesis_voice_name or ""
+        audio_data = make_wav(duration, seed=_seed(voice + text))
+        time.sleep(self.backend.first_byte_latency)
+
+        # Deliver the audio in chunks, paced by the simulated throughput.
+        # Raw formats have no header; every other format is returned as WAV.
+        chunk_size = int(SAMPLE_RATE * 2 * CHUNK_SECONDS)
+        header, pcm = audio_data[:44], audio_data[44:]
+        raw = "Raw" in str(self.speech_config.output_format)
+        if raw:
+            audio_data = pcm
+        for offset in range(0, len(pcm), chunk_size):
+            chunk = pcm[offset:offset + chunk_size]
+            time.sleep(len(chunk) / (SAMPLE_RATE * 2)
+                       / self.backend.realtime_factor)
+            if offset == 0 and not raw:
+                chunk = header + chunk
+            self.synthesizing.signal(SimpleNamespace(
+                result=SimpleNamespace(audio_data=chunk)))
+
+        result = SimpleNamespace(
+            reason=speechsdk.ResultReason.SynthesizingAudioCompleted,
+            audio_data=audio_data,
+            audio_duration=duration,
+            cancellation_details=None)
+        self.synthesis_completed.signal(SimpleNamespace(result=result))
+        return result
+
+
+class FakeSpeechRecognizer(_FakeClient):
+    """Recognizer that returns a deterministic transcript for WAV input"""
+
+    def __init__(self, backend, speech_config, audio_config):
+        super().__init__(backend, speech_config)
+        self.audio_config = audio_config
+        self.recognizing = FakeEventSignal()
+        self.recognized = FakeEventSignal()
+        self.session_started = FakeEventSignal()
+        self.session_stopped = FakeEventSignal()
+        self.canceled = FakeEventSignal()
+        self._stop = threading.Event()
+        self._session = None
+
+    def _read_audio(self):
+        audio_data = self.audio_config.read()
+        with wave.open(io.BytesIO(audio_data), "rb") as wav_file:
+            duration = wav_file.getnframes() / wav_file.getframerate()
+        return audio_data, duration
+
+    def recognize_once_async(self):
+        return FakeFuture(self._recognize_once)
+
+    def _recognize_once(self):
+        self.connection.wait()
+        failure = self._check_credentials()
+        if failure is not None:
+            return failure
+        audio_data, duration = self._read_audio()
+        duration = min(duration, RECOGNIZE_ONCE_LIMIT)
+        time.sleep(self.backend.first_byte_latency
+                   + duration / self.backend.realtime_factor)
+        return SimpleNamespace(
+            reason=speechsdk.ResultReason.RecognizedSpeech,
+            text=make_transcript(audio_data, duration),
+            offset=0,
+            duration=int(duration * TICKS_PER_SECOND),
+            cancellation_details=None)
+
+    def start_continuous_recognition_async(self):
+        self._stop.clear()
+        self._session = threading.Thread(target=self._continuous,
+                                         daemon=True)
+        self._session.start()
+        return FakeFuture(lambda: None)
+
+    def stop_continuous_recognition_async(self):
+        def stop():
+            self._stop.set()
+            if (self._session is not None
+                    and self._session is not threading.current_thread()):
+                self._session.join()
+        return FakeFuture(stop)
+
+    def _continuous(self):
+        self.connection.wait()
+        self.session_started.signal(SimpleNamespace(session_id="fake"))
+        failure = self._check_credentials()
+        if failure is not None:
+            self.canceled.signal(SimpleNamespace(
+                result=failure,
+                reason=failure.cancellation_details.reason,
+                error_details=failure.cancellation_details.error_details,
+                cancellation_details=failure.cancellation_details))
+            self.session_stopped.signal(SimpleNamespace(session_id="fake"))
+            return
+        audio_data, duration = self._read_audio()
+        time.sleep(self.backend.first_byte_latency)
+
+        # Emit one recognized phrase per utterance, with partials before it
+        offset = 0.0
+        while offset < duration and not self._stop.is_set():
+            length = min(UTTERANCE_SECONDS, duration - offset)
+            text = make_transcript(audio_data + str(offset).encode(), length)
+            time.sleep(length / self.backend.realtime_factor / 2)
+            self.recognizing.signal(SimpleNamespace(result=SimpleNamespace(
+                reason=speechsdk.ResultReason.RecognizingSpeech,
+                text=text.rstrip(".").rsplit(" ", 1)[0],
+                offset=int(offset * TICKS_PER_SECOND))))
+            time.sleep(length / self.backend.realtime_factor / 2)
+            self.recognized.signal(SimpleNamespace(result=SimpleNamespace(
+                reason=speechsdk.ResultReason.RecognizedSpeech,
+                text=text,
+                offset=int(offset * TICKS_PER_SECOND),
+                duration=int(length * TICKS_PER_SECOND))))
+            offset += length
+        self.session_stopped.signal(SimpleNamespace(session_id="fake"))
+
+
+class FakeSpeechBackend:
+    """
+    Drop-in replacement for AzureSpeechBackend that never touches the network.
+
+    connect_latency is the simulated websocket/TLS handshake paid once per
+    client, first_byte_latency the service overhead per request, and
+    realtime_factor how many seconds of audio are processed per second.
+    """
+
+    name = "fake"
+
+    def __init__(self, connect_latency=0.15, first_byte_latency=0.05,
+                 realtime_factor=25.0, require_key=False):
+        self.connect_latency = connect_latency
+        self.first_byte_latency = first_byte_latency
+        self.realtime_factor = realtime_factor
+        self.require_key = require_key
+
+    def create_config(self, speech_key, region):
+        return FakeSpeechConfig(subscription=speech_key, region=region)
+
+    def audio_input(self, filename=None, wav_data=None):
+        return FakeAudioConfig(filename, wav_data)
+
+    def create_synthesizer(self, speech_config):
+        return FakeSpeechSynthesizer(self, speech_config)
+
+    def create_recognizer(self, speech_config, audio_config):
+        return FakeSpeechRecognizer(self, speech_config, audio_config)
+
+    def connect(self, client, continuous=False):
+        client.connection.open(continuous)
+        return client.connection
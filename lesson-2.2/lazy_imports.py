@@ -0,0 +1,40 @@
+"""
+Modules that are imported on first use.
+
+The Azure Speech SDK loads a native library and takes about a tenth of a
+second to import, which used to happen before the apps drew anything, even
+for a user who only opened the sidebar. The helper modules and the apps get
+it from here instead: `speechsdk` behaves like the module, but the import
+only happens the first time one of its attributes is used.
+"""
+import importlib
+import threading
+
+
+class LazyModule:
+    """Stand-in for a module that imports it on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Streamlit runs sessions on several threads, so import only once
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        module = self._module
+        if module is None:
+            module = self._load()
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded yet"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+speechsdk = LazyModule("azure.cognitiveservices.speech")
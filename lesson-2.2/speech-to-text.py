@@ -1,11 +1,22 @@
 import os
-import base64
-import io
-import tempfile
+import sys
+from concurrent.futures import wait
+
 import streamlit as st
-import azure.cognitiveservices.speech as speechsdk
 from dotenv import load_dotenv
-from audiorecorder import audiorecorder
+
+# Modules shared by the lessons
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+from app_metrics import count, metrics_panel, snapshot_from_env, timer
+from audio_download import audio_download_button
+from audio_formats import AUDIO_FORMATS, DEFAULT_FORMAT, encode_recording, recording_id
+from lazy_imports import speechsdk
+from speech_clients import SpeechClientPool, backend_from_env
+from speech_jobs import (CANCELLED, FAILED, QUEUED, JobCancelled, JobExecutor, TooManyJobs,
+                         session_job, session_owner, submit_session_job)
+from stt_batch import CSV_FIELDS, BatchResults, content_hash, record_key, transcribe_batch
+from stt_continuous import RecognitionError, format_timestamp, iter_recognition_events
 
 # Load environment variables from .env file
 load_dotenv()
@@ -17,16 +28,54 @@ st.set_page_config(
     layout="centered"
 )
 
-# Create a function to generate a download link
+# Real Azure backend, or the offline fake when SPEECH_BACKEND=fake
+SPEECH_BACKEND = backend_from_env()
+
+
+@st.cache_resource
+def get_speech_pool(speech_key, speech_region):
+    """Create the shared speech client pool once per process"""
+    return SpeechClientPool(speech_key, speech_region, backend=SPEECH_BACKEND)
+
+
+@st.cache_resource
+def get_job_executor():
+    """Start the thread pool that runs speech jobs for every session"""
+    return JobExecutor(
+        max_workers=int(os.environ.get('SPEECH_JOB_WORKERS', '8')),
+        max_jobs_per_owner=int(os.environ.get('SPEECH_JOBS_PER_USER', '2')))
+
+
+# How often a page checks on its running job, in seconds
+JOB_POLL_SECONDS = 0.5
 
+# Batch transcriptions are appended here so interrupted batches can resume.
+# Records are keyed by content hash, so sessions only share a record for
+# the same audio
+BATCH_RESULTS_PATH = os.environ.get(
+    'STT_BATCH_RESULTS', os.path.join(os.path.dirname(__file__), 'transcripts', 'transcripts.jsonl'))
 
-def get_binary_file_downloader_html(bin_data, file_label='File', file_name='recorded_audio.wav'):
+
+def encoded_recording(segment, recording_format, native):
     """
-    Generate a link that allows the user to download binary data as a file
+    Encoded bytes of the current recording, cached in the session.
+
+    The recorder returns the same recording on every rerun, so it is only
+    encoded the first time it is seen in each format. The cache is replaced
+    when a new recording arrives, so it holds one recording per session.
     """
-    b64 = base64.b64encode(bin_data).decode()
-    href = f'<a href="data:audio/wav;base64,{b64}" download="{file_name}">{file_label}</a>'
-    return href
+    identity = recording_id(segment)
+    cache = st.session_state.get("encoded_recording")
+    if cache is None or cache["id"] != identity:
+        cache = st.session_state["encoded_recording"] = {"id": identity, "formats": {}}
+    key = (recording_format.extension, native)
+    if key in cache["formats"]:
+        count("recording_cache_lookups_total", result="hit")
+    else:
+        count("recording_cache_lookups_total", result="miss")
+        with timer("recording_encode_seconds", format=recording_format.extension):
+            cache["formats"][key] = encode_recording(segment, recording_format, native)
+    return cache["formats"][key]
 
 
 # Custom CSS for better styling
@@ -60,14 +109,16 @@ st.markdown("""
 # App title and description
 st.markdown("<h1 class='main-header'>Browser Audio Recorder</h1>",
             unsafe_allow_html=True)
-st.markdown("<p class='info-text'>Record audio directly in your browser and download it as a WAV file.</p>",
+st.markdown("<p class='info-text'>Record audio directly in your browser and download it as a WAV, MP3 or Ogg file.</p>",
             unsafe_allow_html=True)
 
 # Audio recorder component
 st.markdown("<h2 class='sub-header'>Record Audio</h2>", unsafe_allow_html=True)
 
 # Configure audio recorder with custom parameters
-# Create an instance of the audio recorder and capture the recording directly
+# Create an instance of the audio recorder and capture the recording directly.
+# The component and pydub are imported here, after the header is drawn
+from audiorecorder import audiorecorder  # noqa: E402
 audio_bytes = audiorecorder("Click to record", "Recording... Click to stop")
 
 # Instructions
@@ -76,7 +127,7 @@ with st.expander("How to use this app"):
     1. Click the microphone button to start recording audio
     2. Speak into your device's microphone
     3. Click the microphone button again to stop recording
-    4. Use the download button to save your recording as a WAV file
+    4. Pick a recording format and use the download button to save your recording
     """)
 
 # Display and allow download if audio is recorded
@@ -85,28 +136,42 @@ if audio_bytes:
     st.markdown("<p class='info-text'>Recording captured successfully!</p>",
                 unsafe_allow_html=True)
 
-    # Convert AudioSegment to wav bytes
-    wav_bytes = io.BytesIO()
-    audio_bytes.export(wav_bytes, format="wav")
-    wav_bytes = wav_bytes.getvalue()
+    # Compressed formats are much smaller to store and send (need ffmpeg)
+    selected_format = st.selectbox(
+        "Recording format:",
+        options=list(AUDIO_FORMATS.keys()),
+        index=list(AUDIO_FORMATS.keys()).index(DEFAULT_FORMAT),
+        format_func=lambda x: AUDIO_FORMATS[x].label
+    )
+    recording_format = AUDIO_FORMATS[selected_format]
+    extension = recording_format.extension
+    native = st.checkbox(
+        "Convert to 16 kHz mono", value=True,
+        help="The input format of the speech service. A WAV recording is about six times smaller.")
+
+    # Encode the recording once; reruns reuse the bytes from the session
+    recording_bytes = encoded_recording(audio_bytes, recording_format, native)
 
     # Display audio playback
-    st.audio(wav_bytes, format="audio/wav")
+    st.audio(recording_bytes, format=recording_format.mime_type)
 
     # Provide download button for the recorded audio
     st.markdown("<h3>Download Recording</h3>", unsafe_allow_html=True)
-    st.markdown(get_binary_file_downloader_html(
-        # Save to file option
-        wav_bytes, "Download WAV File", "recorded_audio.wav"), unsafe_allow_html=True)
+    audio_download_button(
+        f"Download {extension.upper()} File", lambda: recording_bytes,
+        f"recorded_audio.{extension}", recording_format.mime_type)
+
+    # Save to file option
     if st.button("Save to file on server"):
         timestamp = st.session_state.get("recording_count", 0) + 1
         st.session_state["recording_count"] = timestamp
 
-        filename = f"recording_{timestamp}.wav"
+        filename = f"recording_{timestamp}.{extension}"
         save_path = os.path.join(os.path.dirname(__file__), filename)
 
-        # Export the AudioSegment directly to a file
-        audio_bytes.export(save_path, format="wav")
+        # Write the bytes already encoded for playback and download
+        with open(save_path, "wb") as f:
+            f.write(recording_bytes)
 
         st.success(f"Audio saved to {save_path}")
 
@@ -145,54 +210,42 @@ selected_voice = st.selectbox(
     options=voice_options[selected_language]
 )
 
-uploaded_file = st.file_uploader("Choose a WAV file", type="wav")
+uploaded_files = st.file_uploader(
+    "Choose one or more WAV files", type="wav", accept_multiple_files=True)
+uploaded_file = uploaded_files[0] if len(uploaded_files) == 1 else None
 
 
-def transcribe_audio(audio_file, language):
-    """Transcribe audio file using Azure Speech Services"""
-    try:
-        # Get Azure credentials from environment variables
-        speech_key = os.environ.get('AZURE_SPEECH_KEY')
-        speech_region = os.environ.get('AZURE_REGION', 'eastus2')
-
-        # Validate Azure credentials
-        if not speech_key or speech_key.startswith("your_") or speech_key == "":
-            return "Error: Valid Azure Speech Key not found in environment variables. Please check your .env file."
-
-        if not speech_region:
-            return "Error: Azure Region not specified. Please check your .env file."
-
-        # Debug information
-        st.sidebar.markdown("### Debug Info")
-        key_preview = speech_key[:3] + "..." + \
-            speech_key[-3:] if speech_key else "Not found"
-        st.sidebar.info(f"Region: {speech_region}, Key: {key_preview}")
-
-        # Save the uploaded file to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-            temp_file.write(audio_file.getvalue())
-            temp_file_path = temp_file.name
-            # Configure speech recognition
-        try:
-            speech_config = speechsdk.SpeechConfig(
-                subscription=speech_key, region=speech_region)
-            speech_config.speech_recognition_language = language
+def get_speech_credentials():
+    """Return (speech_key, speech_region, error) from the environment"""
+    # Get Azure credentials from environment variables
+    speech_key = os.environ.get('AZURE_SPEECH_KEY')
+    speech_region = os.environ.get('AZURE_REGION', 'eastus2')
+
+    # Validate Azure credentials (the offline fake backend needs none)
+    if SPEECH_BACKEND.name == "fake":
+        speech_key = speech_key or "fake"
+    elif not speech_key or speech_key.startswith("your_") or speech_key == "":
+        return None, None, "Error: Valid Azure Speech Key not found in environment variables. Please check your .env file."
 
-            # Create audio configuration using the temporary file
-            audio_config = speechsdk.audio.AudioConfig(filename=temp_file_path)
+    if not speech_region:
+        return None, None, "Error: Azure Region not specified. Please check your .env file."
 
-            # Create speech recognizer
-            speech_recognizer = speechsdk.SpeechRecognizer(
-                speech_config=speech_config, audio_config=audio_config)
+    return speech_key, speech_region, None
 
-            # Start recognition with explicit timeout handling
-            result_future = speech_recognizer.recognize_once_async()
-            st.sidebar.info("Connecting to Azure Speech Service...")
-            result = result_future.get()
 
-            # Clean up temporary file
-            os.unlink(temp_file_path)
+def transcribe_audio(job, speech_pool, wav_data, language):
+    """Transcribe audio file using Azure Speech Services (runs as a job)"""
+    try:
+        try:
+            # Recognize the upload straight from memory with a pre-connected
+            # recognizer from the shared pool
+            count("speech_audio_bytes_total", len(wav_data), mode="single")
+            audio_config = SPEECH_BACKEND.audio_input(wav_data=wav_data)
+            with timer("speech_recognition_seconds", mode="single"):
+                with speech_pool.recognizer(language, audio_config) as speech_recognizer:
+                    result = speech_recognizer.recognize_once_async().get()
         except Exception as config_error:
+            count("speech_errors_total", operation="recognition", mode="single")
             if "401" in str(config_error) or "WebSocket upgrade failed: Authentication error" in str(config_error):
                 return "Error: Authentication failed with Azure Speech Service. Please check your subscription key and region."
             else:
@@ -204,6 +257,7 @@ def transcribe_audio(audio_file, language):
         elif result.reason == speechsdk.ResultReason.NoMatch:
             return "No speech could be recognized"
         elif result.reason == speechsdk.ResultReason.Canceled:
+            count("speech_errors_total", operation="recognition", mode="single")
             cancellation = result.cancellation_details
             if cancellation.reason == speechsdk.CancellationReason.Error:
                 return f"Error: {cancellation.error_details}"
@@ -213,16 +267,168 @@ def transcribe_audio(audio_file, language):
         return f"Error transcribing audio: {str(e)}"
 
 
-# Process uploaded file
+def transcribe_audio_continuous(job, speech_pool, wav_data, language):
+    """
+    Transcribe a recording of any length with continuous recognition (runs as a job).
+
+    The finished phrases and the phrase in progress are published in
+    job.detail as they arrive. Returns (segments, error).
+    """
+    segments = []
+    try:
+        count("speech_audio_bytes_total", len(wav_data), mode="continuous")
+        audio_config = SPEECH_BACKEND.audio_input(wav_data=wav_data)
+        with timer("speech_recognition_seconds", mode="continuous"):
+            with speech_pool.recognizer(language, audio_config, continuous=True) as speech_recognizer:
+                for kind, payload in iter_recognition_events(speech_recognizer):
+                    if kind == "segment":
+                        segments.append(payload)
+                        partial = ""
+                    else:
+                        partial = payload
+                    # Stops the recognition once the job is cancelled
+                    job.report(segments=list(segments), partial=partial)
+        return segments, None
+    except JobCancelled:
+        raise
+    except RecognitionError as e:
+        count("speech_errors_total", operation="recognition", mode="continuous")
+        return segments, f"Error: {str(e)}"
+    except Exception as e:
+        count("speech_errors_total", operation="recognition", mode="continuous")
+        if "401" in str(e) or "WebSocket upgrade failed: Authentication error" in str(e):
+            return segments, "Error: Authentication failed with Azure Speech Service. Please check your subscription key and region."
+        return segments, f"Error transcribing audio: {str(e)}"
+
+
+def transcribe_uploads(job, speech_pool, files, language):
+    """Transcribe several uploads in parallel, resuming earlier results (runs as a job)"""
+    results = BatchResults(BATCH_RESULTS_PATH)
+    batch = [(name, content_hash(data), lambda data=data: data) for name, data in files]
+
+    def report(done, total, record):
+        job.report(done, total, filename=record['filename'])
+
+    count("speech_audio_bytes_total", sum(len(data) for _, data in files), mode="batch")
+    with timer("speech_recognition_seconds", mode="batch"):
+        transcribe_batch(speech_pool, SPEECH_BACKEND, batch, language, results,
+                         progress=report)
+    return results
+
+
+def start_transcription(kind, function, *args, **detail):
+    """Submit a transcription job for this session, replacing the previous one"""
+    speech_key, speech_region, error = get_speech_credentials()
+    if error:
+        st.error(error)
+        return
+    try:
+        job = submit_session_job(get_job_executor(), "transcription", kind, function,
+                                 get_speech_pool(speech_key, speech_region), *args)
+    except TooManyJobs as e:
+        st.warning(str(e))
+        return
+    job.detail.update(detail)
+    wait([job.future], timeout=JOB_POLL_SECONDS)
+
+
+def show_transcript(segments, partial=""):
+    """The finished phrases, plus the phrase in progress in italics"""
+    finished = " ".join(segment.text for segment in segments)
+    st.markdown(f"{finished} *{partial}*" if partial else finished)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def transcription_progress(job_id):
+    """Show a running transcription and rerun the page once it finishes"""
+    job = get_job_executor().get(job_id, session_owner())
+    if job is None or job.done:
+        st.rerun()
+    if job.detail.get("segments") or job.detail.get("partial"):
+        show_transcript(job.detail.get("segments", []), job.detail.get("partial", ""))
+    if job.progress:
+        done, total = job.progress
+        st.progress(done / total, text=f"Transcribed {done} of {total}: {job.detail['filename']}")
+    elif job.status == QUEUED:
+        st.caption(f"Waiting for a free speech worker... {job.elapsed():.0f} s")
+    else:
+        st.caption(f"Transcribing... {job.elapsed():.0f} s")
+    if st.button("Cancel", key=f"cancel-{job_id}"):
+        get_job_executor().cancel(job_id, session_owner())
+        st.rerun()
+
+
+def show_transcription(job):
+    """The result of a finished transcription job"""
+    if job.status == CANCELLED:
+        st.info("Transcription cancelled.")
+    elif job.status == FAILED:
+        st.error(f"Error transcribing audio: {job.error}")
+    elif job.kind == "single":
+        st.write(job.result)
+    elif job.kind == "continuous":
+        segments, error = job.result
+        if error:
+            st.error(error)
+        if segments:
+            show_transcript(segments)
+            with st.expander(f"Segments ({len(segments)})"):
+                st.dataframe([
+                    {
+                        "Start": format_timestamp(segment.offset),
+                        "End": format_timestamp(segment.offset + segment.duration),
+                        "Text": segment.text
+                    }
+                    for segment in segments
+                ], width="stretch", hide_index=True)
+        elif not error:
+            st.write("No speech could be recognized")
+    else:
+        results = job.result
+        rows = [results.records[key] for key in job.detail["keys"] if key in results.records]
+        failed = sum(row["status"] != "ok" for row in rows)
+        if failed:
+            st.warning(f"{failed} files failed. Click the button again to retry them.")
+        else:
+            st.success(f"Transcribed {len(rows)} files. Results saved to {BATCH_RESULTS_PATH}")
+        st.dataframe(
+            [{field: row.get(field) for field in CSV_FIELDS} for row in rows],
+            width="stretch", hide_index=True)
+
+
+# Continuous recognition handles recordings longer than one utterance
+continuous_mode = st.checkbox(
+    "Transcribe the whole recording (continuous recognition)", value=True)
+
+# Transcription runs as a background job, so the page stays responsive and
+# the result survives reruns
 if uploaded_file is not None:
     st.audio(uploaded_file, format="audio/wav")
 
     if st.button("Transcribe Audio"):
-        with st.spinner("Transcribing..."):
-            transcription = transcribe_audio(uploaded_file, selected_language)
-
-        st.markdown("<h3>Transcription Result</h3>", unsafe_allow_html=True)
-        st.write(transcription)
+        if continuous_mode:
+            start_transcription("continuous", transcribe_audio_continuous,
+                                uploaded_file.getvalue(), selected_language)
+        else:
+            start_transcription("single", transcribe_audio,
+                                uploaded_file.getvalue(), selected_language)
+
+# Several uploads are transcribed as a batch and saved as they finish
+if len(uploaded_files) > 1:
+    st.write(f"{len(uploaded_files)} files selected for batch transcription.")
+    if st.button("Transcribe All"):
+        start_transcription("batch", transcribe_uploads,
+                            [(f.name, f.getvalue()) for f in uploaded_files], selected_language,
+                            keys=[record_key(f.name, content_hash(f.getvalue()), selected_language)
+                                  for f in uploaded_files])
+
+transcription_job = session_job(get_job_executor(), "transcription")
+if transcription_job is not None:
+    st.markdown("<h3>Transcription Result</h3>", unsafe_allow_html=True)
+    if transcription_job.done:
+        show_transcription(transcription_job)
+    else:
+        transcription_progress(transcription_job.id)
 
 # Display app information in sidebar
 with st.sidebar:
@@ -231,8 +437,9 @@ with st.sidebar:
         "This app allows you to record audio directly in your browser or upload audio files for transcription.")
     st.markdown("### Features")
     st.markdown("- Browser-based recording")
-    st.markdown("- WAV file download")
+    st.markdown("- WAV, MP3 and Ogg Opus download")
     st.markdown("- Audio transcription with multiple language options")
+    st.markdown("- Batch transcription of many files at once")
     st.markdown("- Voice selection for future text-to-speech")
 
     # Display Azure configuration status
@@ -247,5 +454,10 @@ with st.sidebar:
 
     st.info(f"Azure Region: {azure_region}")
 
+    # Timings and counters of this server process
+    metrics_panel()
+
     st.markdown("---")
     st.markdown("Made with ❤️ using Streamlit and Azure AI")
+
+snapshot_from_env()
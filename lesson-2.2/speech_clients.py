@@ -0,0 +1,261 @@
+"""
+Shared, pre-connected Azure Speech clients.
+
+Building a SpeechConfig and SpeechSynthesizer for every request pays for a
+new websocket and TLS handshake each time. SpeechClientPool keeps idle
+synthesizers per (region, voice, language, format), opens their connection
+ahead of time with speechsdk.Connection, caps the number of concurrent
+requests and drops clients that fail or disconnect so they are rebuilt.
+
+Recognizers are bound to their audio input in the SDK, so they cannot be
+reused across uploads; the pool shares their SpeechConfig instead and opens
+each recognizer's connection as soon as it is created.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+from app_metrics import timer
+from audio_streams import wav_audio_config
+from lazy_imports import speechsdk
+
+
+class AzureSpeechBackend:
+    """Creates real Speech SDK objects"""
+
+    name = "azure"
+
+    def create_config(self, speech_key, region):
+        return speechsdk.SpeechConfig(subscription=speech_key, region=region)
+
+    def audio_input(self, filename=None, wav_data=None):
+        if wav_data is not None:
+            return wav_audio_config(wav_data)
+        return speechsdk.audio.AudioConfig(filename=filename)
+
+    def create_synthesizer(self, speech_config):
+        # audio_config=None keeps the audio in result.audio_data
+        return speechsdk.SpeechSynthesizer(
+            speech_config=speech_config, audio_config=None)
+
+    def create_recognizer(self, speech_config, audio_config):
+        return speechsdk.SpeechRecognizer(
+            speech_config=speech_config, audio_config=audio_config)
+
+    def connect(self, client, continuous=False):
+        if isinstance(client, speechsdk.SpeechSynthesizer):
+            connection = speechsdk.Connection.from_speech_synthesizer(client)
+        else:
+            connection = speechsdk.Connection.from_recognizer(client)
+        connection.open(continuous)
+        return connection
+
+
+def backend_from_env():
+    """Pick the speech backend from the SPEECH_BACKEND environment variable"""
+    if os.environ.get('SPEECH_BACKEND', 'azure').lower() == 'fake':
+        from fake_speech import FakeSpeechBackend
+        return FakeSpeechBackend()
+    return AzureSpeechBackend()
+
+
+class PooledClient:
+    """A synthesizer checked out of the pool together with its connection"""
+
+    def __init__(self, key, client, connection):
+        self.key = key
+        self.client = client
+        self.connection = connection
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.uses = 0
+        self.healthy = True
+
+    def mark_unhealthy(self):
+        """Drop this client instead of returning it to the pool"""
+        self.healthy = False
+
+
+class SpeechClientPool:
+    """Process-wide pool of warm speech clients with a concurrency cap"""
+
+    def __init__(self, speech_key, region, backend=None, max_concurrency=4,
+                 max_idle=2, idle_timeout=240.0, max_uses=500):
+        self.speech_key = speech_key
+        self.region = region
+        self.backend = backend or AzureSpeechBackend()
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.max_uses = max_uses
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._configs = {}
+        # Output formats by name and the keys being warmed in the background
+        self._formats = {None: None}
+        self._warming = set()
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+
+    def _config(self, voice_name=None, language=None, output_format=None):
+        speech_config = self.backend.create_config(self.speech_key,
+                                                   self.region)
+        if voice_name:
+            speech_config.speech_synthesis_voice_name = voice_name
+        if language:
+            speech_config.speech_recognition_language = language
+        if output_format is not None:
+            speech_config.set_speech_synthesis_output_format(output_format)
+        return speech_config
+
+    def recognition_config(self, language):
+        """Return the shared SpeechConfig for recognizing a language"""
+        with self._lock:
+            speech_config = self._configs.get(language)
+            if speech_config is None:
+                speech_config = self._config(language=language)
+                self._configs[language] = speech_config
+            return speech_config
+
+    def _create_synthesizer(self, key, voice_name, language, output_format):
+        client = self.backend.create_synthesizer(
+            self._config(voice_name, language, output_format))
+        pooled = PooledClient(key, client, None)
+        with timer("speech_connect_seconds", client="synthesizer",
+                   backend=self.backend.name):
+            pooled.connection = self.backend.connect(client)
+        disconnected = getattr(pooled.connection, "disconnected", None)
+        if disconnected is not None:
+            disconnected.connect(lambda evt: pooled.mark_unhealthy())
+        with self._lock:
+            self.created += 1
+        return pooled
+
+    def _expired(self, pooled):
+        now = time.monotonic()
+        return (not pooled.healthy
+                or pooled.uses >= self.max_uses
+                or now - pooled.last_used > self.idle_timeout)
+
+    def _checkout(self, key):
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                pooled = idle.pop()
+                if not self._expired(pooled):
+                    self.reused += 1
+                    return pooled
+                self.recycled += 1
+                self._close(pooled)
+        return None
+
+    def _checkin(self, pooled):
+        pooled.uses += 1
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            idle = self._idle.setdefault(pooled.key, [])
+            if self._expired(pooled) or len(idle) >= self.max_idle:
+                self.recycled += 1
+                self._close(pooled)
+            else:
+                idle.append(pooled)
+
+    @staticmethod
+    def _close(pooled):
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+
+    def warm(self, voice_name, language, output_format=None):
+        """Pre-connect one idle synthesizer so the next request skips setup"""
+        key = (self.region, voice_name, language, output_format)
+        with self._lock:
+            if self._idle.get(key):
+                return
+        pooled = self._create_synthesizer(key, voice_name, language,
+                                          output_format)
+        with self._lock:
+            self._idle.setdefault(key, []).append(pooled)
+
+    def warm_in_background(self, voice_name, language, format_name=None):
+        """
+        Run warm() on a daemon thread unless the key is already warm.
+
+        format_name is the name of a SpeechSynthesisOutputFormat. It is
+        looked up on the thread, so the caller never waits for the SDK
+        import or the connection.
+        """
+        name_key = (voice_name, language, format_name)
+        with self._lock:
+            if name_key in self._warming:
+                return
+            if format_name in self._formats:
+                key = (self.region, voice_name, language, self._formats[format_name])
+                if any(not self._expired(pooled) for pooled in self._idle.get(key, [])):
+                    return
+            self._warming.add(name_key)
+
+        def run():
+            try:
+                output_format = self._formats.get(format_name)
+                if format_name not in self._formats:
+                    output_format = getattr(speechsdk.SpeechSynthesisOutputFormat, format_name)
+                    self._formats[format_name] = output_format
+                self.warm(voice_name, language, output_format)
+            except Exception:
+                # The request itself reports connection problems
+                pass
+            finally:
+                with self._lock:
+                    self._warming.discard(name_key)
+
+        threading.Thread(target=run, name="speech-warm", daemon=True).start()
+
+    @contextmanager
+    def synthesizer(self, voice_name, language, output_format=None):
+        """Check out a warm synthesizer; yields a PooledClient"""
+        key = (self.region, voice_name, language, output_format)
+        with self._slots:
+            pooled = self._checkout(key) or self._create_synthesizer(
+                key, voice_name, language, output_format)
+            try:
+                yield pooled
+            except BaseException:
+                pooled.mark_unhealthy()
+                raise
+            finally:
+                self._checkin(pooled)
+
+    @contextmanager
+    def recognizer(self, language, audio_config, continuous=False):
+        """Create a pre-connected recognizer within the concurrency cap"""
+        with self._slots:
+            client = self.backend.create_recognizer(
+                self.recognition_config(language), audio_config)
+            with timer("speech_connect_seconds", client="recognizer",
+                       backend=self.backend.name):
+                connection = self.backend.connect(client, continuous)
+            try:
+                yield client
+            finally:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+    def stats(self):
+        """Return counters describing pool reuse"""
+        with self._lock:
+            return {
+                "backend": self.backend.name,
+                "created": self.created,
+                "reused": self.reused,
+                "recycled": self.recycled,
+                "idle": sum(len(idle) for idle in self._idle.values()),
+            }
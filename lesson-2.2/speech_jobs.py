@@ -0,0 +1,227 @@
+"""
+Background jobs for slow speech calls.
+
+Synthesis and transcription used to run on the script thread behind a
+spinner. Every call in flight held one of the server's script threads,
+and a rerun in the middle (any widget change) threw the finished work
+away. JobExecutor runs them on a thread pool shared by the whole process
+instead. The script submits a job, keeps its id in st.session_state and
+carries on; a fragment polls the job until it finishes and then reruns
+the page, which shows the result from the job on every later rerun until
+the job expires.
+
+Each session has an owner id and may only have a few jobs at a time, so
+one user cannot take over the pool. A cancelled job shows as finished
+right away. If it has not started it never runs; if it is running it
+raises JobCancelled at its next report(), and the batch helpers then drop
+their queued chunks or files without waiting for them. A single SDK call
+cannot be interrupted, so it finishes and its result is dropped. Either
+way a running job keeps its worker until its function returns, so it
+counts against its owner until then; otherwise cancelling and starting
+again could fill the pool with one session's cancelled work.
+
+Job functions run without a Streamlit script context: they receive the
+Job as their first argument and must not call st.* themselves.
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+from app_metrics import count, observe
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job that was cancelled while running"""
+
+
+class TooManyJobs(Exception):
+    """The owner already has the maximum number of unfinished jobs"""
+
+
+class Job:
+    """One background call with its status, progress and result"""
+
+    def __init__(self, owner, kind):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.kind = kind
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        # (done, total) when the job reports steps
+        self.progress = None
+        # Partial results the job publishes for the page, e.g. a transcript
+        self.detail = {}
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.future = None
+        # Set once no worker is running the job: its function returned or
+        # it was cancelled before it started
+        self.released = False
+        self._cancel = threading.Event()
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    @property
+    def holds_slot(self):
+        """Whether the job counts against its owner's limit"""
+        return not self.done or not self.released
+
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def report(self, done=None, total=None, **detail):
+        """Publish progress from inside the job; raises JobCancelled once cancelled"""
+        if total is not None:
+            self.progress = (done, total)
+        self.detail.update(detail)
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def elapsed(self):
+        """Seconds since the job started, or was submitted if it is still queued"""
+        end = self.finished or time.monotonic()
+        return end - (self.started or self.submitted)
+
+
+class JobExecutor:
+    """Process-wide thread pool that runs speech jobs for many sessions"""
+
+    def __init__(self, max_workers=8, max_jobs_per_owner=2, keep_seconds=3600,
+                 max_finished=200):
+        self.max_jobs_per_owner = max_jobs_per_owner
+        self.keep_seconds = keep_seconds
+        self.max_finished = max_finished
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="speech-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner, kind, function, *args, **kwargs):
+        """Queue function(job, *args, **kwargs) and return its Job"""
+        with self._lock:
+            self._prune()
+            holding = sum(1 for job in self._jobs.values()
+                          if job.owner == owner and job.holds_slot)
+            if holding >= self.max_jobs_per_owner:
+                count("speech_jobs_rejected_total", kind=kind)
+                raise TooManyJobs(
+                    f"You already have {holding} jobs running. "
+                    "Wait for one to finish or cancel it; a cancelled job "
+                    "still counts until its current step ends.")
+            job = Job(owner, kind)
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def _run(self, job, function, args, kwargs):
+        with self._lock:
+            # Cancelled while it was queued
+            if job.done:
+                job.released = True
+                return
+            job.started = time.monotonic()
+            job.status = RUNNING
+        observe("speech_job_wait_seconds", job.started - job.submitted, kind=job.kind)
+        status, result, error = CANCELLED, None, None
+        try:
+            result = function(job, *args, **kwargs)
+            if not job.cancel_requested():
+                status = DONE
+        except JobCancelled:
+            pass
+        except Exception as exception:
+            status, error = FAILED, str(exception)
+        finally:
+            job.released = True
+        self._finish(job, status, result=result, error=error)
+
+    def _finish(self, job, status, result=None, error=None):
+        with self._lock:
+            if job.done:
+                return
+            job.result = result
+            job.error = error
+            job.finished = time.monotonic()
+            # Set last, so a page that sees a finished job also sees its result
+            job.status = status
+        count("speech_jobs_total", kind=job.kind, status=status)
+        if job.started is not None:
+            observe("speech_job_seconds", job.finished - job.started, kind=job.kind)
+
+    def _prune(self):
+        """Forget finished jobs that expired or are beyond max_finished"""
+        now = time.monotonic()
+        finished = [job for job in self._jobs.values() if job.done and job.released]
+        expired = [job for job in finished if now - job.finished > self.keep_seconds]
+        finished.sort(key=lambda job: job.finished)
+        for job in expired + finished[:max(0, len(finished) - self.max_finished)]:
+            self._jobs.pop(job.id, None)
+
+    def get(self, job_id, owner):
+        """The owner's job with this id, or None if it is unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None and job.owner == owner else None
+
+    def cancel(self, job_id, owner):
+        """Ask a job to stop and mark it cancelled"""
+        job = self.get(job_id, owner)
+        if job is None or job.done:
+            return
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            job.released = True
+        # A running job keeps its worker, and its owner's slot, until its
+        # next report(), but whatever it returns from now on is dropped
+        self._finish(job, CANCELLED)
+
+    def stats(self):
+        """Number of jobs per status"""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status)
+                for status in (QUEUED, RUNNING) + FINISHED}
+
+
+def session_owner():
+    """Id of the current browser session, kept in st.session_state"""
+    import streamlit as st
+
+    if "job_owner" not in st.session_state:
+        st.session_state["job_owner"] = uuid.uuid4().hex
+    return st.session_state["job_owner"]
+
+
+def session_job(executor, slot):
+    """The job the session last started in a slot, if it still exists"""
+    import streamlit as st
+
+    job_id = st.session_state.get(f"job-{slot}")
+    return executor.get(job_id, session_owner()) if job_id else None
+
+
+def submit_session_job(executor, slot, kind, function, *args, **kwargs):
+    """Start a job for the session in a slot, cancelling the one it replaces"""
+    import streamlit as st
+
+    previous = session_job(executor, slot)
+    if previous is not None:
+        executor.cancel(previous.id, previous.owner)
+    job = executor.submit(session_owner(), kind, function, *args, **kwargs)
+    st.session_state[f"job-{slot}"] = job.id
+    return job
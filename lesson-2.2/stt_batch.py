@@ -0,0 +1,240 @@
+"""
+Batch transcription of many WAV files.
+
+Files are transcribed with continuous recognition through a bounded pool of
+worker threads. Every finished file is appended to a JSONL results file
+right away, so an interrupted batch can be resumed and only the files that
+are missing, changed or failed are transcribed again.
+
+It can also be run from the command line on a folder of clips:
+
+    python stt_batch.py clips/ --language en-US --out transcripts.jsonl --csv transcripts.csv
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from audio_streams import parse_wav
+from stt_continuous import RecognitionError, transcribe_continuous
+
+CSV_FIELDS = ["filename", "language", "status", "duration", "elapsed",
+              "text", "error"]
+
+
+def wav_duration(wav_data):
+    """Length of a PCM WAV file in seconds"""
+    wav = parse_wav(wav_data)
+    bytes_per_second = wav.sample_rate * wav.channels * wav.bits_per_sample // 8
+    return len(wav.pcm) / bytes_per_second
+
+
+def content_hash(wav_data):
+    """SHA-256 of a file's bytes"""
+    return hashlib.sha256(wav_data).hexdigest()
+
+
+def file_hash(path):
+    """SHA-256 of a file on disk, read in blocks"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as wav_file:
+        for block in iter(lambda: wav_file.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def record_key(filename, sha256, language):
+    """
+    Identity of a file in the results. It includes the content hash, so a
+    file re-recorded under the same name (WAV files of the same length
+    have the same size) is redone, and a record is only ever reused for
+    the same audio.
+    """
+    return f"{filename}|{sha256}|{language}"
+
+
+class BatchResults:
+    """Append-only JSONL store of transcription results"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as results_file:
+                for line in results_file:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by an interrupted run
+                        continue
+                    self.records[record["key"]] = record
+
+    def is_done(self, key):
+        record = self.records.get(key)
+        return record is not None and record["status"] == "ok"
+
+    def append(self, record):
+        """Persist one record; later records for the same key win"""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as results_file:
+                results_file.write(line)
+                results_file.flush()
+                os.fsync(results_file.fileno())
+            self.records[record["key"]] = record
+
+    def export_csv(self, path):
+        """Write the latest record for every file to a CSV file"""
+        with open(path, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=CSV_FIELDS,
+                                    extrasaction="ignore")
+            writer.writeheader()
+            for record in self.records.values():
+                writer.writerow(record)
+
+
+def transcribe_wav(pool, backend, filename, wav_data, language):
+    """Transcribe one WAV file and return its result record"""
+    started = time.time()
+    start = time.perf_counter()
+    sha256 = content_hash(wav_data)
+    record = {
+        "key": record_key(filename, sha256, language),
+        "filename": filename,
+        "language": language,
+        "size": len(wav_data),
+        "sha256": sha256,
+        "started": started,
+    }
+    try:
+        record["duration"] = round(wav_duration(wav_data), 3)
+        audio_config = backend.audio_input(wav_data=wav_data)
+        with pool.recognizer(language, audio_config, continuous=True) as recognizer:
+            segments = transcribe_continuous(recognizer)
+        record.update(
+            status="ok",
+            text=" ".join(segment.text for segment in segments),
+            segments=[segment._asdict() for segment in segments],
+            error=None)
+    except (RecognitionError, ValueError) as error:
+        record.update(status="error", text="", error=str(error))
+    except Exception as error:
+        record.update(status="error", text="",
+                      error=f"{type(error).__name__}: {error}")
+    record["elapsed"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def transcribe_batch(pool, backend, files, language, results, max_workers=4,
+                     progress=None):
+    """
+    Transcribe files that are not already done in results.
+
+    files is a list of (filename, sha256, load) where load() returns the
+    WAV bytes, so only the files being worked on are held in memory. progress,
+    if given, is called as progress(done, total, record) from the calling
+    thread. If it raises, the files that have not started are dropped and
+    the exception is raised right away. Returns the records produced by
+    this run.
+    """
+    pending = [(filename, load) for filename, sha256, load in files
+               if not results.is_done(record_key(filename, sha256, language))]
+    records = []
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [
+            executor.submit(
+                lambda name=filename, load=load: transcribe_wav(
+                    pool, backend, name, load(), language))
+            for filename, load in pending
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            results.append(record)
+            records.append(record)
+            if progress is not None:
+                progress(done, len(pending), record)
+    except BaseException:
+        # Drop the files that have not started instead of waiting for them
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    return records
+
+
+def folder_files(folder):
+    """List the WAV files of a folder as (filename, sha256, load) tuples"""
+    files = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name.lower().endswith(".wav") and os.path.isfile(path):
+            def load(path=path):
+                with open(path, "rb") as wav_file:
+                    return wav_file.read()
+            files.append((name, file_hash(path), load))
+    return files
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    from speech_clients import SpeechClientPool, backend_from_env
+
+    parser = argparse.ArgumentParser(
+        description="Transcribe a folder of WAV files")
+    parser.add_argument("source", help="folder with .wav files")
+    parser.add_argument("--language", default="en-US")
+    parser.add_argument("--out", default="transcripts.jsonl",
+                        help="JSONL results file, also used to resume")
+    parser.add_argument("--csv", help="also export the results as CSV")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    backend = backend_from_env()
+    speech_key = os.environ.get('AZURE_SPEECH_KEY')
+    speech_region = os.environ.get('AZURE_REGION', 'eastus2')
+    if backend.name == "fake":
+        speech_key = speech_key or "fake"
+    elif not speech_key or speech_key.startswith("your_"):
+        parser.error("AZURE_SPEECH_KEY is not set. Please check your .env file.")
+
+    pool = SpeechClientPool(speech_key, speech_region, backend=backend,
+                            max_concurrency=args.workers)
+    results = BatchResults(args.out)
+    files = folder_files(args.source)
+    skipped = sum(results.is_done(record_key(name, sha256, args.language))
+                  for name, sha256, _ in files)
+    print(f"{len(files)} files, {skipped} already transcribed")
+
+    def report(done, total, record):
+        status = "ok   " if record["status"] == "ok" else "error"
+        print(f"[{done}/{total}] {status} {record['filename']} "
+              f"({record['elapsed']:.1f} s)")
+
+    records = transcribe_batch(pool, backend, files, args.language, results,
+                               args.workers, report)
+    if args.csv:
+        results.export_csv(args.csv)
+    failed = sum(record["status"] != "ok" for record in records)
+    if failed:
+        print(f"{failed} files failed; run again to retry them",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
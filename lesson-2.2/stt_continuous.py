@@ -0,0 +1,96 @@
+"""
+Continuous speech recognition for long recordings.
+
+recognize_once_async() stops after the first utterance (about 15 seconds of
+audio), so longer uploads were silently cut short. This module runs
+start_continuous_recognition_async() instead and turns the SDK callbacks
+into a stream of events: partial hypotheses while a phrase is being
+recognized, and a Segment with its offset for every finished phrase.
+
+The callbacks only put events on a queue; the caller drains it. In the
+app that is a background job thread, which publishes the transcript so far
+through the job for the page to show as results arrive.
+"""
+import queue
+from collections import namedtuple
+
+from lazy_imports import speechsdk
+
+# Offsets and durations reported by the SDK are in 100-nanosecond ticks
+TICKS_PER_SECOND = 10_000_000
+
+Segment = namedtuple("Segment", ["text", "offset", "duration"])
+Segment.__doc__ = "A recognized phrase with its offset and duration in seconds"
+
+
+class RecognitionError(Exception):
+    """Raised when continuous recognition is canceled with an error"""
+
+
+def iter_recognition_events(recognizer, idle_timeout=60.0):
+    """
+    Run continuous recognition and yield events until the session stops.
+
+    Yields ("partial", text) for in-progress hypotheses and
+    ("segment", Segment) for each recognized phrase. Raises
+    RecognitionError if the service cancels with an error or sends nothing
+    for idle_timeout seconds.
+    """
+    events = queue.Queue()
+
+    def on_recognized(evt):
+        result = evt.result
+        if result.reason == speechsdk.ResultReason.RecognizedSpeech and result.text:
+            events.put(("segment", Segment(
+                result.text,
+                result.offset / TICKS_PER_SECOND,
+                result.duration / TICKS_PER_SECOND)))
+
+    recognizer.recognizing.connect(
+        lambda evt: events.put(("partial", evt.result.text)))
+    recognizer.recognized.connect(on_recognized)
+    recognizer.canceled.connect(lambda evt: events.put(("canceled", evt)))
+    recognizer.session_stopped.connect(lambda evt: events.put(("stopped", None)))
+
+    recognizer.start_continuous_recognition_async().get()
+    try:
+        while True:
+            try:
+                kind, payload = events.get(timeout=idle_timeout)
+            except queue.Empty:
+                raise RecognitionError(
+                    f"No response from the speech service for {idle_timeout:.0f} seconds")
+            if kind == "stopped":
+                return
+            if kind == "canceled":
+                # EndOfStream is the normal end of a file; session_stopped follows
+                if payload.reason == speechsdk.CancellationReason.Error:
+                    raise RecognitionError(payload.error_details)
+                continue
+            yield kind, payload
+    finally:
+        recognizer.stop_continuous_recognition_async().get()
+        for signal in (recognizer.recognizing, recognizer.recognized,
+                       recognizer.canceled, recognizer.session_stopped):
+            signal.disconnect_all()
+
+
+def transcribe_continuous(recognizer, on_partial=None, on_segment=None,
+                          idle_timeout=60.0):
+    """Recognize a whole recording and return its list of Segments"""
+    segments = []
+    for kind, payload in iter_recognition_events(recognizer, idle_timeout):
+        if kind == "partial":
+            if on_partial is not None:
+                on_partial(payload)
+        else:
+            segments.append(payload)
+            if on_segment is not None:
+                on_segment(payload)
+    return segments
+
+
+def format_timestamp(seconds):
+    """Format seconds as M:SS.s for display next to a segment"""
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}:{seconds:04.1f}"
@@ -1,12 +1,26 @@
 # filepath: /workspaces/intermediate-storytelling-with-ai/lesson-2.2/text-to-speech.py
 import os
-import base64
 import io
-import tempfile
+import sys
+from concurrent.futures import wait
+
 import streamlit as st
-import azure.cognitiveservices.speech as speechsdk
 from dotenv import load_dotenv
 
+# Modules shared by the lessons
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+from app_metrics import count, metrics_panel, observe, snapshot_from_env, timer
+from audio_download import audio_download_button
+from audio_formats import AUDIO_FORMATS, DEFAULT_FORMAT, pcm_to_wav, streaming_wav_header
+from lazy_imports import speechsdk
+from speech_clients import SpeechClientPool, backend_from_env
+from speech_jobs import (CANCELLED, FAILED, QUEUED, JobCancelled, JobExecutor, TooManyJobs,
+                         session_job, session_owner, submit_session_job)
+from tts_batch import BATCH_OUTPUT_FORMAT, synthesize_long_text
+from tts_cache import AudioCache, cache_key
+from tts_streaming import DEFAULT_STREAM_PORT, AudioStreamServer, stream_synthesis
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -17,16 +31,53 @@ st.set_page_config(
     layout="centered"
 )
 
-# Create a function to generate a download link
+# Real Azure backend, or the offline fake when SPEECH_BACKEND=fake
+SPEECH_BACKEND = backend_from_env()
+
+
+@st.cache_resource
+def get_speech_pool(speech_key, speech_region):
+    """Create the shared pool of warm synthesizers once per process"""
+    return SpeechClientPool(speech_key, speech_region, backend=SPEECH_BACKEND)
+
+
+@st.cache_resource
+def get_audio_cache():
+    """Create the on-disk synthesis cache once per process"""
+    cache_dir = os.environ.get(
+        'TTS_CACHE_DIR', os.path.join(os.path.dirname(__file__), '.tts_cache'))
+    max_mb = int(os.environ.get('TTS_CACHE_MAX_MB', '200'))
+    return AudioCache(cache_dir, max_bytes=max_mb * 1024 * 1024)
+
+
+# Port of the stream server; set TTS_STREAM_HOST=0.0.0.0 to reach it from
+# other machines, and TTS_STREAM_ORIGIN if the app is not at localhost
+STREAM_PORT = int(os.environ.get('TTS_STREAM_PORT', DEFAULT_STREAM_PORT))
+
 
+@st.cache_resource
+def get_stream_server():
+    """Start the HTTP server that streams audio chunks to the browser"""
+    return AudioStreamServer(
+        host=os.environ.get('TTS_STREAM_HOST', '127.0.0.1'),
+        port=STREAM_PORT,
+        allowed_origin=os.environ.get(
+            'TTS_STREAM_ORIGIN', f"http://localhost:{st.get_option('server.port')}"))
 
-def get_binary_file_downloader_html(bin_data, file_label='File', file_name='synthesized_audio.wav'):
-    """
-    Generate a link that allows the user to download binary data as a file
-    """
-    b64 = base64.b64encode(bin_data).decode()
-    href = f'<a href="data:audio/wav;base64,{b64}" download="{file_name}">{file_label}</a>'
-    return href
+
+@st.cache_resource
+def get_job_executor():
+    """Start the thread pool that runs speech jobs for every session"""
+    return JobExecutor(
+        max_workers=int(os.environ.get('SPEECH_JOB_WORKERS', '8')),
+        max_jobs_per_owner=int(os.environ.get('SPEECH_JOBS_PER_USER', '2')))
+
+
+# How often a page checks on its running job, in seconds
+JOB_POLL_SECONDS = 0.5
+
+# Address the browser uses to reach the stream server
+STREAM_URL = os.environ.get('TTS_STREAM_URL', f"http://localhost:{STREAM_PORT}")
 
 
 # Custom CSS for better styling
@@ -94,6 +145,24 @@ selected_voice = st.selectbox(
     options=voice_options[selected_language]
 )
 
+# Output format for playback, cache, download and saving
+selected_format = st.selectbox(
+    "Audio format:",
+    options=list(AUDIO_FORMATS.keys()),
+    index=list(AUDIO_FORMATS.keys()).index(DEFAULT_FORMAT),
+    format_func=lambda x: AUDIO_FORMATS[x].label
+)
+audio_format = AUDIO_FORMATS[selected_format]
+
+# Pre-connect a synthesizer for the selected voice in the background while
+# the user types; reruns with an already warm voice do nothing
+warm_key = os.environ.get('AZURE_SPEECH_KEY')
+if SPEECH_BACKEND.name == "fake" or (warm_key and not warm_key.startswith("your_")):
+    warm_pool = get_speech_pool(
+        warm_key or "fake", os.environ.get('AZURE_REGION', 'eastus2'))
+    for warm_format in {audio_format.synthesis_format, audio_format.streaming_format}:
+        warm_pool.warm_in_background(selected_voice, selected_language, warm_format)
+
 # Display example text based on language
 example_texts = {
     "en-US": "Hello! This is an example of text-to-speech using Azure AI.",
@@ -109,110 +178,244 @@ user_text = st.text_area("Text to convert to speech:",
                          value=example_texts[selected_language], height=150)
 
 
-def synthesize_speech(text, language, voice_name):
-    """Synthesize speech from text using Azure Speech Services"""
-    try:
-        # Get Azure credentials from environment variables
-        speech_key = os.environ.get('AZURE_SPEECH_KEY')
-        speech_region = os.environ.get('AZURE_REGION', 'eastus2')
+def get_speech_credentials():
+    """Return (speech_key, speech_region, error) from the environment"""
+    # Get Azure credentials from environment variables
+    speech_key = os.environ.get('AZURE_SPEECH_KEY')
+    speech_region = os.environ.get('AZURE_REGION', 'eastus2')
 
-        # Validate Azure credentials
-        if not speech_key or speech_key.startswith("your_") or speech_key == "":
-            return None, "Error: Valid Azure Speech Key not found in environment variables. Please check your .env file."
+    # Validate Azure credentials (the offline fake backend needs none)
+    if SPEECH_BACKEND.name == "fake":
+        speech_key = speech_key or "fake"
+    elif not speech_key or speech_key.startswith("your_") or speech_key == "":
+        return None, None, "Error: Valid Azure Speech Key not found in environment variables. Please check your .env file."
 
-        if not speech_region:
-            return None, "Error: Azure Region not specified. Please check your .env file."
+    if not speech_region:
+        return None, None, "Error: Azure Region not specified. Please check your .env file."
 
-        # Debug information
-        st.sidebar.markdown("### Debug Info")
-        key_preview = speech_key[:3] + "..." + \
-            speech_key[-3:] if speech_key else "Not found"
-        st.sidebar.info(f"Region: {speech_region}, Key: {key_preview}")
+    return speech_key, speech_region, None
 
-        # Create a temporary file to store the audio output
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-        temp_file_path = temp_file.name
-        temp_file.close()
 
-        try:
-            # Configure speech synthesis
-            speech_config = speechsdk.SpeechConfig(
-                subscription=speech_key, region=speech_region)
-            speech_config.speech_synthesis_voice_name = voice_name
-
-            # Create audio configuration with the specified output file
-            audio_config = speechsdk.audio.AudioOutputConfig(
-                filename=temp_file_path)
-
-            # Create speech synthesizer
-            speech_synthesizer = speechsdk.SpeechSynthesizer(
-                speech_config=speech_config,
-                audio_config=audio_config
-            )
-
-            # Start synthesis
-            st.sidebar.info("Connecting to Azure Speech Service...")
-            result = speech_synthesizer.speak_text_async(text).get()
-
-            # Process result
-            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                # Read the audio file
-                with open(temp_file_path, 'rb') as audio_file:
-                    audio_data = audio_file.read()
-
-                # Clean up temporary file
-                os.unlink(temp_file_path)
-
-                return audio_data, None
-            elif result.reason == speechsdk.ResultReason.Canceled:
-                cancellation = result.cancellation_details
-                if cancellation.reason == speechsdk.CancellationReason.Error:
-                    return None, f"Error: {cancellation.error_details}"
-                else:
-                    return None, f"Canceled: {cancellation.reason}"
-            else:
-                return None, "Unknown error during speech synthesis"
+def synthesize_speech(job, speech_pool, audio_cache, text, language, voice_name, audio_format):
+    """Synthesize speech from text using Azure Speech Services (runs as a job)"""
+    # Serve repeated requests from the cache without calling Azure
+    key = cache_key(text, voice_name, language, audio_format.synthesis_format)
+    cached_audio = audio_cache.get(key, extension=audio_format.extension)
+    count("speech_cache_lookups_total", mode="standard",
+          result="hit" if cached_audio is not None else "miss")
+    if cached_audio is not None:
+        return cached_audio, None
 
-        except Exception as config_error:
-            if "401" in str(config_error) or "WebSocket upgrade failed: Authentication error" in str(config_error):
-                return None, "Error: Authentication failed with Azure Speech Service. Please check your subscription key and region."
+    try:
+        # Check out a pre-connected synthesizer from the shared pool
+        output_format = getattr(
+            speechsdk.SpeechSynthesisOutputFormat, audio_format.synthesis_format)
+        with timer("speech_synthesis_seconds", mode="standard"):
+            with speech_pool.synthesizer(voice_name, language, output_format) as pooled:
+                result = pooled.client.speak_text_async(text).get()
+                if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+                    pooled.mark_unhealthy()
+
+        # Process result
+        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+            audio_data = result.audio_data
+            count("speech_synthesis_bytes_total", len(audio_data), mode="standard")
+            audio_cache.put(key, audio_data, extension=audio_format.extension)
+            return audio_data, None
+        count("speech_errors_total", operation="synthesis", mode="standard")
+        if result.reason == speechsdk.ResultReason.Canceled:
+            cancellation = result.cancellation_details
+            if cancellation.reason == speechsdk.CancellationReason.Error:
+                return None, f"Error: {cancellation.error_details}"
             else:
-                return None, f"Error during speech synthesis: {str(config_error)}"
+                return None, f"Canceled: {cancellation.reason}"
+        else:
+            return None, "Unknown error during speech synthesis"
+
+    except Exception as config_error:
+        count("speech_errors_total", operation="synthesis", mode="standard")
+        if "401" in str(config_error) or "WebSocket upgrade failed: Authentication error" in str(config_error):
+            return None, "Error: Authentication failed with Azure Speech Service. Please check your subscription key and region."
+        else:
+            return None, f"Error during speech synthesis: {str(config_error)}"
 
+
+def stream_speech(job, speech_pool, audio_cache, stream_server, text, language, voice_name,
+                  audio_format):
+    """Synthesize speech and publish a stream the page can play as it arrives (runs as a job)"""
+    key = cache_key(text, voice_name, language, audio_format.streaming_format)
+    cached_audio = audio_cache.get(key, extension=audio_format.extension)
+    count("speech_cache_lookups_total", mode="stream",
+          result="hit" if cached_audio is not None else "miss")
+    if cached_audio is not None:
+        return cached_audio, None
+
+    # WAV is streamed as raw PCM behind a header of unknown length
+    header = streaming_wav_header() if audio_format.extension == "wav" else b""
+
+    try:
+        output_format = getattr(
+            speechsdk.SpeechSynthesisOutputFormat, audio_format.streaming_format)
+        with timer("speech_synthesis_seconds", mode="stream"):
+            with speech_pool.synthesizer(voice_name, language, output_format) as pooled:
+                with stream_synthesis(pooled, text, audio_format.mime_type, header) as stream:
+                    # The browser starts playing as soon as the first chunk lands
+                    job.report(stream_path=stream_server.register(stream))
+                    while not stream.done:
+                        stream.wait(JOB_POLL_SECONDS)
+                        job.report()
+                    audio_data = stream.wait()
+
+        if stream.error:
+            count("speech_errors_total", operation="synthesis", mode="stream")
+            return None, f"Error: {stream.error}"
+        if stream.time_to_first_chunk is not None:
+            observe("speech_stream_first_chunk_seconds", stream.time_to_first_chunk)
+        if header:
+            # Store a WAV file with the real length in its header
+            audio_data = pcm_to_wav(audio_data[len(header):])
+        count("speech_synthesis_bytes_total", len(audio_data), mode="stream")
+        audio_cache.put(key, audio_data, extension=audio_format.extension)
+        return audio_data, None
+
+    except JobCancelled:
+        raise
     except Exception as e:
-        return None, f"Error synthesizing speech: {str(e)}"
+        count("speech_errors_total", operation="synthesis", mode="stream")
+        if "401" in str(e) or "WebSocket upgrade failed: Authentication error" in str(e):
+            return None, "Error: Authentication failed with Azure Speech Service. Please check your subscription key and region."
+        return None, f"Error during speech synthesis: {str(e)}"
+
+
+def synthesize_long_speech(job, speech_pool, audio_cache, text, language, voice_name,
+                           audio_format):
+    """Synthesize a long document in parallel chunks and join them (runs as a job)"""
+    key = cache_key(text, voice_name, language,
+                    f"batch-{BATCH_OUTPUT_FORMAT}-{audio_format.extension}")
+    cached_audio = audio_cache.get(key, extension=audio_format.extension)
+    count("speech_cache_lookups_total", mode="batch",
+          result="hit" if cached_audio is not None else "miss")
+    if cached_audio is not None:
+        return cached_audio, None
 
+    try:
+        with timer("speech_synthesis_seconds", mode="batch"):
+            # Reporting progress also stops the batch once it is cancelled
+            audio_data = synthesize_long_text(
+                speech_pool, text, voice_name, language, progress=job.report,
+                audio_format=audio_format)
+        count("speech_synthesis_bytes_total", len(audio_data), mode="batch")
+        audio_cache.put(key, audio_data, extension=audio_format.extension)
+        return audio_data, None
+    except JobCancelled:
+        raise
+    except Exception as e:
+        count("speech_errors_total", operation="synthesis", mode="batch")
+        return None, f"Error during batch synthesis: {str(e)}"
+
+
+def stream_player(stream_path):
+    """An audio element that plays a stream from the stream server"""
+    st.html(f'<audio controls autoplay src="{STREAM_URL}{stream_path}" '
+            f'style="width: 100%"></audio>')
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def synthesis_progress(job_id, stream_shown):
+    """Show a running job and rerun the page once there is something new to show"""
+    job = get_job_executor().get(job_id, session_owner())
+    if job is None or job.done or (job.detail.get("stream_path") and not stream_shown):
+        st.rerun()
+    if job.progress:
+        done, total = job.progress
+        st.progress(done / total, text=f"Synthesized {done} of {total} chunks")
+    elif job.status == QUEUED:
+        st.caption(f"Waiting for a free speech worker... {job.elapsed():.0f} s")
+    else:
+        st.caption(f"Converting text to speech... {job.elapsed():.0f} s")
+    if st.button("Cancel", key=f"cancel-{job_id}"):
+        get_job_executor().cancel(job_id, session_owner())
+        st.rerun()
+
+
+# Streaming plays audio while it is synthesized; batch mode splits long
+# documents into sentences and synthesizes them in parallel. Standard is
+# the default because streaming needs the browser to reach the stream
+# server's own port (TTS_STREAM_URL)
+synthesis_mode = st.radio(
+    "Synthesis mode:",
+    options=["Stream", "Standard", "Batch"],
+    index=1,
+    format_func=lambda x: {
+        "Stream": "Start playing while synthesizing",
+        "Standard": "Wait for the full audio",
+        "Batch": "Long document (parallel chunks)"
+    }.get(x, x),
+    horizontal=True
+)
 
-# Synthesis button
+# Synthesis runs as a background job, so the page stays responsive and the
+# result survives reruns
 if st.button("Convert to Speech"):
+    speech_key, speech_region, error = get_speech_credentials()
     if not user_text.strip():
         st.error("Please enter some text to convert to speech.")
+    elif error:
+        st.error(error)
     else:
-        with st.spinner("Converting text to speech..."):
-            audio_data, error = synthesize_speech(
-                user_text, selected_language, selected_voice)
+        synthesize = {"Stream": stream_speech, "Standard": synthesize_speech,
+                      "Batch": synthesize_long_speech}[synthesis_mode]
+        resources = (get_speech_pool(speech_key, speech_region), get_audio_cache())
+        if synthesis_mode == "Stream":
+            resources += (get_stream_server(),)
+        try:
+            job = submit_session_job(
+                get_job_executor(), "synthesis", synthesis_mode.lower(), synthesize,
+                *resources, user_text, selected_language, selected_voice, audio_format)
+            job.detail.update(voice=selected_voice, format=selected_format)
+            # Cache hits finish at once and are shown in this run
+            wait([job.future], timeout=JOB_POLL_SECONDS)
+        except TooManyJobs as e:
+            st.warning(str(e))
+
+synthesis_job = session_job(get_job_executor(), "synthesis")
+if synthesis_job is not None:
+    stream_path = synthesis_job.detail.get("stream_path")
+    if stream_path:
+        # Rendered the same way on every rerun, so playback is not restarted
+        stream_player(stream_path)
+    if not synthesis_job.done:
+        synthesis_progress(synthesis_job.id, bool(stream_path))
+    elif synthesis_job.status == CANCELLED:
+        st.info("Conversion cancelled.")
+    elif synthesis_job.status == FAILED:
+        st.error(f"Error synthesizing speech: {synthesis_job.error}")
+    else:
+        audio_data, error = synthesis_job.result
+        job_format = AUDIO_FORMATS[synthesis_job.detail["format"]]
+        mime_type, extension = job_format.mime_type, job_format.extension
+        job_voice = synthesis_job.detail["voice"]
 
         if error:
             st.error(error)
         else:
             st.success("Text converted to speech successfully!")
 
-            # Play audio
-            st.audio(audio_data, format="audio/wav")
+            # Play audio, also after streaming in case the stream could not be reached
+            st.audio(audio_data, format=mime_type)
 
             # Download option
             st.markdown("<h3>Download Audio</h3>", unsafe_allow_html=True)
-            st.markdown(get_binary_file_downloader_html(
-                audio_data, "Download WAV File", f"{selected_voice}.wav"),
-                unsafe_allow_html=True
-            )
+            audio_download_button(
+                f"Download {extension.upper()} File", lambda: audio_data,
+                f"{job_voice}.{extension}", mime_type)
 
             # Save to file option
             if st.button("Save to file on server"):
                 timestamp = st.session_state.get("synthesis_count", 0) + 1
                 st.session_state["synthesis_count"] = timestamp
 
-                filename = f"synthesis_{timestamp}.wav"
+                filename = f"synthesis_{timestamp}.{extension}"
                 save_path = os.path.join(os.path.dirname(__file__), filename)
 
                 with open(save_path, "wb") as f:
@@ -225,9 +428,13 @@ with st.expander("How to use this app"):
     st.markdown("""
     1. Select your desired language and voice from the dropdown menus
     2. Enter or paste the text you want to convert to speech
-    3. Click the "Convert to Speech" button
-    4. Listen to the synthesized audio
-    5. Download the audio file or save it to the server
+    3. Choose a synthesis mode ("Long document" for stories longer than a few paragraphs)
+    4. Click the "Convert to Speech" button
+    5. Listen to the synthesized audio
+    6. Download the audio file or save it to the server
+
+    To convert a whole folder of stories without the app, run
+    `python tts_batch.py <folder> --out audio` from the lesson-2.2 folder.
     """)
 
 # Display app information in sidebar
@@ -238,7 +445,7 @@ with st.sidebar:
     st.markdown("### Features")
     st.markdown("- Multiple languages and voices")
     st.markdown("- Natural-sounding neural voices")
-    st.markdown("- WAV file download option")
+    st.markdown("- WAV, MP3 and Ogg Opus download options")
     st.markdown("- Server-side file saving")
 
     # Display Azure configuration status
@@ -253,5 +460,28 @@ with st.sidebar:
 
     st.info(f"Azure Region: {azure_region}")
 
+    # Display synthesis cache statistics
+    st.markdown("## Audio Cache")
+    cache_stats = get_audio_cache().stats()
+    st.caption(
+        f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · "
+        f"Hit rate: {cache_stats['hit_rate']:.0%}")
+    st.caption(
+        f"{cache_stats['entries']} clips, "
+        f"{cache_stats['bytes'] / (1024 * 1024):.1f} of "
+        f"{cache_stats['max_bytes'] / (1024 * 1024):.0f} MB")
+    if st.button("Clear audio cache"):
+        get_audio_cache().clear()
+        st.rerun()
+
+    job_stats = get_job_executor().stats()
+    st.caption(f"Speech jobs on this server: {job_stats['running']} running, "
+               f"{job_stats['queued']} queued")
+
+    # Timings and counters of this server process
+    metrics_panel()
+
     st.markdown("---")
     st.markdown("Made with ❤️ using Streamlit and Azure AI")
+
+snapshot_from_env()
@@ -0,0 +1,230 @@
+"""
+Batch synthesis for long documents.
+
+Long text is split on paragraph and sentence boundaries into chunks that fit
+comfortably inside the service limits. The chunks are synthesized in
+parallel on pooled synthesizers, retried with exponential backoff, and their
+PCM is joined in order into a single audio file (WAV unless a compressed
+format is requested).
+
+It can also be run from the command line to convert a folder of stories:
+
+    python tts_batch.py stories/ --out audio/ --voice en-US-JennyNeural
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from audio_formats import (AUDIO_FORMATS, DEFAULT_FORMAT, SAMPLE_RATE,
+                           encode_pcm, to_pcm)
+from lazy_imports import speechsdk
+
+# Raw PCM chunks can be concatenated without rewriting headers
+BATCH_OUTPUT_FORMAT = "Raw16Khz16BitMonoPcm"
+
+MAX_CHUNK_CHARS = 1000
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|(?<=[.!?…][\"')\]])\s+")
+STORY_EXTENSIONS = (".txt", ".md")
+
+
+def split_text(text, max_chars=MAX_CHUNK_CHARS):
+    """Split text into chunks on paragraph and sentence boundaries"""
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        current = ""
+        for sentence in SENTENCE_END.split(paragraph):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            # Sentences longer than a chunk are split on word boundaries
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                if cut <= 0:
+                    cut = max_chars
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+            if current and len(current) + 1 + len(sentence) > max_chars:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def join_pcm(pcm_chunks, sample_rate=SAMPLE_RATE, fade_ms=5):
+    """
+    Concatenate 16-bit mono PCM chunks into one buffer.
+
+    Each chunk gets a few milliseconds of fade at both ends so a non-zero
+    sample at a boundary cannot produce an audible click.
+    """
+    import numpy as np
+
+    fade = int(sample_rate * fade_ms / 1000)
+    parts = []
+    for chunk in pcm_chunks:
+        samples = np.frombuffer(chunk, dtype="<i2").astype(np.float32)
+        if fade and len(samples) > 2 * fade:
+            ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+            samples[:fade] *= ramp
+            samples[-fade:] *= ramp[::-1]
+        parts.append(samples.astype("<i2"))
+    if not parts:
+        return b""
+    return np.concatenate(parts).tobytes()
+
+
+class BatchSynthesisError(Exception):
+    """Raised when a chunk still fails after all retries"""
+
+
+def _synthesize_chunk(pool, text, voice_name, language, retries, backoff):
+    output_format = getattr(
+        speechsdk.SpeechSynthesisOutputFormat, BATCH_OUTPUT_FORMAT)
+    error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            # Exponential backoff with jitter so workers don't retry in step
+            time.sleep(backoff * 2 ** (attempt - 1) * (0.5 + random.random()))
+        try:
+            with pool.synthesizer(voice_name, language, output_format) as pooled:
+                result = pooled.client.speak_text_async(text).get()
+                if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+                    return to_pcm(result.audio_data)
+                pooled.mark_unhealthy()
+                details = result.cancellation_details
+                error = getattr(details, "error_details", None) or str(
+                    result.reason)
+        except Exception as exception:
+            error = str(exception)
+    raise BatchSynthesisError(f"Chunk failed after {retries + 1} attempts: "
+                              f"{error}")
+
+
+def synthesize_long_text(pool, text, voice_name, language, max_workers=4,
+                         retries=3, backoff=0.5, max_chars=MAX_CHUNK_CHARS,
+                         progress=None, audio_format=None):
+    """
+    Synthesize text of any length and return one audio file as bytes.
+
+    The result is a WAV file unless audio_format (an AudioFormat) asks for
+    a compressed format, in which case the joined PCM is encoded once.
+
+    progress, if given, is called as progress(done, total) from the calling
+    thread each time a chunk finishes, so it is safe to update Streamlit
+    elements from it. If progress (or a chunk) raises, the chunks that have
+    not started are dropped and the exception is raised right away; the
+    ones already in flight finish in the background.
+    """
+    audio_format = audio_format or AUDIO_FORMATS[DEFAULT_FORMAT]
+    chunks = split_text(text, max_chars)
+    if not chunks:
+        return encode_pcm(b"", audio_format)
+    results = [None] * len(chunks)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            executor.submit(_synthesize_chunk, pool, chunk, voice_name,
+                            language, retries, backoff): index
+            for index, chunk in enumerate(chunks)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if progress is not None:
+                progress(done, len(chunks))
+    except BaseException:
+        # Drop the chunks that have not started instead of waiting for them
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    return encode_pcm(join_pcm(results), audio_format)
+
+
+def convert_folder(pool, source_dir, output_dir, voice_name, language,
+                   max_workers=4, force=False, audio_format=None):
+    """Convert every story file in source_dir to an audio file in output_dir"""
+    audio_format = audio_format or AUDIO_FORMATS[DEFAULT_FORMAT]
+    os.makedirs(output_dir, exist_ok=True)
+    converted = []
+    for name in sorted(os.listdir(source_dir)):
+        if not name.lower().endswith(STORY_EXTENSIONS):
+            continue
+        source_path = os.path.join(source_dir, name)
+        output_path = os.path.join(
+            output_dir, os.path.splitext(name)[0] + "." + audio_format.extension)
+        if (not force and os.path.exists(output_path)
+                and os.path.getmtime(output_path) >= os.path.getmtime(source_path)):
+            print(f"skip  {name} (up to date)")
+            continue
+        with open(source_path, encoding="utf-8") as story_file:
+            text = story_file.read()
+        start = time.perf_counter()
+
+        def report(done, total):
+            print(f"\r      {name}: {done}/{total} chunks", end="", flush=True)
+
+        audio_data = synthesize_long_text(pool, text, voice_name, language,
+                                          max_workers=max_workers,
+                                          progress=report,
+                                          audio_format=audio_format)
+        with open(output_path, "wb") as output_file:
+            output_file.write(audio_data)
+        print(f"\rdone  {name} -> {output_path} "
+              f"({time.perf_counter() - start:.1f} s)")
+        converted.append(output_path)
+    return converted
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    from speech_clients import SpeechClientPool, backend_from_env
+
+    parser = argparse.ArgumentParser(
+        description="Convert a folder of story files to speech")
+    parser.add_argument("source", help="folder with .txt or .md stories")
+    parser.add_argument("--out", default="audio", help="output folder")
+    parser.add_argument("--voice", default="en-US-JennyNeural")
+    parser.add_argument("--language", default="en-US")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--format", choices=sorted(AUDIO_FORMATS),
+                        default=DEFAULT_FORMAT, help="output audio format")
+    parser.add_argument("--force", action="store_true",
+                        help="reconvert files that are already up to date")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    backend = backend_from_env()
+    speech_key = os.environ.get('AZURE_SPEECH_KEY')
+    speech_region = os.environ.get('AZURE_REGION', 'eastus2')
+    if backend.name == "fake":
+        speech_key = speech_key or "fake"
+    elif not speech_key or speech_key.startswith("your_"):
+        parser.error("AZURE_SPEECH_KEY is not set. Please check your .env file.")
+
+    pool = SpeechClientPool(speech_key, speech_region, backend=backend,
+                            max_concurrency=args.workers)
+    try:
+        convert_folder(pool, args.source, args.out, args.voice,
+                       args.language, args.workers, args.force,
+                       AUDIO_FORMATS[args.format])
+    except BatchSynthesisError as error:
+        print(f"\nError: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Persistent on-disk cache for synthesized speech.
+
+Audio is stored as one file per entry, named after a SHA-256 hash of the
+normalized text, voice, language and output format. Entries are written
+atomically (temporary file + rename) so several Streamlit sessions can share
+the same directory, and the least recently used files are evicted once the
+total size goes over the configured cap.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unicodedata
+
+
+def normalize_text(text):
+    """Normalize text so trivially different inputs share a cache entry"""
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.split())
+
+
+def cache_key(text, voice_name, language, output_format):
+    """Build the content hash used to address a synthesized clip"""
+    payload = json.dumps({
+        "text": normalize_text(text),
+        "voice": voice_name,
+        "language": language,
+        "format": output_format,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Content-addressed audio cache with LRU eviction under a size cap"""
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, extension="wav"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, extension=None):
+        return os.path.join(self.directory, f"{key}.{extension or self.extension}")
+
+    def get(self, key, extension=None):
+        """Return the cached bytes for key, or None on a miss"""
+        path = self._path(key, extension)
+        try:
+            with open(path, "rb") as cached_file:
+                data = cached_file.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Touch the file so its mtime records the last access for LRU
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data, extension=None):
+        """Store data under key and evict old entries if over the cap"""
+        path = self._path(key, extension)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.is_file() or entry.name.endswith(".part"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits the cap"""
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                self.evictions += 1
+                if total <= self.max_bytes:
+                    break
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            for _, _, path in self._entries():
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        """Return hit/miss counters and the current on-disk footprint"""
+        entries = self._entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,183 @@
+"""
+Streaming playback for speech synthesis.
+
+Instead of waiting for speak_text_async(...).get() and handing the finished
+clip to st.audio, the synthesizer's `synthesizing` events push each audio
+chunk into an AudioStream as soon as Azure produces it. A small HTTP server
+running next to Streamlit serves that stream to an <audio> element, so the
+browser starts playing after the first chunk rather than after the whole
+story has been synthesized. Nothing is written to disk on this path.
+
+The server only listens on localhost unless given another host, and only
+lets pages from the app's own origin read its streams from scripts.
+"""
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lazy_imports import speechsdk
+
+DEFAULT_STREAM_PORT = 8765
+
+
+class AudioStream:
+    """Thread-safe buffer of audio chunks that readers can follow live"""
+
+    def __init__(self, mime_type="audio/mpeg"):
+        self.id = uuid.uuid4().hex
+        self.mime_type = mime_type
+        self.started = time.perf_counter()
+        self.first_chunk_at = None
+        self.error = None
+        self._chunks = []
+        self._done = False
+        self._condition = threading.Condition()
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        with self._condition:
+            if self.first_chunk_at is None:
+                self.first_chunk_at = time.perf_counter()
+            self._chunks.append(bytes(chunk))
+            self._condition.notify_all()
+
+    def close(self, error=None):
+        with self._condition:
+            self.error = error
+            self._done = True
+            self._condition.notify_all()
+
+    @property
+    def done(self):
+        return self._done
+
+    @property
+    def time_to_first_chunk(self):
+        """Seconds between starting synthesis and the first audio chunk"""
+        if self.first_chunk_at is None:
+            return None
+        return self.first_chunk_at - self.started
+
+    def iter_chunks(self, timeout=None):
+        """Yield chunks from the beginning, blocking until more arrive"""
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._chunks) and not self._done:
+                    if not self._condition.wait(timeout):
+                        return
+                if index >= len(self._chunks):
+                    return
+                chunk = self._chunks[index]
+            index += 1
+            yield chunk
+
+    def wait(self, timeout=None):
+        """Block until synthesis finishes and return the complete audio"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._done, timeout)
+            return b"".join(self._chunks)
+
+
+@contextmanager
+def stream_synthesis(pooled, text, mime_type="audio/mpeg", header=b""):
+    """
+    Synthesize text on a pooled synthesizer, yielding an AudioStream.
+
+    Chunks are appended to the stream from the SDK's `synthesizing` event,
+    after header if one is given (used to stream raw PCM as WAV). On exit
+    the synthesis is awaited and the event handlers are detached, so the
+    synthesizer can go back to the pool in a clean state.
+    """
+    stream = AudioStream(mime_type)
+    if header:
+        stream.write(header)
+        stream.first_chunk_at = None
+    synthesizer = pooled.client
+    signals = (synthesizer.synthesizing, synthesizer.synthesis_completed,
+               synthesizer.synthesis_canceled)
+
+    def on_chunk(evt):
+        stream.write(evt.result.audio_data)
+
+    def on_finished(evt):
+        error = None
+        if evt.result.reason == speechsdk.ResultReason.Canceled:
+            pooled.mark_unhealthy()
+            details = evt.result.cancellation_details
+            error = getattr(details, "error_details", None) or "Canceled"
+        stream.close(error)
+
+    synthesizer.synthesizing.connect(on_chunk)
+    synthesizer.synthesis_completed.connect(on_finished)
+    synthesizer.synthesis_canceled.connect(on_finished)
+    try:
+        future = synthesizer.speak_text_async(text)
+        yield stream
+        future.get()
+    finally:
+        for signal in signals:
+            signal.disconnect_all()
+        if not stream.done:
+            stream.close("Synthesis interrupted")
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"
+
+    def do_GET(self):
+        stream_id = self.path.rstrip("/").rsplit("/", 1)[-1]
+        stream = self.server.streams.get(stream_id)
+        if stream is None:
+            self.send_error(404, "Unknown audio stream")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", stream.mime_type)
+        self.send_header("Cache-Control", "no-store")
+        if self.server.allowed_origin:
+            self.send_header("Access-Control-Allow-Origin", self.server.allowed_origin)
+        self.end_headers()
+        try:
+            for chunk in stream.iter_chunks(timeout=60):
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AudioStreamServer:
+    """Background HTTP server that serves AudioStreams by id"""
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_STREAM_PORT, allowed_origin=None,
+                 ttl=600.0):
+        self.ttl = ttl
+        self._server = ThreadingHTTPServer((host, port), _StreamHandler)
+        self._server.daemon_threads = True
+        self._server.streams = {}
+        # Origin of the app, e.g. http://localhost:8501; no CORS header if None
+        self._server.allowed_origin = allowed_origin
+        self._lock = threading.Lock()
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+
+    def register(self, stream):
+        """Make a stream available at /tts/<stream.id>"""
+        now = time.perf_counter()
+        with self._lock:
+            streams = self._server.streams
+            for stream_id, old in list(streams.items()):
+                if old.done and now - old.started > self.ttl:
+                    del streams[stream_id]
+            streams[stream.id] = stream
+        return f"/tts/{stream.id}"
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,158 +1,305 @@
+import os
+import sys
+import time
+
 import pandas as pd
+import streamlit as st
+
+# Modules shared by the lessons
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
 
-# Replace 'weather.csv' with your actual file path
-df = pd.read_csv('./lesson-2.3/washington_dc_weather_sample_2025.csv',skiprows=1)
+from app_metrics import metrics_panel, observe, snapshot_from_env, timer
+from weather_charts import (IMAGE_FORMATS, heatmap_figure, plotly_trend_figure,
+                            render_figure, scatter_figure, trend_figure)
+from weather_lod import LEVEL_NAMES, LevelOfDetail
+from weather_stats import PERIODS, format_dates, period_extremes
+from weather_store import (ingest, list_sources, read_stats, read_store, read_table, stations,
+                           store_version)
+from weather_table import PagedTable
 
-# Show the first few rows to inspect the data
-print(df.head())
+# Every weather CSV under the data folder is loaded, one station per subfolder
+# (or per file name for files directly in it)
+DATA_DIR = os.environ.get('WEATHER_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+STORE_DIR = os.environ.get('WEATHER_STORE_DIR', os.path.join(DATA_DIR, 'weather_store'))
 
-# Show basic info and statistics
-print(df.info())
-print(df.describe())
+STATION_NAMES = {'washington_dc': 'Washington DC'}
+ALL_STATIONS = 'All stations'
 
-# Date column should be converted to datetime careful with the format
-# Assuming the date format is MM/DD/YYYY
-df['Date'] = pd.to_datetime(df['Date'], format='%m/%d/%Y')
-print(df.head())
- 
-#check for missing values
-print(df.isnull().sum())
+TABLE_COLUMNS = ['Station', 'Date', 'Day',
+                 'Temperature Max', 'Temperature Avg', 'Temperature Min',
+                 'Humidity Max', 'Humidity Avg', 'Humidity Min',
+                 'Wind Max', 'Wind Avg', 'Wind Min',
+                 'Pressure Max', 'Pressure Avg', 'Pressure Min',
+                 'Total Precipitation']
 
-#rename the tMax column yp Temperature Max
-df.rename(columns={'tMax': 'Temperature Max'}, inplace=True)
-df.rename(columns={'tMin': 'Temperature Min'}, inplace=True)
-df.rename(columns={'tAvg': 'Temperature Avg'}, inplace=True)
+PAGE_SIZE = 25
 
-df.rename(columns={'wMax': 'Wind Max'}, inplace=True)
-df.rename(columns={'wMin': 'Wind Min'}, inplace=True)
-df.rename(columns={'wAvg': 'Wind Avg'}, inplace=True)
+# Select only numeric columns for correlation
+NUMERIC_COLUMNS = ['Temperature Max', 'Temperature Min', 'Temperature Avg',
+                   'Wind Max', 'Wind Min', 'Wind Avg',
+                   'Humidity Max', 'Humidity Min', 'Humidity Avg',
+                   'Pressure Max', 'Pressure Avg', 'Pressure Min', 'Total Precipitation']
 
-df.rename(columns={'hMax': 'Humidity Max'}, inplace=True)
-df.rename(columns={'hMin': 'Humidity Min'}, inplace=True)
-df.rename(columns={'hAvg': 'Humidity Avg'}, inplace=True)
+# (column, label, color) for the trend charts
+TEMPERATURE_LINES = (('Temperature Min', 'Min Temperature', 'blue'),
+                     ('Temperature Max', 'Max Temperature', 'red'),
+                     ('Temperature Avg', 'Avg Temperature', 'green'))
+WIND_LINES = (('Wind Min', 'Min Wind Speed', 'blue'),
+              ('Wind Max', 'Max Wind Speed', 'red'),
+              ('Wind Avg', 'Avg Wind Speed', 'green'))
 
-df.rename(columns={'pressureAvg': 'Pressure Max'}, inplace=True)
-df.rename(columns={'pressureMin': 'Pressure Min'}, inplace=True)
-df.rename(columns={'precipitationTotal': 'Total Precipitation'}, inplace=True)
+TREND_COLUMNS = tuple(column for column, _, _ in TEMPERATURE_LINES + WIND_LINES)
 
-#delete dewMax, dewMin, dewAvg columns
-df.drop(columns=['dewMax', 'dewMin', 'dewAvg'], inplace=True)
-print(df.head())
+# Rendered charts kept per dataset version, chart and image format
+FIGURE_CACHE_ENTRIES = int(os.environ.get('FIGURE_CACHE_ENTRIES', '32'))
 
-# Save the cleaned DataFrame to a new CSV file
-df.to_csv('./cleaned_washington_dc_weather_sample_2025.csv', index=False)
+# Points per line in the trend charts, about one per pixel of a 14 inch chart
+TREND_POINTS = 1400
+
+
+@st.cache_data(show_spinner=False)
+def update_store(data_dir, listing):
+    """Ingest new and changed weather CSVs into the columnar store"""
+    # Each file's two header rows are validated, the dates parsed and the
+    # columns named from the schema in weather_data.py, in worker processes
+    with timer("dashboard_stage_seconds", stage="ingest"):
+        manifest = ingest(data_dir, STORE_DIR)
+    skipped = {path: source['error'] for path, source in manifest['sources'].items()
+               if source.get('error')}
+    version = store_version(manifest)
+    return version, stations(manifest), skipped
+
+
+def station_filter(station):
+    """Stations to read for a station choice, None for all"""
+    return None if station is None else [station]
+
+
+def station_title(station):
+    """Display name of a station"""
+    if station is None:
+        return ALL_STATIONS
+    return STATION_NAMES.get(station, station.replace('_', ' ').title())
+
+
+@st.cache_data(show_spinner=False)
+def load_columns(columns, station, version):
+    """Read only the given columns of a station (None for all) from the store"""
+    with timer("dashboard_stage_seconds", stage="load"):
+        return read_store(STORE_DIR, columns, stations=station_filter(station))
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_level_of_detail(station, version):
+    """Daily, weekly and monthly aggregates of the trend columns"""
+    df = load_columns(('Date',) + TREND_COLUMNS, station, version)
+    with timer("dashboard_stage_seconds", stage="aggregate", chart="trends"):
+        return LevelOfDetail(df, TREND_COLUMNS)
+
+
+@st.cache_data(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def trend_chart(lines, title, ylabel, start, end, station, version, image_format):
+    """Render a line chart of the given columns over time"""
+    detail, series = get_level_of_detail(station, version).series(
+        [column for column, _, _ in lines], start, end, TREND_POINTS)
+    with timer("dashboard_stage_seconds", stage="render", chart="trend"):
+        return render_figure(trend_figure(series, lines, title, ylabel), image_format), detail
+
+
+@st.cache_data(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def plotly_trend_chart(lines, title, ylabel, start, end, station, version):
+    """Build an interactive line chart of the given columns over time"""
+    detail, series = get_level_of_detail(station, version).series(
+        [column for column, _, _ in lines], start, end, TREND_POINTS)
+    with timer("dashboard_stage_seconds", stage="render", chart="plotly_trend"):
+        return plotly_trend_figure(series, lines, title, ylabel), detail
+
+
+def show_trend(chart, lines, title, ylabel, start, end):
+    """Display a trend chart and the level of detail it was drawn at"""
+    with timer("dashboard_section_seconds", section=chart):
+        if interactive:
+            fig, detail = plotly_trend_chart(lines, title, ylabel, start, end, station, version)
+            st.plotly_chart(fig)
+        else:
+            image, detail = trend_chart(lines, title, ylabel, start, end, station, version,
+                                        image_format)
+            show_image(image, image_format)
+    caption = f"{LEVEL_NAMES[detail.level]}, {detail.points:,} points per line"
+    if detail.level != 'raw':
+        caption += ", shaded between the lowest and highest value"
+    if detail.downsampled:
+        caption += ", thinned with LTTB"
+    st.caption(caption)
+
+
+@st.cache_data(show_spinner=False)
+def column_stats(station, version):
+    """Running statistics of every measurement, updated per changed month"""
+    with timer("dashboard_stage_seconds", stage="load", chart="stats"):
+        return read_stats(STORE_DIR, stations=station_filter(station))
 
-# Visualize Min Temperature and Max Temperature and Max Temperature as a line chart
-import matplotlib.pyplot as plt
-import seaborn as sns
-import streamlit as st
 
-# First plot - Temperature Trends
-fig1, ax1 = plt.subplots(figsize=(14, 7))
-sns.lineplot(data=df, x='Date', y='Temperature Min', label='Min Temperature', color='blue', ax=ax1)
-sns.lineplot(data=df, x='Date', y='Temperature Max', label='Max Temperature', color='red', ax=ax1)
-sns.lineplot(data=df, x='Date', y='Temperature Avg', label='Avg Temperature', color='green', ax=ax1)
-ax1.set_title('Temperature Trends in Washington DC (2025)')
-ax1.set_xlabel('Date')
-ax1.set_ylabel('Temperature (°F)')
-ax1.legend()
-ax1.tick_params(axis='x', rotation=45)
-plt.tight_layout()
-
-# Second plot - Wind Speed Trends
-fig2, ax2 = plt.subplots(figsize=(14, 7))
-sns.lineplot(data=df, x='Date', y='Wind Min', label='Min Wind Speed', color='blue', ax=ax2)
-sns.lineplot(data=df, x='Date', y='Wind Max', label='Max Wind Speed', color='red', ax=ax2)
-sns.lineplot(data=df, x='Date', y='Wind Avg', label='Avg Wind Speed', color='green', ax=ax2)
-ax2.set_title('Wind Speed Trends in Washington DC (2025)')
-ax2.set_xlabel('Date')
-ax2.set_ylabel('Wind Speed (mph)')
-ax2.legend()
-ax2.tick_params(axis='x', rotation=45)
-plt.tight_layout()
-
-st.title("Washington DC Weather Data Analysis (2025)")
+@st.cache_data(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def heatmap_chart(columns, station, version, image_format):
+    """Render the correlation heatmap of the given columns"""
+    columns = list(columns)
+    correlation_matrix = column_stats(station, version).correlation().loc[columns, columns]
+    with timer("dashboard_stage_seconds", stage="render", chart="heatmap"):
+        return render_figure(
+            heatmap_figure(correlation_matrix, 'Weather Variables Correlation Matrix'),
+            image_format)
+
+
+@st.cache_data(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def scatter_chart(x, y, title, xlabel, ylabel, station, version, image_format):
+    """Render a scatter plot of two columns"""
+    df = load_columns((x, y), station, version)
+    with timer("dashboard_stage_seconds", stage="render", chart="scatter"):
+        return render_figure(scatter_figure(df, x, y, title, xlabel, ylabel), image_format)
+
+
+@st.cache_data(show_spinner=False)
+def temperature_extremes(period, station, version):
+    """Hottest and coldest day of every period, per station when showing all"""
+    by = 'Station' if station is None else None
+    df = load_columns(('Station', 'Date', 'Temperature Max', 'Temperature Min'), station, version)
+    with timer("dashboard_stage_seconds", stage="aggregate", chart="extremes"):
+        extremes = period_extremes(df, 'Temperature Max', 'Temperature Min', period, by=by)
+    columns = {}
+    if by:
+        columns['Station'] = extremes['Station'].map(station_title)
+    return pd.DataFrame({
+        **columns,
+        period.title(): extremes['Period'],
+        'Hottest Day': format_dates(extremes['Max Date'], '%B %d, %Y'),
+        'Max Temperature (°F)': extremes['Max'].round(1),
+        'Coldest Day': format_dates(extremes['Min Date'], '%B %d, %Y'),
+        'Min Temperature (°F)': extremes['Min'].round(1),
+        'Temperature Range (°F)': extremes['Range'].round(1),
+    })
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_paged_table(station, version):
+    """Memory-mapped raw data with its sort orders, shared by all sessions"""
+    columns = TABLE_COLUMNS if station is None else TABLE_COLUMNS[1:]
+    return PagedTable(read_table(STORE_DIR, columns, stations=station_filter(station)))
+
+
+@st.fragment
+def raw_data_table(station, version):
+    """Page, sort and filter the raw data without rerunning the whole app"""
+    table = get_paged_table(station, version)
+    first, last = table.date_range()
+    if first is None:
+        st.info("There is no data to show.")
+        return
+    first, last = pd.Timestamp(first).date(), pd.Timestamp(last).date()
+
+    filter_col, sort_col, order_col = st.columns([2, 2, 1])
+    dates = filter_col.date_input("Dates", value=(first, last), min_value=first, max_value=last)
+    # While only the first date of a range is picked, show every date
+    start, end = dates if len(dates) == 2 else (first, last)
+    sort = sort_col.selectbox("Sort by", table.columns)
+    ascending = order_col.radio("Order", ["Ascending", "Descending"]) == "Ascending"
+
+    positions = table.view(None if start == first else start,
+                           None if end == last else end, sort, ascending)
+    pages = max(1, -(-len(positions) // PAGE_SIZE))
+    page_num = st.number_input("Page", min_value=1, max_value=pages, value=1)
+    st.dataframe(table.page(positions, page_num, PAGE_SIZE), height=600,
+                 width="stretch", hide_index=True)
+    st.caption(f"Page {page_num} of {pages}, {len(positions):,} rows")
+
+
+def show_image(image, image_format):
+    """Display rendered chart bytes"""
+    if image_format == 'svg':
+        # st.image only takes SVG as markup
+        image = image.decode('utf-8')
+    st.image(image, width='stretch')
+
+
+# Cached stages only record a time when they are computed; sections and the
+# whole run are timed on every rerun, cache hits included
+run_started = time.perf_counter()
+version, station_names, skipped = update_store(
+    DATA_DIR, tuple(list_sources(DATA_DIR, STORE_DIR)))
+for path, error in sorted(skipped.items()):
+    st.warning(f"Skipped {path}, it does not have the expected columns: {error}")
+if not station_names:
+    st.error(f"There are no weather CSV files in {DATA_DIR}.")
+    st.stop()
+
+with st.sidebar:
+    st.header("Station")
+    choices = station_names + [ALL_STATIONS] if len(station_names) > 1 else station_names
+    station = st.selectbox("Station", choices, format_func=station_title,
+                           label_visibility="collapsed")
+    if station == ALL_STATIONS:
+        station = None
+
+    st.header("Charts")
+    interactive = st.toggle("Interactive line charts (Plotly)", value=False,
+                            help="Zoom and pan in the browser instead of static images")
+    image_format = st.selectbox("Image format", list(IMAGE_FORMATS),
+                                format_func=IMAGE_FORMATS.get)
+    first, last = (pd.Timestamp(date).date()
+                   for date in get_level_of_detail(station, version).date_range())
+    chart_dates = st.slider("Chart dates", min_value=first, max_value=last,
+                            value=(first, last), format="YYYY-MM-DD")
+    # The whole range is cached under None, so it is shared by everyone
+    chart_start = None if chart_dates[0] == first else chart_dates[0]
+    chart_end = None if chart_dates[1] == last else chart_dates[1]
+
+    # Timings of every stage, kept by this server process
+    metrics_panel()
+
+place = station_title(station)
+years = str(first.year) if first.year == last.year else f"{first.year}-{last.year}"
+if station is None:
+    place = f"{len(station_names)} Stations"
+st.title(f"{place} Weather Data Analysis ({years})")
 st.write("### Raw Data Sample")
 #st.dataframe(df, height=600, use_container_width=True)
-st.write("Showing 25 records per page. Use the table controls below to page through the data.")
+st.write(f"Showing {PAGE_SIZE} records per page. Use the table controls below to filter, sort and page through the data.")
 #st.dataframe(df, height=600, use_container_width=True, hide_index=True)
-# For paging, use Streamlit's built-in pagination with st.dataframe, or implement custom paging:
-page_size = 25
-total_rows = len(df)
-page_num = st.number_input("Page", min_value=1, max_value=(total_rows - 1) // page_size + 1, value=1)
-start_idx = (page_num - 1) * page_size
-end_idx = start_idx + page_size
-st.dataframe(df.iloc[start_idx:end_idx], height=600, use_container_width=True)
+with timer("dashboard_section_seconds", section="raw_data"):
+    raw_data_table(station, version)
 
 st.write("### Temperature Trends")
-st.pyplot(fig1)
+show_trend("temperature", TEMPERATURE_LINES, f'Temperature Trends in {place} ({years})', 'Temperature (°F)',
+           chart_start, chart_end)
 
 st.write("### Wind Speed Trends")
-st.pyplot(fig2) 
+show_trend("wind", WIND_LINES, f'Wind Speed Trends in {place} ({years})', 'Wind Speed (mph)',
+           chart_start, chart_end)
 
 # 1. Correlation Heatmap - Shows relationships between all variables
 st.write("### Correlation Heatmap")
-fig5, ax5 = plt.subplots(figsize=(12, 8))
-# Select only numeric columns for correlation
-numeric_cols = ['Temperature Max', 'Temperature Min', 'Temperature Avg', 
-                'Wind Max', 'Wind Min', 'Wind Avg', 
-                'Humidity Max', 'Humidity Min', 'Humidity Avg',
-                'Pressure Max', 'Pressure Min', 'Total Precipitation']
-correlation_matrix = df[numeric_cols].corr()
-sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', center=0, ax=ax5)
-ax5.set_title('Weather Variables Correlation Matrix')
-plt.tight_layout()
-st.pyplot(fig5)
-
-# Extract month from date for grouping
-df['Month'] = df['Date'].dt.month
-df['Month_Name'] = df['Date'].dt.strftime('%B')
-
-# Find hottest and coldest days by month
-st.write("### Hottest and Coldest Days by Month")
-
-# Method 1: Summary table
-monthly_extremes = df.groupby(['Month', 'Month_Name']).agg({
-    'Temperature Max': ['max', 'idxmax'],
-    'Temperature Min': ['min', 'idxmin'],
-    'Date': 'first'  # Just to get month info
-}).round(1)
-
-# Flatten column names
-monthly_extremes.columns = ['Max_Temp', 'Max_Temp_Idx', 'Min_Temp', 'Min_Temp_Idx', 'Month_Date']
-
-# Create a clean summary table by month
-summary_data = []
-for month, month_name in monthly_extremes.index:
-    row = monthly_extremes.loc[(month, month_name)]
-    
-    # Get the actual dates for hottest and coldest days
-    hottest_date = df.loc[row['Max_Temp_Idx'], 'Date'].strftime('%B %d, %Y')
-    coldest_date = df.loc[row['Min_Temp_Idx'], 'Date'].strftime('%B %d, %Y')
-    
-    summary_data.append({
-        'Month': month_name,
-        'Hottest Day': hottest_date,
-        'Max Temperature (°F)': row['Max_Temp'],
-        'Coldest Day': coldest_date,
-        'Min Temperature (°F)': row['Min_Temp'],
-        'Temperature Range (°F)': row['Max_Temp'] - row['Min_Temp']
-    })
+with timer("dashboard_section_seconds", section="heatmap"):
+    show_image(heatmap_chart(tuple(NUMERIC_COLUMNS), station, version, image_format),
+               image_format)
 
-summary_df = pd.DataFrame(summary_data)
-st.dataframe(summary_df, use_container_width=True)
+st.write("### Summary Statistics")
+with timer("dashboard_section_seconds", section="summary"):
+    st.dataframe(column_stats(station, version).summary().T.round(2), width="stretch")
+
+# Find hottest and coldest days by week, month, season or year
+period = st.selectbox("Period", PERIODS, index=PERIODS.index("month"), format_func=str.title)
+st.write(f"### Hottest and Coldest Days by {period.title()}")
+with timer("dashboard_section_seconds", section="extremes"):
+    st.dataframe(temperature_extremes(period, station, version), width="stretch",
+                 hide_index=True)
 
 st.write("### Scatterplot: Max Humidity vs Total Precipitation")
-fig6, ax6 = plt.subplots(figsize=(10, 6))
-sns.scatterplot(
-    data=df,
-    x='Humidity Max',
-    y='Total Precipitation',
-    ax=ax6,
-    color='purple'
-)
-ax6.set_title('Max Humidity vs Total Precipitation')
-ax6.set_xlabel('Max Humidity (%)')
-ax6.set_ylabel('Total Precipitation (inches)')
-plt.tight_layout()
-st.pyplot(fig6)
\ No newline at end of file
+with timer("dashboard_section_seconds", section="scatter"):
+    show_image(scatter_chart('Humidity Max', 'Total Precipitation',
+                             'Max Humidity vs Total Precipitation',
+                             'Max Humidity (%)', 'Total Precipitation (inches)', station, version,
+                             image_format),
+               image_format)
+
+observe("dashboard_run_seconds", time.perf_counter() - run_started)
+snapshot_from_env()
@@ -0,0 +1,110 @@
+"""
+Charts for the weather dashboard.
+
+The matplotlib charts are drawn on standalone Figure objects rather than
+through pyplot, so nothing is kept in pyplot's global figure list and
+rendering is safe from Streamlit's script threads. Trend lines are plain
+line plots of series prepared by weather_lod, without seaborn's per-call
+estimator. render_figure turns a figure into PNG or SVG bytes, which the
+app caches per dataset version and chart parameters; a page turn then
+costs a cache lookup instead of a redraw. The line charts can also be
+built as Plotly figures, which zoom and pan in the browser without a
+round trip to the server.
+
+matplotlib, seaborn and Plotly take most of the dashboard's import time, so
+they are imported inside the functions that draw, after the page has
+started rendering, and only the ones a chart actually uses. The Agg backend
+is selected up front so matplotlib never probes for a GUI toolkit.
+"""
+import io
+import os
+
+# Only set when the user has not picked a backend
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+IMAGE_FORMATS = {"png": "PNG", "svg": "SVG"}
+
+
+def trend_figure(series, lines, title, ylabel):
+    """
+    Line chart of several series over Date.
+
+    series maps each column to a frame with Date and value columns, plus
+    min and max when the values are aggregates, which are drawn as a band.
+    lines is a sequence of (column, label, color).
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(14, 7))
+    ax = fig.subplots()
+    for column, label, color in lines:
+        frame = series[column]
+        ax.plot(frame['Date'], frame['value'], label=label, color=color)
+        if 'min' in frame:
+            ax.fill_between(frame['Date'], frame['min'], frame['max'],
+                            color=color, alpha=0.15, linewidth=0)
+    ax.set_title(title)
+    ax.set_xlabel('Date')
+    ax.set_ylabel(ylabel)
+    ax.legend()
+    ax.tick_params(axis='x', rotation=45)
+    fig.tight_layout()
+    return fig
+
+
+def heatmap_figure(correlation_matrix, title):
+    """Annotated heatmap of a correlation matrix"""
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(12, 8))
+    ax = fig.subplots()
+    sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', center=0, ax=ax)
+    ax.set_title(title)
+    fig.tight_layout()
+    return fig
+
+
+def scatter_figure(df, x, y, title, xlabel, ylabel, color='purple'):
+    """Scatter plot of two columns"""
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.scatterplot(data=df, x=x, y=y, ax=ax, color=color)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    fig.tight_layout()
+    return fig
+
+
+def render_figure(fig, image_format="png", dpi=100):
+    """Render a figure to PNG or SVG bytes"""
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=image_format, dpi=dpi)
+    return buffer.getvalue()
+
+
+def plotly_trend_figure(series, lines, title, ylabel):
+    """Interactive Plotly version of trend_figure"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for column, label, color in lines:
+        frame = series[column]
+        if 'min' in frame:
+            # Band first so the line is drawn on top of it
+            fig.add_trace(go.Scatter(
+                x=list(frame['Date']) + list(frame['Date'][::-1]),
+                y=list(frame['max']) + list(frame['min'][::-1]),
+                fill='toself', fillcolor=color, opacity=0.15, line={'width': 0},
+                hoverinfo='skip', showlegend=False))
+        fig.add_trace(go.Scatter(x=frame['Date'], y=frame['value'], mode='lines',
+                                 name=label, line={'color': color}))
+    fig.update_layout(title=title, xaxis_title='Date', yaxis_title=ylabel,
+                      hovermode='x unified')
+    return fig
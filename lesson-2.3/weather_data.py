@@ -0,0 +1,107 @@
+"""
+Reading and validating weather station CSVs.
+
+The source file has two header rows: measurement groups
+("Temperature (°F)", "Humidity (%)", ...) above short labels (tMax, tAvg,
+...). The short labels are not reliable: in the sample the humidity, wind
+and pressure max columns each carry the label of the group before them
+(humidity max is a second dewMax), so renaming by label silently
+mislabeled three columns. Columns are therefore named by position from a
+declared SCHEMA, after checking both header rows against it.
+
+Every file in this format is loaded into one columnar store of
+station-tagged rows (see weather_store.py), which only parses files that
+changed.
+"""
+import csv
+from collections import namedtuple
+
+import pandas as pd
+
+Field = namedtuple("Field", ["group", "labels", "name", "dtype"])
+Field.__doc__ = "One source column: header group, accepted labels, name, dtype"
+
+# Columns in file order. The first label is the expected one, the others are
+# known variants of the same column.
+SCHEMA = [
+    Field('', ('Date',), 'Date', 'datetime64[ns]'),
+    Field('Time', ('Day',), 'Day', 'int16'),
+    Field('Temperature (°F)', ('tMax',), 'Temperature Max', 'float32'),
+    Field('Temperature (°F)', ('tAvg',), 'Temperature Avg', 'float32'),
+    Field('Temperature (°F)', ('tMin',), 'Temperature Min', 'float32'),
+    Field('Dew Point (°F)', ('dewMax',), 'Dew Point Max', 'float32'),
+    Field('Dew Point (°F)', ('dewAvg',), 'Dew Point Avg', 'float32'),
+    Field('Dew Point (°F)', ('dewMin',), 'Dew Point Min', 'float32'),
+    Field('Humidity (%)', ('hMax', 'dewMax'), 'Humidity Max', 'float32'),
+    Field('Humidity (%)', ('hAvg',), 'Humidity Avg', 'float32'),
+    Field('Humidity (%)', ('hMin',), 'Humidity Min', 'float32'),
+    Field('Wind Speed (mph)', ('wMax', 'hMax'), 'Wind Max', 'float32'),
+    Field('Wind Speed (mph)', ('wAvg',), 'Wind Avg', 'float32'),
+    Field('Wind Speed (mph)', ('wMin',), 'Wind Min', 'float32'),
+    Field('Pressure (in)', ('pressureMax', 'wMax'), 'Pressure Max', 'float32'),
+    Field('Pressure (in)', ('pressureAvg',), 'Pressure Avg', 'float32'),
+    Field('Pressure (in)', ('pressureMin',), 'Pressure Min', 'float32'),
+    Field('Precipitation (in)', ('precipitationTotal',), 'Total Precipitation',
+          'float32'),
+]
+
+COLUMNS = [field.name for field in SCHEMA]
+
+# The readings, without the date and day of month
+MEASUREMENTS = [field.name for field in SCHEMA if field.dtype == 'float32']
+
+DATE_FORMAT = '%m/%d/%Y'
+
+
+class SchemaError(ValueError):
+    """The CSV header does not match SCHEMA"""
+
+
+def read_header(path):
+    """Return the group and label header rows of a weather CSV"""
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        reader = csv.reader(source)
+        try:
+            return next(reader), next(reader)
+        except StopIteration:
+            raise SchemaError(f"{path}: expected two header rows") from None
+
+
+def validate_header(groups, labels, source='CSV'):
+    """Check both header rows against SCHEMA, listing every mismatch"""
+    if len(labels) != len(SCHEMA) or len(groups) != len(SCHEMA):
+        raise SchemaError(f"{source}: expected {len(SCHEMA)} columns, found "
+                          f"{len(groups)} groups and {len(labels)} labels")
+
+    problems = []
+    group = ''
+    for position, (field, group_cell, label) in enumerate(
+            zip(SCHEMA, groups, labels)):
+        # A group name covers the empty cells to its right
+        group = group_cell.strip() or group
+        if group != field.group:
+            problems.append(f"column {position + 1} is in group {group!r}, "
+                            f"expected {field.group!r}")
+        if label.strip() not in field.labels:
+            problems.append(f"column {position + 1} is labeled {label!r}, "
+                            f"expected {field.labels[0]!r}")
+    if problems:
+        raise SchemaError(f"{source}: " + "; ".join(problems))
+
+
+def load_weather_csv(path):
+    """
+    Validate, read and type a raw weather CSV.
+
+    Columns are named from SCHEMA, readings become float32 and the day of
+    month int16. The frame is indexed by the parsed date and keeps it as a
+    Date column too.
+    """
+    validate_header(*read_header(path), source=path)
+    dtypes = {field.name: field.dtype for field in SCHEMA
+              if field.name != 'Date'}
+    df = pd.read_csv(path, skiprows=2, header=None, names=COLUMNS,
+                     dtype=dtypes, encoding='utf-8-sig')
+    df['Date'] = pd.to_datetime(df['Date'], format=DATE_FORMAT)
+    df.index = pd.DatetimeIndex(df['Date']).rename(None)
+    return df
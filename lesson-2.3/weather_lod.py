@@ -0,0 +1,142 @@
+"""
+Level of detail for long weather time series.
+
+Plotting every reading with seaborn gets slow and unreadable once the data
+covers years of hourly values. LevelOfDetail pre-aggregates the series once
+into daily, weekly and monthly min/avg/max, and for a date range picks the
+finest level that fits the target number of points (about one per pixel).
+A level with up to LTTB_FACTOR times too many points is thinned with
+Largest-Triangle-Three-Buckets instead of falling back to a coarser one, so
+a chart never draws more than max_points points per line.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from weather_stats import period_starts
+
+LEVELS = ["raw", "day", "week", "month"]
+LEVEL_NAMES = {"raw": "Every reading", "day": "Daily averages",
+               "week": "Weekly averages", "month": "Monthly averages"}
+
+# How far over max_points a level may be and still be thinned with LTTB
+LTTB_FACTOR = 4
+
+Detail = namedtuple("Detail", ["level", "points", "downsampled"])
+Detail.__doc__ = "Which level a series came from and how many points it has"
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last point and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the average of the next bucket.
+    """
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = (np.arange(threshold - 1) * (size - 2) / (threshold - 2)).astype(np.int64) + 1
+    edges[-1] = size - 1
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = size - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x = np.nanmean(x[end:edges[bucket + 2]])
+            next_y = np.nanmean(y[end:edges[bucket + 2]])
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        if np.all(np.isnan(area)):
+            previous = start
+        else:
+            previous = start + int(np.nanargmax(area))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def _aggregate(values, keys):
+    """Min, mean and max of each column per run of equal (sorted) keys"""
+    if len(keys) == 0:
+        return keys, values, values, values
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    present = ~np.isnan(values)
+    counts = np.add.reduceat(present, starts, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0) / counts
+    minimum = np.fmin.reduceat(values, starts, axis=0)
+    maximum = np.fmax.reduceat(values, starts, axis=0)
+    return keys[starts], minimum, means, maximum
+
+
+class LevelOfDetail:
+    """Series of several columns aggregated at every level in LEVELS"""
+
+    def __init__(self, df, columns, date_column="Date"):
+        self.columns = list(columns)
+        dates = df[date_column].to_numpy(dtype="datetime64[ns]")
+        order = np.argsort(dates, kind="stable")
+        dates = dates[order]
+        values = df[self.columns].to_numpy(dtype=np.float64)[order]
+        self.levels = {"raw": (dates, values, values, values)}
+        # Readings only make a line when there is one per timestamp, which is
+        # not the case for several stations
+        self.raw_is_series = bool(np.all(dates[1:] > dates[:-1]))
+        for level in LEVELS[1:]:
+            if level == "day":
+                keys = dates.astype("datetime64[D]")
+            else:
+                keys = period_starts(dates, level)
+            keys, minimum, means, maximum = _aggregate(values, keys)
+            self.levels[level] = (keys.astype("datetime64[ns]"), minimum, means, maximum)
+
+    def date_range(self):
+        dates = self.levels["raw"][0]
+        if len(dates) == 0:
+            return None, None
+        return dates[0], dates[-1]
+
+    def series(self, columns, start=None, end=None, max_points=1000):
+        """
+        Columns between two dates (inclusive) at the best level.
+
+        Returns (Detail, {column: DataFrame}) where each frame has Date and
+        value columns, plus min and max for aggregated levels.
+        """
+        for level in LEVELS:
+            if level == "raw" and not self.raw_is_series:
+                continue
+            dates, minimum, means, maximum = self.levels[level]
+            low, high = 0, len(dates)
+            if start is not None:
+                low = np.searchsorted(dates, np.datetime64(start, "ns"))
+            if end is not None:
+                high = np.searchsorted(dates, np.datetime64(end, "ns") + np.timedelta64(1, "D"))
+            high = max(low, high)
+            if high - low <= max_points * LTTB_FACTOR or level == LEVELS[-1]:
+                break
+
+        series = {}
+        points = 0
+        for column in columns:
+            index = self.columns.index(column)
+            frame = pd.DataFrame({"Date": dates[low:high],
+                                  "value": means[low:high, index]})
+            if level != "raw":
+                frame["min"] = minimum[low:high, index]
+                frame["max"] = maximum[low:high, index]
+            if len(frame) > max_points:
+                kept = lttb(frame["Date"].to_numpy().astype(np.int64),
+                            frame["value"].to_numpy(), max_points)
+                frame = frame.iloc[kept].reset_index(drop=True)
+            series[column] = frame
+            points = max(points, len(frame))
+        return Detail(level, points, high - low > max_points), series
@@ -0,0 +1,245 @@
+"""
+Summary statistics for the weather data.
+
+period_extremes finds the highest and lowest reading of every week, month,
+season or year (optionally per station) without a Python loop over the
+groups. Each row is mapped to the start date of its period with integer
+arithmetic on the datetime64 values and combined with the station code into
+a single int64 group key, one grouped idxmax/idxmin per column gives row
+positions, and the dates of the extremes are taken by position. Labels and
+dates are only formatted once per distinct value, not once per row.
+"""
+import numpy as np
+import pandas as pd
+
+PERIODS = ["week", "month", "season", "year"]
+
+# Meteorological seasons by the month they start in
+SEASONS = {12: "Winter", 3: "Spring", 6: "Summer", 9: "Autumn"}
+
+
+def period_starts(dates, period):
+    """Start date of the period containing each date, as datetime64[D]"""
+    values = np.asarray(dates, dtype="datetime64[D]")
+    if period == "week":
+        days = values.astype(np.int64)
+        # 1970-01-01 was a Thursday; weeks start on Monday
+        return (days - (days + 3) % 7).astype("datetime64[D]")
+    if period == "month":
+        return values.astype("datetime64[M]").astype("datetime64[D]")
+    if period == "season":
+        months = values.astype("datetime64[M]").astype(np.int64)
+        # December starts the next year's winter
+        starts = (months + 1) // 3 * 3 - 1
+        return starts.astype("datetime64[M]").astype("datetime64[D]")
+    if period == "year":
+        return values.astype("datetime64[Y]").astype("datetime64[D]")
+    raise ValueError(f"Unknown period {period!r}, expected one of {PERIODS}")
+
+
+def period_labels(starts, period):
+    """Readable labels for period start dates, as an ordered categorical"""
+    unique_starts, codes = np.unique(starts, return_inverse=True)
+    unique_starts = pd.DatetimeIndex(unique_starts)
+    if period == "week":
+        labels = unique_starts.strftime("Week of %b %d, %Y")
+    elif period == "month":
+        labels = unique_starts.strftime("%B %Y")
+    elif period == "season":
+        names = pd.Index(unique_starts.month).map(SEASONS)
+        # Winter is named after the year its January falls in
+        years = unique_starts.year + (unique_starts.month == 12)
+        labels = names + " " + years.astype(str)
+    elif period == "year":
+        labels = unique_starts.strftime("%Y")
+    else:
+        raise ValueError(f"Unknown period {period!r}, expected one of {PERIODS}")
+    return pd.Categorical.from_codes(codes, categories=list(labels), ordered=True)
+
+
+def format_dates(dates, date_format):
+    """strftime that formats each distinct date only once"""
+    codes, unique_dates = pd.factorize(pd.DatetimeIndex(dates))
+    return pd.Index(unique_dates.strftime(date_format)).take(codes)
+
+
+def _group_keys(df, by, starts):
+    """One int64 key per row, ordered by the by column and then period"""
+    keys = starts.astype(np.int64)
+    if by is None or len(keys) == 0:
+        return keys
+    column = df[by]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy(dtype=np.int64)
+    else:
+        codes = pd.factorize(column, sort=True)[0].astype(np.int64)
+    first = keys.min()
+    return codes * (keys.max() - first + 1) + (keys - first)
+
+
+def _grouped_position(values, keys, func):
+    """Row position of the idxmax/idxmin of values within each group"""
+    valid = ~np.isnan(values)
+    positions = np.flatnonzero(valid)
+    series = pd.Series(values[valid], index=positions)
+    return getattr(series.groupby(keys[valid], sort=True), func)()
+
+
+def period_extremes(df, max_column, min_column, period="month", by=None):
+    """
+    Highest max_column and lowest min_column reading in every period.
+
+    df needs a Date column. by names an optional column (such as a station)
+    to group by before the period. Returns one row per group with the by
+    column, Period (ordered categorical label), Period Start, Max, Max Date,
+    Min, Min Date and Range, sorted by group and period. Groups without any
+    readings are left out.
+    """
+    dates = df["Date"].to_numpy(dtype="datetime64[ns]")
+    starts = period_starts(dates, period)
+    keys = _group_keys(df, by, starts)
+
+    max_values = df[max_column].to_numpy()
+    min_values = df[min_column].to_numpy()
+    max_positions = _grouped_position(max_values, keys, "idxmax")
+    min_positions = _grouped_position(min_values, keys, "idxmin")
+    max_positions, min_positions = max_positions.align(min_positions, join="inner")
+    max_positions = max_positions.to_numpy(dtype=np.int64)
+    min_positions = min_positions.to_numpy(dtype=np.int64)
+
+    result_starts = starts.take(max_positions)
+    result = pd.DataFrame({
+        "Period": period_labels(result_starts, period),
+        "Period Start": pd.DatetimeIndex(result_starts.astype("datetime64[ns]")),
+        "Max": max_values.take(max_positions),
+        "Max Date": pd.DatetimeIndex(dates.take(max_positions)),
+        "Min": min_values.take(min_positions),
+        "Min Date": pd.DatetimeIndex(dates.take(min_positions)),
+    })
+    result["Range"] = result["Max"] - result["Min"]
+    if by is not None:
+        result.insert(0, by, df[by].to_numpy().take(max_positions))
+    return result
+
+
+class RunningStats:
+    """
+    Mergeable running statistics of several columns.
+
+    Every pair of columns keeps its own count, means, sums of squared
+    deviations and co-moment over the rows where both are present, which is
+    what DataFrame.corr() uses. Batches are folded in with the pairwise
+    update of Chan et al. (Welford's algorithm for blocks), so adding rows
+    costs O(new rows) and two states can be merged exactly. The per-column
+    statistics are the diagonal.
+    """
+
+    FIELDS = ["count", "mean", "m2", "comoment", "minimum", "maximum", "rows"]
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        size = len(self.columns)
+        self.rows = 0
+        self.count = np.zeros((size, size))
+        # mean[i, j] and m2[i, j] are of column i over rows where j is present
+        self.mean = np.zeros((size, size))
+        self.m2 = np.zeros((size, size))
+        self.comoment = np.zeros((size, size))
+        self.minimum = np.full(size, np.nan)
+        self.maximum = np.full(size, np.nan)
+
+    @classmethod
+    def from_values(cls, columns, values):
+        stats = cls(columns)
+        stats.update(values)
+        return stats
+
+    def update(self, values):
+        """Add a batch of rows (a DataFrame with the columns, or a 2D array)"""
+        if hasattr(values, "columns"):
+            values = values[self.columns].to_numpy(dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return self
+        present = ~np.isnan(values)
+        weights = present.astype(np.float64)
+
+        # Shift by the batch means to keep the sums small
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shift = np.nansum(values, axis=0) / weights.sum(axis=0)
+        shift = np.nan_to_num(shift)
+        shifted = np.where(present, values - shift, 0.0)
+
+        count = weights.T @ weights
+        sums = shifted.T @ weights
+        squares = (shifted * shifted).T @ weights
+        products = shifted.T @ shifted
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, sums / count, 0.0)
+            m2 = np.where(count > 0, squares - sums * mean, 0.0)
+            comoment = np.where(count > 0, products - sums * mean.T, 0.0)
+        batch = RunningStats(self.columns)
+        batch.rows = len(values)
+        batch.count = count
+        batch.mean = mean + shift[:, None]
+        batch.m2 = m2
+        batch.comoment = comoment
+        # fmin/fmax skip NaN, and give NaN for columns without values
+        batch.minimum = np.fmin.reduce(values, axis=0)
+        batch.maximum = np.fmax.reduce(values, axis=0)
+        return self.merge(batch)
+
+    def merge(self, other):
+        """Fold another state over the same columns into this one"""
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge statistics of different columns")
+        count = self.count + other.count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fraction = np.where(count > 0, other.count / count, 0.0)
+        delta = other.mean - self.mean
+        weight = self.count * fraction
+        self.mean = self.mean + delta * fraction
+        self.m2 = self.m2 + other.m2 + delta * delta * weight
+        self.comoment = self.comoment + other.comoment + delta * delta.T * weight
+        self.count = count
+        self.minimum = np.fmin(self.minimum, other.minimum)
+        self.maximum = np.fmax(self.maximum, other.maximum)
+        self.rows += other.rows
+        return self
+
+    def correlation(self):
+        """Pearson correlation matrix with pairwise-complete rows"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            matrix = self.comoment / np.sqrt(self.m2 * self.m2.T)
+        matrix[self.count < 2] = np.nan
+        return pd.DataFrame(matrix, index=self.columns, columns=self.columns)
+
+    def null_counts(self):
+        """Missing values per column"""
+        return pd.Series(self.rows - np.diag(self.count), index=self.columns,
+                         dtype=np.int64)
+
+    def summary(self):
+        """Count, missing, mean, std, min and max per column, like describe()"""
+        count = np.diag(self.count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.diag(self.m2) / (count - 1))
+        std[count < 2] = np.nan
+        mean = np.where(count > 0, np.diag(self.mean), np.nan)
+        return pd.DataFrame(
+            [count, self.null_counts().to_numpy(), mean, std,
+             self.minimum, self.maximum],
+            index=["count", "missing", "mean", "std", "min", "max"],
+            columns=self.columns)
+
+    def to_arrays(self):
+        """The state as a dict of arrays, for saving"""
+        return {field: np.asarray(getattr(self, field)) for field in self.FIELDS}
+
+    @classmethod
+    def from_arrays(cls, columns, arrays):
+        stats = cls(columns)
+        for field in cls.FIELDS:
+            setattr(stats, field, np.array(arrays[field]))
+        stats.rows = int(stats.rows)
+        return stats
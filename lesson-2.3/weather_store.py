@@ -0,0 +1,405 @@
+"""
+Columnar store for the cleaned weather data of many stations.
+
+ingest discovers every CSV under a data folder that matches the weather
+schema, parses new and changed files in parallel worker processes, and
+writes each file's rows, sorted by date and with a Station column, as one
+Arrow IPC (Feather) partition. The manifest records every source file
+(modification time, size and content hash) and every partition (station,
+the offset and row count of each month, rows and content hash), so
+re-ingesting only parses files whose contents changed, and reading some
+months only slices those rows out of a partition. The partitions are
+uncompressed so they can be memory-mapped: reading a few columns only
+touches those columns' pages.
+
+A partition per source file rather than per station and month keeps the
+number of files small: a million rows of 30-year station files is about
+a hundred files instead of some 33,000, which made a cold ingest take a
+minute and a cold statistics scan most of one.
+
+Running statistics (see weather_stats.RunningStats) are kept per partition
+in stats.npz, so after new data arrives only the changed partitions are
+scanned again.
+
+    store/
+        manifest.json
+        stats.npz
+        station=washington_dc/
+            3f2a9c0d51e7.arrow
+
+A station is the first folder of a file under the data folder, or for files
+directly in it, the file name up to "_weather" (washington_dc for
+washington_dc_weather_sample_2025.csv).
+
+It can also be run from the command line:
+
+    python weather_store.py data/ --store weather_store --workers 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+from process_pools import spawn_pool
+from weather_data import COLUMNS, MEASUREMENTS, SchemaError, load_weather_csv
+from weather_stats import RunningStats
+
+# Bumped when the layout changes, so older stores are rebuilt
+STORE_FORMAT = 4
+MANIFEST = 'manifest.json'
+STATS = 'stats.npz'
+PARTITION_SUFFIX = '.arrow'
+STORE_COLUMNS = ['Station'] + COLUMNS
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as data:
+        for block in iter(lambda: data.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def station_name(relative_path):
+    """Station of a source file, from its path under the data folder"""
+    parts = relative_path.replace(os.sep, '/').split('/')
+    if len(parts) > 1:
+        return parts[0]
+    return os.path.splitext(parts[0])[0].split('_weather')[0]
+
+
+def list_sources(root, store=None):
+    """
+    (relative path, mtime_ns, size) of every CSV under root.
+
+    Hidden folders and the store itself are skipped. This only stats the
+    files, so it is cheap enough to run on every rerun to detect changes.
+    """
+    store = os.path.abspath(store) if store else None
+    sources = []
+    for folder, folders, files in os.walk(root):
+        folders[:] = sorted(
+            name for name in folders if not name.startswith('.')
+            and os.path.abspath(os.path.join(folder, name)) != store)
+        for name in sorted(files):
+            if name.lower().endswith('.csv'):
+                path = os.path.join(folder, name)
+                stat = os.stat(path)
+                sources.append((os.path.relpath(path, root), stat.st_mtime_ns, stat.st_size))
+    return sources
+
+
+def read_manifest(directory):
+    """Return the store manifest, or None if there is no store yet"""
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as manifest:
+            return json.load(manifest)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_atomic(path, write):
+    """Call write(temp_path) and move the result into place"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _write_manifest(directory, manifest):
+    def write(temp_path):
+        with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+    _write_atomic(os.path.join(directory, MANIFEST), write)
+
+
+def write_partitions(df, directory, station, file_key):
+    """
+    Write one source file's rows, sorted by date, as a partition.
+
+    Returns {partition name: {station, months, rows, sha256}}, where the
+    name is the partition's path relative to the store and months maps
+    each month to the [offset, rows] of its readings in the partition.
+    """
+    if df.empty:
+        return {}
+    folder = os.path.join(directory, f'station={station}')
+    os.makedirs(folder, exist_ok=True)
+    df = df[COLUMNS].sort_values('Date', kind='stable').reset_index(drop=True)
+    df.insert(0, 'Station', pd.Categorical([station] * len(df)))
+    months = df['Date'].dt.strftime('%Y-%m').to_numpy()
+    starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+    counts = np.diff(np.r_[starts, len(df)])
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    name = f'station={station}/{file_key}{PARTITION_SUFFIX}'
+    path = os.path.join(directory, name)
+    _write_atomic(path, lambda temp_path: feather.write_feather(
+        table, temp_path, compression='uncompressed'))
+    return {name: {'station': station,
+                   'months': {months[start]: [int(start), int(rows)]
+                              for start, rows in zip(starts, counts)},
+                   'rows': len(df), 'sha256': file_hash(path)}}
+
+
+def _ingest_file(path, relative_path, directory):
+    """Parse one source file into partitions; runs in a worker process"""
+    station = station_name(relative_path)
+    file_key = hashlib.sha1(relative_path.encode('utf-8')).hexdigest()[:12]
+    try:
+        df = load_weather_csv(path)
+    except (SchemaError, ValueError) as error:
+        return {'station': station, 'error': str(error), 'partitions': {}}
+    return {'station': station, 'error': None,
+            'partitions': write_partitions(df, directory, station, file_key)}
+
+
+def ingest(root, directory, max_workers=None):
+    """
+    Bring the store up to date with the weather CSVs under root.
+
+    Files whose modification time and size match the manifest are skipped
+    without reading them; files whose content hash still matches only get
+    their times updated. The rest are parsed in a process pool (in this
+    process when there is only one). Files that do not match the schema
+    are recorded with their error and retried once they change. Returns
+    the manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    if (manifest is None or manifest.get('format') != STORE_FORMAT
+            or manifest['columns'] != STORE_COLUMNS):
+        # A store in an older layout is rebuilt; its partitions are removed
+        for name in (manifest or {}).get('partitions', {}):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+        manifest = {'format': STORE_FORMAT, 'columns': STORE_COLUMNS,
+                    'sources': {}, 'partitions': {}}
+    sources = manifest['sources']
+    listing = list_sources(root, store=directory)
+
+    changed = []
+    for relative_path, mtime_ns, size in listing:
+        entry = sources.get(relative_path)
+        if entry and (entry['mtime_ns'], entry['size']) == (mtime_ns, size):
+            continue
+        sha256 = file_hash(os.path.join(root, relative_path))
+        if entry and entry['sha256'] == sha256:
+            entry.update(mtime_ns=mtime_ns, size=size)
+            continue
+        changed.append((relative_path, {'mtime_ns': mtime_ns, 'size': size,
+                                        'sha256': sha256}))
+    removed = set(sources) - {relative_path for relative_path, _, _ in listing}
+
+    if len(changed) > 1 and max_workers != 1:
+        # Spawned, not forked, since this runs inside the Streamlit server
+        with spawn_pool(max_workers) as executor:
+            futures = [executor.submit(_ingest_file, os.path.join(root, relative_path),
+                                       relative_path, directory)
+                       for relative_path, _ in changed]
+            results = [future.result() for future in futures]
+    else:
+        results = [_ingest_file(os.path.join(root, relative_path), relative_path, directory)
+                   for relative_path, _ in changed]
+
+    stale = set()
+    for relative_path in removed:
+        stale.update(sources.pop(relative_path)['partitions'])
+    for (relative_path, entry), result in zip(changed, results):
+        old = sources.get(relative_path, {}).get('partitions', [])
+        stale.update(set(old) - set(result['partitions']))
+        entry.update(station=result['station'], error=result['error'],
+                     partitions=sorted(result['partitions']))
+        sources[relative_path] = entry
+        manifest['partitions'].update(result['partitions'])
+    for name in stale:
+        manifest['partitions'].pop(name, None)
+        try:
+            os.unlink(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+    _write_manifest(directory, manifest)
+    return manifest
+
+
+def store_version(manifest):
+    """Identity of the store contents, for use as a cache key"""
+    sha = hashlib.sha256()
+    for name, partition in sorted(manifest['partitions'].items()):
+        sha.update(f"{name}:{partition['sha256']}\n".encode('utf-8'))
+    return sha.hexdigest()
+
+
+def stations(manifest):
+    """Stations with data in the store"""
+    return sorted({partition['station'] for partition in manifest['partitions'].values()})
+
+
+def _partitions(manifest, months=None, stations=None):
+    """
+    Partition names with data for the months and stations, ordered by
+    their first month, so each station's rows come in date order
+    """
+    selected = [
+        (min(partition['months']), partition['station'], name)
+        for name, partition in manifest['partitions'].items()
+        if (months is None or not partition['months'].keys().isdisjoint(months))
+        and (stations is None or partition['station'] in stations)
+    ]
+    return [name for _, _, name in sorted(selected)]
+
+
+def _month_rows(table, partition, months):
+    """The rows of a partition's table that fall in the months (zero-copy)"""
+    ranges = sorted(partition['months'][month] for month in set(months)
+                    if month in partition['months'])
+    return pa.concat_tables([table.slice(offset, rows) for offset, rows in ranges])
+
+
+def read_table(directory, columns=None, months=None, stations=None):
+    """
+    Read columns from the store as an Arrow table.
+
+    Only the requested columns (all by default) of the requested months and
+    stations (all by default) are read, from memory-mapped files, so the
+    table shares the pages of the files instead of copying them. Rows are
+    in date order within each station.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No weather store in {directory}")
+    columns = list(manifest['columns'] if columns is None else columns)
+
+    tables = []
+    for name in _partitions(manifest, months, stations):
+        table = feather.read_table(os.path.join(directory, name), columns=columns,
+                                   memory_map=True)
+        if months is not None:
+            table = _month_rows(table, manifest['partitions'][name], months)
+        tables.append(table)
+    if tables:
+        # Every file has its own Station dictionary
+        return pa.concat_tables(tables).unify_dictionaries()
+    return pa.table({column: [] for column in columns})
+
+
+def read_store(directory, columns=None, months=None, stations=None):
+    """Read columns from the store into a date-indexed DataFrame"""
+    if columns is not None:
+        columns = list(columns)
+    # The date is needed for the index even when not asked for
+    read_columns = columns
+    if columns is not None and 'Date' not in columns:
+        read_columns = ['Date'] + columns
+    df = read_table(directory, read_columns, months, stations).to_pandas()
+    df.index = pd.DatetimeIndex(df['Date']).rename(None)
+    return df if columns is None else df[columns]
+
+
+def _load_stats(path, columns):
+    """Saved per-partition statistics as {name: (sha256, RunningStats)}"""
+    try:
+        with np.load(path) as saved:
+            if saved['columns'].tolist() != columns:
+                return {}
+            names = saved['names'].tolist()
+            hashes = saved['hashes'].tolist()
+            fields = {field: saved[field] for field in RunningStats.FIELDS}
+    except (FileNotFoundError, KeyError, ValueError, OSError):
+        return {}
+    return {
+        name: (sha, RunningStats.from_arrays(
+            columns, {field: values[index] for field, values in fields.items()}))
+        for index, (name, sha) in enumerate(zip(names, hashes))
+    }
+
+
+def _save_stats(path, columns, states):
+    names = sorted(states)
+    arrays = {
+        field: np.stack([states[name][1].to_arrays()[field] for name in names])
+        for field in RunningStats.FIELDS
+    } if names else {}
+
+    def write(temp_path):
+        with open(temp_path, 'wb') as stats_file:
+            np.savez(stats_file, columns=np.array(columns), names=np.array(names),
+                     hashes=np.array([states[name][0] for name in names]),
+                     **arrays)
+
+    _write_atomic(path, write)
+
+
+def read_stats(directory, columns=MEASUREMENTS, stations=None):
+    """
+    Running statistics of the store, scanning only changed partitions.
+
+    Each partition's statistics are saved with its content hash. Partitions
+    that are new or whose hash changed are read and summarized again,
+    removed ones are dropped, and the states of the requested stations (all
+    by default) are merged.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No weather store in {directory}")
+    columns = list(columns)
+    path = os.path.join(directory, STATS)
+    saved = _load_stats(path, columns)
+
+    states = {}
+    for name, partition in manifest['partitions'].items():
+        entry = saved.get(name)
+        if entry is None or entry[0] != partition['sha256']:
+            table = feather.read_table(os.path.join(directory, name), columns=columns,
+                                       memory_map=True)
+            entry = (partition['sha256'],
+                     RunningStats.from_values(columns, table.to_pandas()))
+        states[name] = entry
+    if states.keys() != saved.keys() or any(
+            saved[name][0] != states[name][0] for name in states):
+        _save_stats(path, columns, states)
+
+    total = RunningStats(columns)
+    for name in _partitions(manifest, stations=stations):
+        total.merge(states[name][1])
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Ingest a folder of weather CSVs into a columnar store")
+    parser.add_argument("source", help="folder with weather .csv files")
+    parser.add_argument("--store", default="weather_store")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    manifest = ingest(args.source, args.store, args.workers)
+    rows = sum(partition['rows'] for partition in manifest['partitions'].values())
+    print(f"{len(manifest['sources'])} files, {len(stations(manifest))} stations, "
+          f"{len(manifest['partitions'])} partitions, {rows:,} rows")
+    for path, source in sorted(manifest['sources'].items()):
+        if source.get('error'):
+            print(f"skipped {path}: {source['error']}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
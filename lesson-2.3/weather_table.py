@@ -0,0 +1,117 @@
+"""
+Paging, sorting and date filtering for the raw data table.
+
+PagedTable holds an Arrow table (memory-mapped from the store) and row
+orderings built once: by date when it is created, and by any other column
+the first time the table is sorted by it. A filtered and sorted view is an
+array of row positions, computed with vectorized numpy operations and kept
+in a small LRU, so turning pages only takes the page's rows from the table
+and costs the same for hundreds or tens of millions of rows.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pyarrow as pa
+
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+class PagedTable:
+    """Sorted, date-filtered pages of an Arrow table"""
+
+    def __init__(self, table, date_column='Date', max_views=16):
+        self.table = table
+        self.date_column = date_column
+        self.max_views = max_views
+        dates = table.column(date_column).to_numpy()
+        self._date_order = np.argsort(dates, kind='stable')
+        self._sorted_dates = dates[self._date_order]
+        self._orders = {}
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.table.num_rows
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    def date_range(self):
+        """First and last date in the table, or (None, None) when empty"""
+        if len(self._sorted_dates) == 0:
+            return None, None
+        return self._sorted_dates[0], self._sorted_dates[-1]
+
+    def _order(self, column):
+        """Row positions sorted by column ascending, missing values last"""
+        order = self._orders.get(column)
+        if order is None:
+            values = self.table.column(column).to_numpy()
+            order = np.argsort(values, kind='stable')
+            # NaN sorts last; count the rest so descending keeps it last
+            valid = len(values)
+            if values.dtype.kind == 'f':
+                valid -= int(np.count_nonzero(np.isnan(values)))
+            order = (order, valid)
+            self._orders[column] = order
+        return order
+
+    def _date_bounds(self, start, end):
+        """Slice of the date order covering start..end, both inclusive"""
+        low = 0
+        high = len(self._sorted_dates)
+        if start is not None:
+            low = np.searchsorted(self._sorted_dates, np.datetime64(start, 'ns'))
+        if end is not None:
+            high = np.searchsorted(self._sorted_dates,
+                                   np.datetime64(end, 'ns') + ONE_DAY)
+        return low, max(low, high)
+
+    def view(self, start=None, end=None, sort=None, ascending=True):
+        """
+        Row positions between the start and end dates, in sort order.
+
+        start and end are dates (inclusive, None for open ended) and sort is
+        a column name (None for date order).
+        """
+        key = (start, end, sort or self.date_column, ascending)
+        with self._lock:
+            positions = self._views.get(key)
+            if positions is not None:
+                self._views.move_to_end(key)
+                return positions
+
+            low, high = self._date_bounds(start, end)
+            if sort is None or sort == self.date_column:
+                positions = self._date_order[low:high]
+                if not ascending:
+                    positions = positions[::-1]
+            else:
+                order, valid = self._order(sort)
+                if low > 0 or high < len(self):
+                    # Keep the rows whose date is in range, still in column order
+                    in_range = np.zeros(len(self), dtype=bool)
+                    in_range[self._date_order[low:high]] = True
+                    valid = int(np.count_nonzero(in_range[order[:valid]]))
+                    order = order[in_range[order]]
+                if not ascending:
+                    order = np.concatenate([order[:valid][::-1], order[valid:]])
+                positions = order
+
+            self._views[key] = positions
+            while len(self._views) > self.max_views:
+                self._views.popitem(last=False)
+            return positions
+
+    def page(self, positions, page, page_size):
+        """Rows of a 1-based page of a view, as a DataFrame"""
+        start = (page - 1) * page_size
+        rows = positions[start:start + page_size]
+        # Table.take would concatenate the chunks of every column first;
+        # one-row slices of the memory-mapped table are zero-copy
+        if len(rows) == 0:
+            return self.table.slice(0, 0).to_pandas()
+        return pa.concat_tables(
+            [self.table.slice(row, 1) for row in rows.tolist()]).to_pandas()
@@ -0,0 +1,231 @@
+"""
+Timers, counters and histograms for the hot paths of the apps.
+
+This is the one instrumentation layer of the repository: the lesson apps
+and their helper modules add this folder to sys.path and import it from
+here.
+
+Metrics are kept per process in REGISTRY, so they add up over every session
+and rerun until the server restarts. A series is a metric name plus labels:
+
+    with timer("speech_synthesis_seconds", mode="stream"):
+        ...
+    count("speech_synthesis_bytes_total", len(audio), mode="stream")
+
+Timers record into histograms with fixed buckets, like Prometheus, so
+recording is a few additions under a lock and the memory used does not
+grow with the number of observations. The registry can be exported in the
+Prometheus text format or as JSON lines, and metrics_panel shows it in the
+Streamlit sidebar. Set METRICS_JSONL to a file name to append a snapshot of
+the registry to it at the end of every run.
+"""
+import bisect
+import functools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a cache hit to a slow network call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Counts of observations per bucket, with their sum, minimum and maximum"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bucket plus one for values above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating within its bucket"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else min(self.minimum, 0.0)
+                upper = self.buckets[index] if index < len(self.buckets) else self.maximum
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(estimate, self.minimum), self.maximum)
+            seen += bucket_count
+        return self.maximum
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"'
+                          for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Thread-safe store of counters and histograms by name and labels"""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1, **labels):
+        """Add value to a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        """Record one value in a histogram"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Record how long the block took, in seconds, even if it raised"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator recording how long each call takes"""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def rows(self):
+        """One dict per series, for display"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (histogram.count, histogram.sum, histogram.quantile(0.5),
+                       histogram.quantile(0.95), histogram.maximum))
+                for key, histogram in self._histograms.items())
+        rows = [{"metric": name, "labels": _format_labels(labels), "count": value}
+                for (name, labels), value in counters]
+        for (name, labels), (count, total, median, p95, maximum) in histograms:
+            rows.append({"metric": name, "labels": _format_labels(labels), "count": count,
+                         "mean": total / count if count else None,
+                         "p50": median, "p95": p95, "max": maximum})
+        return rows
+
+    def to_prometheus(self):
+        """The registry in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + (math.inf,), histogram.counts):
+                    cumulative += bucket_count
+                    le = (("le", _format_number(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_jsonl(self):
+        """The registry as JSON lines, one series per line, with a timestamp"""
+        timestamp = time.time()
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append({"time": timestamp, "metric": name, "type": "counter",
+                              "labels": dict(labels), "value": value})
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                lines.append({"time": timestamp, "metric": name, "type": "histogram",
+                              "labels": dict(labels), "count": histogram.count,
+                              "sum": histogram.sum,
+                              "min": histogram.minimum if histogram.count else None,
+                              "max": histogram.maximum if histogram.count else None,
+                              "buckets": dict(zip(map(_format_number, histogram.buckets + (math.inf,)),
+                                                  histogram.counts))})
+        return "".join(json.dumps(line) + "\n" for line in lines)
+
+    def write_jsonl(self, path):
+        """Append a snapshot of the registry to a JSON lines file"""
+        with open(path, "a", encoding="utf-8") as metrics_file:
+            metrics_file.write(self.to_jsonl())
+
+
+REGISTRY = Registry()
+count = REGISTRY.count
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+
+
+def metrics_panel(registry=REGISTRY, expanded=False):
+    """Show the registry in the sidebar, with Prometheus and JSON lines downloads"""
+    import streamlit as st
+
+    with st.sidebar.expander("Metrics", expanded=expanded):
+        rows = registry.rows()
+        if not rows:
+            st.caption("Nothing measured yet.")
+            return
+        st.caption("Totals for this server process since it started. Times are in seconds.")
+        st.dataframe(rows, hide_index=True, width='stretch')
+        prometheus_col, jsonl_col = st.columns(2)
+        prometheus_col.download_button("Prometheus", data=registry.to_prometheus,
+                                       file_name="metrics.prom", mime="text/plain",
+                                       on_click="ignore")
+        jsonl_col.download_button("JSON lines", data=registry.to_jsonl,
+                                  file_name="metrics.jsonl", mime="application/jsonl",
+                                  on_click="ignore")
+
+
+def snapshot_from_env(registry=REGISTRY):
+    """Append a snapshot to the file named by METRICS_JSONL, if it is set"""
+    path = os.environ.get("METRICS_JSONL")
+    if path:
+        registry.write_jsonl(path)
@@ -0,0 +1,53 @@
+"""
+Process pools that are safe to start from a Streamlit app.
+
+The Streamlit server runs sessions on many threads, and forking it can
+leave a worker holding a lock some other thread had at that moment, so the
+workers are spawned instead. A spawned worker first re-runs the parent's
+__main__ module, which under Streamlit is the app script itself: every
+worker would run the whole app (including the work that started the pool).
+spawn_pool starts each worker while __main__ is a bare module, so workers
+only import the modules of the functions they are sent. A script that
+Python itself was started with (python weather_store.py ...) keeps its
+__main__, since the functions it sends are defined there.
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+_main_lock = threading.Lock()
+
+
+def _swapped_in(main):
+    """Whether __main__ is not the script Python was started with"""
+    path = getattr(main, '__file__', None)
+    return (path is not None and bool(sys.argv)
+            and os.path.abspath(path) != os.path.abspath(sys.argv[0]))
+
+
+class _SpawnPool(ProcessPoolExecutor):
+    """ProcessPoolExecutor that starts its workers without the app script"""
+
+    def _spawn_process(self):
+        # Workers are started one at a time as work is submitted
+        with _main_lock:
+            main = sys.modules['__main__']
+            if not _swapped_in(main):
+                super()._spawn_process()
+                return
+            placeholder = types.ModuleType('__main__')
+            sys.modules['__main__'] = placeholder
+            try:
+                super()._spawn_process()
+            finally:
+                # Streamlit may have started another run in the meantime
+                if sys.modules['__main__'] is placeholder:
+                    sys.modules['__main__'] = main
+
+
+def spawn_pool(max_workers=None):
+    """A process pool with spawned workers, for use from app code"""
+    return _SpawnPool(max_workers, mp_context=multiprocessing.get_context('spawn'))